@@ -1,54 +1,412 @@
 __version__ = "0.3"
 __author__ = "William Knowles (@william_knows)"
 
+from abc import ABC, abstractmethod
 import argparse
+import atexit
+import bisect
+import collections
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
 from enum import Enum
+from html.parser import HTMLParser
+import ipaddress
 import json
 import logging
+import logging.handlers
+import math
+import numpy as np
 import os
 from pathlib import Path
+import re
 import pyaudio
 import pyttsx3
 import queue
 import requests
+from requests.adapters import HTTPAdapter
+import signal
+import socket
+import socketserver
 import sys
+import tempfile
 import time
 import threading
+import urllib.parse
+import wave
+from urllib3.util.retry import Retry
 from vosk import Model, KaldiRecognizer, SetLogLevel
 
-logging.basicConfig(level=logging.WARNING,
-                    format="Logging (%(levelname)s): %(message)s",
-                    handlers=[
-                        logging.FileHandler("anki-voice.log"),
-                        logging.StreamHandler()])
+
+class BoundedQueueHandler(logging.handlers.QueueHandler):
+    """Queues log records for a background listener, so that logging never waits for the disk or
+    terminal (records are discarded, and counted, if the queue is full)."""
+
+    def __init__(self, log_queue):
+        """Constructor for BoundedQueueHandler.
+
+        Args:
+            log_queue (queue.Queue): The (bounded) queue read by the listener.
+        """
+        super().__init__(log_queue)
+        self.dropped_records = 0
+
+    def prepare(self, record):
+        # Records are handled in this process, so they are formatted by the listener's handlers
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped_records += 1
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats log records whose message is a dict as a JSON line."""
+
+    def format(self, record):
+        return json.dumps(record.msg)
+
+
+# Log records are written (to the log file and terminal) by a background thread
+log_handlers = [logging.FileHandler("anki-voice.log"), logging.StreamHandler()]
+for log_handler in log_handlers:
+    log_handler.setFormatter(logging.Formatter(
+        "Logging (%(levelname)s): %(message)s"))
+log_queue_handler = BoundedQueueHandler(queue.Queue(maxsize=10000))
+logging.basicConfig(level=logging.WARNING, handlers=[log_queue_handler])
+# Each retried AnkiConnect connection is otherwise logged, in addition to the failed request
+logging.getLogger("urllib3.connectionpool").setLevel(logging.ERROR)
+log_listener = logging.handlers.QueueListener(
+    log_queue_handler.queue, *log_handlers)
+log_listener.start()
+atexit.register(log_listener.stop)
+
+
+class ConsoleWriter():
+    """Writes the real-time command log to the terminal from a background thread, so that a
+    slow terminal never delays speech recognition or command dispatch. Lines are written to the
+    standard output in use when they were printed (e.g., as redirected by a benchmark), and are
+    discarded (and counted) if too many are waiting to be written."""
+
+    def __init__(self, max_queued_lines=1000):
+        """Constructor for ConsoleWriter.
+
+        Args:
+            max_queued_lines (int, optional): Most lines waiting to be written. Defaults to 1000.
+        """
+        self._queue = queue.Queue(maxsize=max_queued_lines)
+        self.dropped_lines = 0
+        threading.Thread(target=self._cyclic_write, daemon=True).start()
+
+    def print(self, *values, sep=" "):
+        """Queues a line to be written (with the same arguments as print).
+
+        Args:
+            *values: The values to print.
+            sep (str, optional): The separator between values. Defaults to " ".
+        """
+        try:
+            self._queue.put_nowait(
+                (sys.stdout, sep.join(str(value) for value in values) + "\n"))
+        except queue.Full:
+            self.dropped_lines += 1
+
+    def flush(self, timeout=1.0):
+        """Waits until the queued lines have been written.
+
+        Args:
+            timeout (float, optional): Most seconds to wait (e.g., if the terminal has stalled). Defaults to 1.0.
+        """
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks > 0 and time.monotonic() < deadline:
+            time.sleep(0.005)
+
+    def _cyclic_write(self):
+        """Writes queued lines in order."""
+        while True:
+            stream, line = self._queue.get()
+            try:
+                stream.write(line)
+                stream.flush()
+            except (OSError, ValueError):
+                # e.g., the stream has since been closed
+                pass
+            self._queue.task_done()
+
+
+console = ConsoleWriter()
+atexit.register(console.flush)
+
+
+class EventLog():
+    """Structured log of a session's utterances as JSON lines, each with a monotonic timestamp,
+    the recognised text, the recogniser's confidence, the command, and its outcome. Events are
+    queued and written by a background thread (so recording an event never waits for the
+    disk), the queue is bounded, and the file is rotated by size. A log can be replayed by the
+    benchmarks to recreate the session's command stream."""
+
+    def __init__(self, max_queued_events=10000):
+        """Constructor for EventLog. Events are discarded until the log is opened.
+
+        Args:
+            max_queued_events (int, optional): Most events waiting to be written (further events are discarded, and counted). Defaults to 10000.
+        """
+        self._queue = queue.Queue(maxsize=max_queued_events)
+        self._listener = None
+        self.dropped_events = 0
+
+    def open(self, path, max_bytes=10 * 2**20, backup_count=3):
+        """Starts writing events to a file.
+
+        Args:
+            path (str): The JSON lines file to write to.
+            max_bytes (int, optional): Size at which the file is rotated (to path.1, path.2, ...). Defaults to 10 MiB.
+            backup_count (int, optional): Number of rotated files kept. Defaults to 3.
+        """
+        handler = logging.handlers.RotatingFileHandler(
+            path, maxBytes=max_bytes, backupCount=backup_count)
+        handler.setFormatter(JsonFormatter())
+        self._listener = logging.handlers.QueueListener(self._queue, handler)
+        self._listener.start()
+        # Relates the monotonic timestamps of events to the wall clock
+        self.record("session_start", wall_time=time.time(),
+                    version=__version__)
+
+    def record(self, event, event_time=None, **fields):
+        """Queues an event to be written.
+
+        Args:
+            event (str): The type of event (e.g., "utterance").
+            event_time (float, optional): When the event occured (from time.monotonic). Defaults to now.
+            **fields: The (JSON serialisable) fields of the event.
+        """
+        if self._listener is None:
+            return
+        fields = {"time": time.monotonic() if event_time is None else event_time,
+                  "event": event, **fields}
+        try:
+            self._queue.put_nowait(logging.makeLogRecord({"msg": fields}))
+        except queue.Full:
+            self.dropped_events += 1
+
+    def close(self):
+        """Writes any queued events, and closes the file."""
+        if self._listener is None:
+            return
+        self.record("session_end", dropped_events=self.dropped_events)
+        listener, self._listener = self._listener, None
+        listener.stop()
+        for handler in listener.handlers:
+            handler.close()
+
+
+def load_event_log(path):
+    """Loads the events of an event log, including its rotated files, in the order they were
+    recorded (a partially written last line is skipped).
+
+    Args:
+        path (str): The JSON lines file the events were written to.
+
+    Returns:
+        list: The events (dicts).
+    """
+    rotated_paths = [rotated for rotated in Path(path).parent.glob(
+        f"{Path(path).name}.*") if rotated.suffix[1:].isdigit()]
+    # Rotated files are numbered from the most recent (path.1) to the oldest
+    rotated_paths.sort(key=lambda rotated: int(rotated.suffix[1:]), reverse=True)
+    events = []
+    for event_path in rotated_paths + [Path(path)]:
+        with open(event_path) as event_file:
+            for line in event_file:
+                try:
+                    events.append(json.loads(line))
+                except ValueError:
+                    continue
+    return events
+
+
+event_log = EventLog()
 
 audio_feedback_queue = queue.Queue()
+# Set while feedback is being spoken, so that the microphone does not pick it up as speech
+audio_feedback_speaking = threading.Event()
+# Queued (on audio_feedback_queue) to synthesise text in advance of it being spoken
+AudioPrefetch = collections.namedtuple("AudioPrefetch", ["text"])
 
 
-class AnkiActionHandler():
-    """Initiates handler for sending AnkiConnect API requests based on command input."""
+class LatencyMetrics():
+    """Thread-safe, in-process latency histograms for each stage of handling an utterance (e.g.,
+    speech recognition, AnkiConnect requests, and text-to-speech)."""
 
-    def __init__(self, alert_sound_enabled=True):
-        """Constructor for AnkiActionHandler class. Initialises members for tracking current
-        card state, and any behavioural elements for when making AnkiConnect requests.
+    # Histogram bucket upper bounds (in seconds)
+    BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+               0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    def __init__(self, max_samples=10000):
+        """Constructor for LatencyMetrics.
 
         Args:
-            alert_sound_enabled (bool, optional): Controls confirmation sound for attach, pause, and unpause commands. Defaults to True.
+            max_samples (int, optional): Number of recent samples kept per stage for percentiles. Defaults to 10000.
         """
-        # Deck context information
-        self._current_state = AnkiStates.QUESTION
-        # Card context information
-        self._card_question = None
-        self._card_answer = None
-        self._card_difficult_value = 2
-        self._card_good_value = 3
-        # allow upscale to 4 only if required (normal behaviour)
-        self._card_easy_value = 3
-        # Behaviour configuration
-        self._alert_sound_enabled = alert_sound_enabled
+        self._max_samples = max_samples
+        self._lock = threading.Lock()
+        self._stages = {}
+
+    def observe(self, stage, seconds):
+        """Records the latency of a stage.
+
+        Args:
+            stage (str): The name of the stage (e.g., "ankiconnect_request").
+            seconds (float): The latency in seconds.
+        """
+        with self._lock:
+            if stage not in self._stages:
+                self._stages[stage] = {
+                    "count": 0,
+                    "sum": 0.0,
+                    "buckets": [0] * len(self.BUCKETS),
+                    "samples": collections.deque(maxlen=self._max_samples)
+                }
+            metrics = self._stages[stage]
+            metrics["count"] += 1
+            metrics["sum"] += seconds
+            metrics["samples"].append(seconds)
+            bucket = bisect.bisect_left(self.BUCKETS, seconds)
+            if bucket < len(self.BUCKETS):
+                metrics["buckets"][bucket] += 1
+
+    def summary(self):
+        """Summarises the latency of each stage.
+
+        Returns:
+            dict: Mapping of stage to its count, mean, and p50/p95/p99 latency (in seconds).
+        """
+        with self._lock:
+            summary = {}
+            for stage, metrics in self._stages.items():
+                stage_percentiles = calculate_percentiles(metrics["samples"])
+                summary[stage] = {
+                    "count": metrics["count"],
+                    "mean": metrics["sum"] / metrics["count"],
+                    "p50": stage_percentiles[50],
+                    "p95": stage_percentiles[95],
+                    "p99": stage_percentiles[99]
+                }
+            return summary
+
+    def to_json(self):
+        """Formats the latency summary and histograms as JSON.
+
+        Returns:
+            str: The metrics as JSON.
+        """
+        summary = self.summary()
+        with self._lock:
+            for stage, metrics in self._stages.items():
+                summary[stage]["histogram"] = {
+                    str(bound): count for bound, count in zip(self.BUCKETS, metrics["buckets"])}
+        return json.dumps({"timestamp": time.time(), "stages": summary}, indent=4)
+
+    def to_prometheus(self):
+        """Formats the latency histograms and percentiles in the Prometheus text exposition format.
+
+        Returns:
+            str: The metrics as Prometheus text.
+        """
+        summary = self.summary()
+        lines = ["# HELP anki_voice_stage_latency_seconds Latency of each stage of handling an utterance.",
+                 "# TYPE anki_voice_stage_latency_seconds histogram"]
+        with self._lock:
+            for stage, metrics in self._stages.items():
+                cumulative_count = 0
+                for bound, count in zip(self.BUCKETS, metrics["buckets"]):
+                    cumulative_count += count
+                    lines.append(
+                        f'anki_voice_stage_latency_seconds_bucket{{stage="{stage}",le="{bound}"}} {cumulative_count}')
+                lines.append(
+                    f'anki_voice_stage_latency_seconds_bucket{{stage="{stage}",le="+Inf"}} {metrics["count"]}')
+                lines.append(
+                    f'anki_voice_stage_latency_seconds_sum{{stage="{stage}"}} {metrics["sum"]}')
+                lines.append(
+                    f'anki_voice_stage_latency_seconds_count{{stage="{stage}"}} {metrics["count"]}')
+        lines += ["# HELP anki_voice_stage_latency_percentile_seconds Recent latency percentiles of each stage.",
+                  "# TYPE anki_voice_stage_latency_percentile_seconds gauge"]
+        for stage, stage_summary in summary.items():
+            for percentile in ["p50", "p95", "p99"]:
+                lines.append(
+                    f'anki_voice_stage_latency_percentile_seconds{{stage="{stage}",percentile="{percentile}"}} {stage_summary[percentile]}')
+        return "\n".join(lines) + "\n"
+
+    def dump(self, path, metrics_format="json"):
+        """Writes the metrics to a file (replacing it atomically, so it is never partially written).
+
+        Args:
+            path (str): The file to write to.
+            metrics_format (str, optional): Either "json" or "prometheus". Defaults to "json".
+        """
+        try:
+            content = self.to_prometheus() if metrics_format == "prometheus" else self.to_json()
+            temporary_path = f"{path}.tmp"
+            with open(temporary_path, "w") as metrics_file:
+                metrics_file.write(content)
+            os.replace(temporary_path, path)
+        except Exception as ex:
+            logging.error(
+                f"An unknown exception occured when attempting to write metrics to {path}: {ex}")
+
+    def dump_in_background(self, path, metrics_format="json"):
+        """Writes the metrics to a file from a separate thread. Used from signal handlers, which
+        run on the main thread between any two instructions, possibly while it holds the lock.
+
+        Args:
+            path (str): The file to write to.
+            metrics_format (str, optional): Either "json" or "prometheus". Defaults to "json".
+
+        Returns:
+            threading.Thread: The thread writing the metrics.
+        """
+        thread = threading.Thread(target=self.dump, args=(
+            path, metrics_format), daemon=True)
+        thread.start()
+        return thread
+
+
+latency_metrics = LatencyMetrics()
+
+
+class AnkiConnectClient():
+    """Manages a persistent, pooled HTTP session for sending requests to the AnkiConnect API."""
+
+    def __init__(self, url="http://localhost:8765", connect_timeout=1.0, read_timeout=5.0, retries=2, backoff_factor=0.1, pool_size=4):
+        """Constructor for AnkiConnectClient class. Creates a keep-alive session so that
+        consecutive commands reuse the same TCP connection, bounded by connect/read timeouts.
+
+        Args:
+            url (str, optional): The address of the AnkiConnect API. Defaults to "http://localhost:8765".
+            connect_timeout (float, optional): Seconds to wait when establishing a connection. Defaults to 1.0.
+            read_timeout (float, optional): Seconds to wait for AnkiConnect to respond. Defaults to 5.0.
+            retries (int, optional): Number of reconnection attempts (with backoff) when AnkiConnect can not be reached. Defaults to 2.
+            backoff_factor (float, optional): Base delay (in seconds) for exponential backoff between retries. Defaults to 0.1.
+            pool_size (int, optional): Maximum number of pooled connections kept alive. Defaults to 4.
+        """
+        self._url = url
+        self._timeout = (connect_timeout, read_timeout)
+        # Only connection failures are retried, as read failures may mean Anki already acted on the request
+        retry = Retry(total=retries, connect=retries, read=0,
+                      backoff_factor=backoff_factor)
+        adapter = HTTPAdapter(pool_connections=1,
+                              pool_maxsize=pool_size, max_retries=retry)
+        self._session = requests.Session()
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+        # Whether AnkiConnect responded to the last request (i.e., failures were not connectivity related)
+        self.connected = True
+        # When AnkiConnect could first not be reached, for the current outage (otherwise None)
+        self._unreachable_since = None
 
-    def _send_ankiconnect_request(self, http_method, payload, error_message):
-        """Handler for sening multiple types of requests to the AnkiConnect API.
+    def request(self, http_method, payload, error_message):
+        """Handler for sending multiple types of requests to the AnkiConnect API.
 
         Args:
             http_method (str): The HTTP method to be used (typically either 'GET' or 'POST').
@@ -56,16 +414,24 @@ class AnkiActionHandler():
             error_message (str): A request-specific message to be included in any exceptions.
 
         Raises:
-            requests.exceptions.HTTPError: Handles HTTP-specific errors, such as a failure to connect to the AnkiConnect API.
+            requests.exceptions.HTTPError: Handles HTTP-specific errors, such as a non-200 status code from the AnkiConnect API.
+            requests.exceptions.ConnectionError: Handles failures to connect to the AnkiConnect API (after any retries).
+            requests.exceptions.Timeout: Handles the AnkiConnect API not responding within the configured timeouts.
             AnkiVoiceError: Handles anki-voice errors, in particular here for the AnkiConnect API returns a failure message.
 
         Returns:
             bool: Indicator of whether the request was successful
             str: The JSON response from the AnkiConnect API.
         """
+        started = time.perf_counter()
         try:
-            response = requests.request(
-                http_method, "http://localhost:8765", json=payload)
+            response = self._session.request(
+                http_method, self._url, json=payload, timeout=self._timeout)
+            self.connected = True
+            if self._unreachable_since is not None:
+                logging.warning(
+                    f"AnkiConnect can be reached again (after {time.monotonic() - self._unreachable_since:.0f} seconds).")
+                self._unreachable_since = None
             if response.status_code != 200:
                 raise requests.exceptions.HTTPError(
                     f"Request returned non-200 status code of: {str(response.status_code)}")
@@ -77,6 +443,14 @@ class AnkiActionHandler():
             logging.error(
                 f"An HTTP-related error occured when attempting to {error_message}: {ex}")
             return False, None
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as ex:
+            self.connected = False
+            # Only logged once per outage, as requests are retried while AnkiConnect is unreachable (e.g., journaled answers)
+            if self._unreachable_since is None:
+                self._unreachable_since = time.monotonic()
+                logging.error(
+                    f"AnkiConnect could not be reached when attempting to {error_message}: {ex}")
+            return False, None
         except AnkiVoiceError as ex:
             logging.error(
                 f"An AnkiConnect-specific error occured when attempting to {error_message}: {ex}.")
@@ -85,8 +459,239 @@ class AnkiActionHandler():
             logging.error(
                 f"An unknown exception occured when attempting to {error_message}: {ex}")
             return False, None
+        finally:
+            # Failed requests (e.g., timeouts) are included, as they are the slowest
+            latency_metrics.observe(
+                "ankiconnect_request", time.perf_counter() - started)
         return True, response
 
+    def check_connection(self):
+        """Checks that the AnkiConnect API can be reached.
+
+        Returns:
+            bool: Indicator of whether AnkiConnect responded.
+        """
+        success, response = self.request(
+            "POST", {"action": "version", "version": 6}, "check the AnkiConnect connection")
+        return success
+
+    def multi(self, actions, error_message):
+        """Sends several AnkiConnect actions in a single 'multi' request (i.e., one round trip).
+
+        Args:
+            actions (list): The actions to be performed in order, each a dict with an 'action' and optional 'params'.
+            error_message (str): A request-specific message to be included in any exceptions.
+
+        Returns:
+            bool: Indicator of whether the request was successful
+            list: The result of each action (None for any action that failed).
+        """
+        payload = {
+            "action": "multi",
+            "version": 6,
+            "params": {
+                "actions": [dict(action, version=6) for action in actions]
+            }
+        }
+        success, response = self.request("POST", payload, error_message)
+        if success == False:
+            return False, None
+        results = []
+        for action, action_response in zip(actions, response.json()["result"]):
+            # Version 6 actions return their own result/error pair
+            if action_response["error"] is not None:
+                logging.error(
+                    f"An AnkiConnect-specific error occured for '{action['action']}' when attempting to {error_message}: {action_response['error']}.")
+            results.append(action_response["result"])
+        return True, results
+
+    def close(self):
+        """Closes the pooled connections held by the session."""
+        self._session.close()
+
+
+class AnswerJournal():
+    """Durable, append-only journal (JSON lines) of card answers. Each answer is journaled with a
+    sequence number before it is sent, and resolved once applied (or found to be stale), so
+    answers that could not reach AnkiConnect are replayed in order rather than lost. Entries are
+    written to the file before an answer is sent (so they survive anki-voice exiting), and
+    synchronised to disk in the background, so that answering does not wait for the disk."""
+
+    def __init__(self, path, compact_after=1000):
+        """Constructor for AnswerJournal. Opens (or creates) the journal, and recovers any
+        unresolved answers from a previous session.
+
+        Args:
+            path (str): The journal file.
+            compact_after (int, optional): Number of entries after which the journal is compacted (once all answers are resolved). Defaults to 1000.
+        """
+        self._path = path
+        self._compact_after = compact_after
+        self._pending = collections.OrderedDict()
+        self._next_sequence = 1
+        self._entry_count = 0
+        line = "\n"
+        try:
+            with open(path) as journal_file:
+                for line in journal_file:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # A partially written final line (e.g., from a crash)
+                        continue
+                    self._entry_count += 1
+                    self._next_sequence = max(
+                        self._next_sequence, entry["sequence"] + 1)
+                    if "status" in entry:
+                        self._pending.pop(entry["sequence"], None)
+                    else:
+                        self._pending[entry["sequence"]] = entry
+        except FileNotFoundError:
+            pass
+        self._journal_file = open(path, "a")
+        if not line.endswith("\n"):
+            # So that new entries do not continue a partially written line
+            self._journal_file.write("\n")
+        self._lock = threading.Lock()
+        self._sync_requested = threading.Event()
+        self._sync_thread = threading.Thread(
+            target=self._cyclic_sync, daemon=True)
+        self._sync_thread.start()
+
+    def append(self, card_id, ease, command):
+        """Records an answer before it is sent (synchronised to disk in the background).
+
+        Args:
+            card_id (int): The card being answered.
+            ease (int): The answer button (1 to 4).
+            command (str): The name of the answer command.
+
+        Returns:
+            int: The sequence number of the answer.
+        """
+        entry = {"sequence": self._next_sequence, "time": time.time(),
+                 "card_id": card_id, "ease": ease, "command": command}
+        self._next_sequence += 1
+        self._pending[entry["sequence"]] = entry
+        self._write(entry, sync=True)
+        return entry["sequence"]
+
+    def resolve(self, sequence, status):
+        """Records the outcome of an answer, so it is not replayed.
+
+        Args:
+            sequence (int): The sequence number of the answer.
+            status (str): Either "applied", "skipped" (stale, as its card is no longer shown), or "failed".
+        """
+        self._pending.pop(sequence, None)
+        # Not synchronised: if lost, the answer is found to be stale when replayed
+        self._write({"sequence": sequence, "status": status}, sync=False)
+        if len(self._pending) == 0 and self._entry_count >= self._compact_after:
+            self._compact()
+
+    def pending(self):
+        """Lists the unresolved answers, in the order they were issued.
+
+        Returns:
+            list: The unresolved journal entries.
+        """
+        return list(self._pending.values())
+
+    def close(self):
+        """Synchronises the journal to disk, and closes the journal file."""
+        with self._lock:
+            self._sync()
+            self._journal_file.close()
+        self._sync_requested.set()
+        self._sync_thread.join()
+
+    def _write(self, entry, sync):
+        """Appends an entry to the journal file.
+
+        Args:
+            entry (dict): The journal entry.
+            sync (bool): Synchronises the entry to disk (in the background).
+        """
+        with self._lock:
+            self._journal_file.write(json.dumps(entry) + "\n")
+            self._journal_file.flush()
+            self._entry_count += 1
+        if sync:
+            self._sync_requested.set()
+
+    def _cyclic_sync(self):
+        """Synchronises appended entries to disk (once the journal is closed, the thread exits)."""
+        while True:
+            self._sync_requested.wait()
+            self._sync_requested.clear()
+            with self._lock:
+                if self._journal_file.closed:
+                    return
+                self._sync()
+
+    def _sync(self):
+        """Synchronises the journal file to disk."""
+        if self._journal_file.closed:
+            return
+        try:
+            os.fsync(self._journal_file.fileno())
+        except OSError as ex:
+            logging.error(
+                f"An error occured when attempting to synchronise the answer journal to disk: {ex}")
+
+    def _compact(self):
+        """Replaces the journal with a single marker entry (preserving the sequence numbering)
+        once all answers are resolved, so that it does not grow without bound."""
+        temporary_path = f"{self._path}.tmp"
+        with open(temporary_path, "w") as journal_file:
+            journal_file.write(json.dumps(
+                {"sequence": self._next_sequence - 1, "status": "compacted"}) + "\n")
+        with self._lock:
+            self._journal_file.close()
+            os.replace(temporary_path, self._path)
+            self._journal_file = open(self._path, "a")
+            self._entry_count = 1
+
+
+class AnkiActionHandler():
+    """Initiates handler for sending AnkiConnect API requests based on command input."""
+
+    # Requests for the next card, when a refresh still returns the card just answered
+    REFRESH_ATTEMPTS = 3
+    REFRESH_INTERVAL = 0.05
+
+    def __init__(self, alert_sound_enabled=True, anki_connect_client=None, read_aloud=False, journal=None, answer_grading=False):
+        """Constructor for AnkiActionHandler class. Initialises members for tracking current
+        card state, and any behavioural elements for when making AnkiConnect requests.
+
+        Args:
+            alert_sound_enabled (bool, optional): Controls confirmation sound for attach, pause, and unpause commands. Defaults to True.
+            anki_connect_client (AnkiConnectClient, optional): Client used for all AnkiConnect API requests. Defaults to a client for localhost.
+            read_aloud (bool, optional): Speaks the question of each new card, and the answer when shown. Defaults to False.
+            journal (AnswerJournal, optional): Journal of answers, replayed if AnkiConnect could not be reached. Defaults to None (answers are not journaled).
+            answer_grading (bool, optional): Indexes the answer of each card as it is shown, so spoken answers can be graded. Defaults to False.
+        """
+        # AnkiConnect API client
+        if anki_connect_client is None:
+            anki_connect_client = AnkiConnectClient()
+        self._anki_connect = anki_connect_client
+        self._journal = journal
+        # Deck context information
+        self._current_state = AnkiStates.QUESTION
+        # Card context information
+        self._card_id = None
+        self._card_question = None
+        self._card_answer = None
+        self._answer_grader = None
+        self._card_difficult_value = 2
+        self._card_good_value = 3
+        # allow upscale to 4 only if required (normal behaviour)
+        self._card_easy_value = 3
+        # Behaviour configuration
+        self._alert_sound_enabled = alert_sound_enabled
+        self._read_aloud = read_aloud
+        self._answer_grading = answer_grading
+
     def get_current_card_information(self, called_through_attach_command=False):
         """Gets information on the current card displayed in the Anki user interface,
         such as questions, answers, and answer scales. This is also used as a handler
@@ -94,6 +699,9 @@ class AnkiActionHandler():
 
         Args:
             called_through_attach_command (bool, optional): Indicates if it was called to handle the 'attach' command, or was called simply as a result of a new card being shown. Defaults to False.
+
+        Returns:
+            str: The outcome ('executed' or 'failed').
         """
         # Request to show answer
         http_method = "GET"
@@ -102,160 +710,464 @@ class AnkiActionHandler():
             "version": 6
         }
         error_message = "get current card information"
-        success, response = self._send_ankiconnect_request(
+        success, response = self._anki_connect.request(
             http_method, payload, error_message)
         # Change current context
         if success == False:
+            return "failed"
+        if not self._update_card_information(response.json()["result"]):
+            return "failed"
+        # Alert only if this was an explicit "attach" command (as opposed to a new card context update)
+        if called_through_attach_command:
+            console.print("Executed: attach")
+            if self._alert_sound_enabled:
+                audio_feedback_queue.put_nowait("Success: Attached.")
+        self._read_question_aloud()
+        return "executed"
+
+    def _read_question_aloud(self):
+        """Speaks the question of the current card (if reading aloud), and synthesises its answer
+        in the background so it can be spoken as soon as it is shown."""
+        if not self._read_aloud or self._card_question is None:
             return
+        question = card_field_to_speech(self._card_question)
+        answer = card_field_to_speech(self._card_answer)
+        if question != "":
+            audio_feedback_queue.put_nowait(question)
+        if answer != "":
+            audio_feedback_queue.put_nowait(AudioPrefetch(answer))
+
+    def _update_card_information(self, card_information):
+        """Updates the tracked card context (question, answer, and answer scales) from the
+        result of a 'guiCurrentCard' request.
+
+        Args:
+            card_information (dict): The 'guiCurrentCard' result returned by the AnkiConnect API.
+
+        Returns:
+            bool: Indicator of whether the card information was successfully extracted.
+        """
         self._current_state = AnkiStates.QUESTION
         # Extract card information
         try:
             frontIsFirstCard = True
-            response_json = response.json()
-            if response_json["result"]["fields"]["Front"]["order"] != 0:
+            if card_information["fields"]["Front"]["order"] != 0:
                 frontIsFirstCard = False
             if frontIsFirstCard:
-                self._card_question = response_json["result"]["fields"]["Front"]["value"]
-                self._card_answer = response_json["result"]["fields"]["Back"]["value"]
+                self._card_question = card_information["fields"]["Front"]["value"]
+                self._card_answer = card_information["fields"]["Back"]["value"]
             else:
-                self._card_question = response_json["result"]["fields"]["Back"]["value"]
-                self._card_answer = response_json["result"]["fields"]["Front"]["value"]
-            self._card_difficult_value = response_json["result"]["buttons"][-1]
+                self._card_question = card_information["fields"]["Back"]["value"]
+                self._card_answer = card_information["fields"]["Front"]["value"]
+            self._card_difficult_value = card_information["buttons"][-1]
+            self._card_id = card_information.get("cardId")
+            # Indexed now, so that grading a spoken answer does not wait for it
+            if self._answer_grading:
+                started = time.perf_counter()
+                self._answer_grader = AnswerGrader(self._card_answer)
+                latency_metrics.observe(
+                    "answer_indexing", time.perf_counter() - started)
         except Exception as ex:
             # Reset defaults
+            self._card_id = None
             self._card_question = None
             self._card_answer = None
+            self._answer_grader = None
             self._card_difficult_value = 2
             # Handle exception
             logging.error(
                 f"An unknown exception occured when attempting to extract card information from API response: {ex}")
-            return
-        # Alert only if this was an explicit "attach" command (as opposed to a new card context update)
-        if called_through_attach_command:
-            print("Executed: attach")
-            if self._alert_sound_enabled:
-                audio_feedback_queue.put_nowait("Success: Attached.")
+            return False
+        return True
 
     def show(self):
-        """Reveals the answer of the current card shown within the Anki user interface."""
+        """Reveals the answer of the current card shown within the Anki user interface.
+
+        Returns:
+            str: The outcome ('executed', 'invalid_state', or 'failed').
+        """
         # Check valid state
         if self._current_state not in [AnkiStates.QUESTION]:
-            return
+            return "invalid_state"
         # Request to show answer
         http_method = "GET"
         payload = {"action": "guiShowAnswer",
                    "version": 6
                    }
         error_message = "show a card answer"
-        success, response = self._send_ankiconnect_request(
+        success, response = self._anki_connect.request(
             http_method, payload, error_message)
         # Change current context
-        if success:
-            print("Executed: show")
-            self._current_state = AnkiStates.ANSWER
+        if not success:
+            return "failed"
+        console.print("Executed: show")
+        self._current_state = AnkiStates.ANSWER
+        if self._read_aloud and self._card_answer is not None:
+            answer = card_field_to_speech(self._card_answer)
+            if answer != "":
+                audio_feedback_queue.put_nowait(answer)
+        return "executed"
 
-    def again(self):
-        """Marks the current card shown within the Anki user interface with an 'again' answer."""
-        # Check valid state
-        if self._current_state not in [AnkiStates.ANSWER]:
-            return
-        # Request to show answer
-        http_method = "POST"
-        payload = {
-            "action": "guiAnswerCard",
-            "version": 6,
-            "params": {
-                "ease": 1
-            }
-        }
-        error_message = "mark card as Failed"
-        success, response = self._send_ankiconnect_request(
-            http_method, payload, error_message)
-        # Change current context
-        if success:
-            print("Executed: again")
-            self._current_state = AnkiStates.QUESTION
-            self.get_current_card_information()
+    def _answer_card(self, ease, command_name, error_message):
+        """Answers the current card and fetches the next card in a single AnkiConnect 'multi'
+        request, so each answer costs one round trip rather than two.
 
-    def difficult(self):
-        """
-        Marks the current card shown within the Anki user interface with a 'difficult' answer.
-        Note that in the user interface this is shown as 'hard'; however, the primary command
-        of 'difficult' is used here as it's more successfully detected by the speech-to-text
-        module.
+        Args:
+            ease (int): The answer button to select (1 to 4).
+            command_name (str): The name of the command being executed (used for the command log).
+            error_message (str): A request-specific message to be included in any exceptions.
+
+        Returns:
+            str: The outcome ('executed', 'invalid_state', 'failed', or 'journaled').
         """
         # Check valid state
         if self._current_state not in [AnkiStates.ANSWER]:
-            return
-        # Request to show answer
-        http_method = "POST"
-        payload = {
-            "action": "guiAnswerCard",
-            "version": 6,
-            "params": {
-                "ease": self._card_difficult_value
+            return "invalid_state"
+        # Request to answer the card, and then get the information of the next card
+        actions = [
+            {
+                "action": "guiAnswerCard",
+                "params": {
+                    "ease": ease
+                }
+            },
+            {
+                "action": "guiCurrentCard"
             }
-        }
-        error_message = "mark card as Difficult (Hard)"
-        success, response = self._send_ankiconnect_request(
-            http_method, payload, error_message)
+        ]
+        # Journal the answer before it is sent, so that it is not lost if AnkiConnect can not be reached
+        sequence = None
+        if self._journal is not None and self._card_id is not None:
+            sequence = self._journal.append(self._card_id, ease, command_name)
+        success, results = self._anki_connect.multi(actions, error_message)
         # Change current context
-        if success:
-            print("Executed: difficult")
-            self._current_state = AnkiStates.QUESTION
-            self.get_current_card_information()
+        if success == False or results[0] in [None, False]:
+            if sequence is None:
+                return "failed"
+            if success == False and not self._anki_connect.connected:
+                # Replayed once AnkiConnect responds (until then, assume the next card is shown)
+                console.print(f"Journaled: {command_name} (AnkiConnect could not be reached)")
+                self._current_state = AnkiStates.QUESTION
+                self._card_id = None
+                return "journaled"
+            self._journal.resolve(sequence, "failed")
+            return "failed"
+        if sequence is not None:
+            self._journal.resolve(sequence, "applied")
+        console.print(f"Executed: {command_name}")
+        self._current_state = AnkiStates.QUESTION
+        if self._update_card_information(self._next_card_information(self._card_id, results[1])):
+            self._read_question_aloud()
+        return "executed"
 
-    def good(self):
-        """Marks the current card shown within the Anki user interface with a 'good' answer."""
-        # Check valid state
-        if self._current_state not in [AnkiStates.ANSWER]:
-            return
-        # Request to show answer
-        http_method = "POST"
-        payload = {
-            "action": "guiAnswerCard",
-            "version": 6,
-            "params": {
-                "ease": self._card_good_value
-            }
-        }
-        error_message = "mark card as Good"
-        success, response = self._send_ankiconnect_request(
-            http_method, payload, error_message)
-        # Change current context
-        if success:
-            print("Executed: good")
-            self._current_state = AnkiStates.QUESTION
-            self.get_current_card_information()
+    def _next_card_information(self, answered_card_id, card_information):
+        """Ensures that the card information refreshed after an answer is of the next card. From
+        Anki 2.1.45, answers are applied in the background and the next card is only shown once
+        the request that answered the card has completed, so a refresh within the same 'multi'
+        request returns the card just answered. It is then requested again (a limited number of
+        times, as the same card may legitimately be shown again, e.g., after 'again').
+
+        Args:
+            answered_card_id (int): The ID of the card answered (None if not known).
+            card_information (dict): The 'guiCurrentCard' result refreshed after the answer.
+
+        Returns:
+            dict: The 'guiCurrentCard' result of the card now shown (None if no card is shown).
+        """
+        for attempt in range(self.REFRESH_ATTEMPTS):
+            if answered_card_id is None or card_information is None or card_information.get("cardId") != answered_card_id:
+                break
+            if attempt > 0:
+                time.sleep(self.REFRESH_INTERVAL)
+            success, results = self._anki_connect.multi(
+                [{"action": "guiCurrentCard"}], "get next card information")
+            if success == False:
+                break
+            card_information = results[0]
+        return card_information
+
+    def flush_journal(self):
+        """Replays journaled answers (in order) once AnkiConnect can be reached and a card is
+        being reviewed (e.g., not while Anki shows the deck list after restarting). Each answer is
+        first reconciled against its card's modification time, so that an answer which did reach
+        Anki (e.g., where only the response was lost) is never applied twice, even if the same
+        card is shown again (e.g., after 'again' in a small deck). An answer that was not applied
+        is replayed if its card is shown, and is stale (skipped) once a different card is shown.
+
+        Returns:
+            bool: Indicator of whether all journaled answers have been resolved.
+        """
+        if self._journal is None or len(self._journal.pending()) == 0:
+            return True
+        card_ids = sorted({entry["card_id"]
+                          for entry in self._journal.pending()})
+        success, results = self._anki_connect.multi(
+            [{"action": "guiCurrentCard"}, {"action": "cardsInfo", "params": {"cards": card_ids}}],
+            "reconcile journaled answers")
+        card_information = results[0] if success else None
+        if card_information is None:
+            # Kept until a card is being reviewed
+            return False
+        # Card ID -> modification time (in seconds), where AnkiConnect provides it
+        modified = {card.get("cardId"): card["mod"] for card in results[1] or []
+                    if isinstance(card, dict) and "mod" in card}
+        replayed = False
+        for entry in self._journal.pending():
+            # Answering a card modifies it (within the same second as the journal entry at the earliest)
+            if modified.get(entry["card_id"], -1) >= int(entry["time"]):
+                self._journal.resolve(entry["sequence"], "applied")
+                continue
+            if card_information.get("cardId") != entry["card_id"]:
+                # A different card is shown, so the answer is stale
+                self._journal.resolve(entry["sequence"], "skipped")
+                continue
+            actions = [
+                {"action": "guiShowAnswer"},
+                {"action": "guiAnswerCard", "params": {"ease": entry["ease"]}},
+                {"action": "guiCurrentCard"}
+            ]
+            success, results = self._anki_connect.multi(
+                actions, f"replay journaled answer ({entry['command']})")
+            if success == False and not self._anki_connect.connected:
+                break
+            if success == False or results[1] in [None, False]:
+                self._journal.resolve(entry["sequence"], "failed")
+                continue
+            self._journal.resolve(entry["sequence"], "applied")
+            console.print(f"Replayed: {entry['command']}")
+            replayed = True
+            # Later answers to the same card are not covered by this modification
+            modified.pop(entry["card_id"], None)
+            card_information = self._next_card_information(
+                entry["card_id"], results[2])
+            if card_information is None:
+                break
+        # The card shown is now known, so the tracked context is corrected
+        if card_information is not None and self._update_card_information(card_information) and replayed:
+            self._read_question_aloud()
+        return len(self._journal.pending()) == 0
+
+    def execute_sequence(self, commands):
+        """Executes a sequence of commands from a single utterance (e.g., "show good") in as few
+        AnkiConnect 'multi' requests as possible, each ending with a refresh of the current card.
+        A request includes at most one answer, and ends with it: from Anki 2.1.45 the next card is
+        only shown once the request answering a card has completed, so commands for the next card
+        (e.g., the second 'show' of "show good show easy") are sent in a further request. The
+        sequence is first checked against the state each command leads to (e.g., 'show' is only
+        valid for a question), and is rejected without any request if a command would not be valid.
+
+        Args:
+            commands (list): The commands in order (each one of attach, show, again, difficult, good, easy, or close).
+
+        Returns:
+            str: The outcome ('executed', 'rejected', 'failed', 'journaled', or 'partial' if only the first commands were executed).
+        """
+        # (command, state after the command) for each command
+        steps = []
+        state = self._current_state
+        for command in commands:
+            if command == "attach":
+                valid_states, next_state = list(AnkiStates), AnkiStates.QUESTION
+            elif command == "show":
+                valid_states, next_state = [
+                    AnkiStates.QUESTION], AnkiStates.ANSWER
+            elif command in ["again", "difficult", "good", "easy"]:
+                valid_states, next_state = [
+                    AnkiStates.ANSWER], AnkiStates.QUESTION
+            elif command == "close":
+                valid_states, next_state = [
+                    AnkiStates.QUESTION, AnkiStates.ANSWER], AnkiStates.NONQUIZ
+            else:
+                valid_states = []
+            if state not in valid_states:
+                console.print(f"Rejected: {' '.join(commands)} ('{command}' is not valid after the previous commands)")
+                return "rejected"
+            steps.append((command, next_state))
+            state = next_state
+        # A request ends after each answer
+        batches = [[]]
+        for command, next_state in steps:
+            batches[-1].append((command, next_state))
+            if command in ["again", "difficult", "good", "easy"]:
+                batches.append([])
+        executed = []
+        outcome = "executed"
+        for batch in filter(None, batches):
+            batch_executed, outcome = self._execute_batch(
+                batch, commands)
+            executed += batch_executed
+            if outcome != "executed":
+                break
+        if len(executed) > 0:
+            console.print(f"Executed: {' '.join(executed)}")
+        if outcome == "failed" and len(executed) > 0:
+            return "partial"
+        return outcome
+
+    def _execute_batch(self, steps, commands):
+        """Executes commands from a sequence in a single AnkiConnect 'multi' request, ending with
+        a refresh of the current card (unless the deck is closed). Only the last command may be an
+        answer, which is journaled against the card currently shown.
+
+        Args:
+            steps (list): The (command, state after the command) of each command.
+            commands (list): The whole sequence of commands (used for the command log).
+
+        Returns:
+            list: The commands that were executed.
+            str: The outcome ('executed', 'failed', or 'journaled').
+        """
+        # The answer buttons are those of the card currently shown
+        answer_ease = {"again": 1, "difficult": self._card_difficult_value,
+                       "good": self._card_good_value, "easy": self._card_easy_value}
+        actions = []
+        for command, _ in steps:
+            if command == "show":
+                actions.append({"action": "guiShowAnswer"})
+            elif command in answer_ease:
+                actions.append({"action": "guiAnswerCard",
+                                "params": {"ease": answer_ease[command]}})
+            elif command == "close":
+                actions.append({"action": "guiDeckOverview",
+                                "params": {"name": "Default"}})
+            else:
+                # 'attach' only refreshes the current card
+                actions.append(None)
+        final_state = steps[-1][1]
+        requested_actions = [action for action in actions if action is not None]
+        if final_state != AnkiStates.NONQUIZ:
+            requested_actions.append({"action": "guiCurrentCard"})
+        answer = steps[-1][0] if steps[-1][0] in answer_ease else None
+        answered_card_id = self._card_id
+        sequence = None
+        if self._journal is not None and answered_card_id is not None and answer is not None:
+            sequence = self._journal.append(
+                answered_card_id, answer_ease[answer], answer)
+        success, results = self._anki_connect.multi(
+            requested_actions, f"execute '{' '.join(commands)}'")
+        if success == False:
+            if sequence is not None and not self._anki_connect.connected:
+                console.print(f"Journaled: {answer} (AnkiConnect could not be reached, so the rest of "
+                              f"'{' '.join(commands)}' was not executed)")
+                self._current_state = AnkiStates.QUESTION
+                self._card_id = None
+                return [], "journaled"
+            if sequence is not None:
+                self._journal.resolve(sequence, "failed")
+            return [], "failed"
+        # Follow the commands that succeeded
+        state = self._current_state
+        executed = []
+        action_results = iter(results)
+        for (command, next_state), action in zip(steps, actions):
+            if action is not None and next(action_results) in [None, False]:
+                break
+            executed.append(command)
+            state = next_state
+        if sequence is not None:
+            self._journal.resolve(
+                sequence, "applied" if answer in executed[-1:] else "failed")
+        outcome = "executed" if len(executed) == len(steps) else "failed"
+        if state == AnkiStates.NONQUIZ:
+            self._current_state = state
+            return executed, outcome
+        card_information = results[-1]
+        if answer in executed[-1:]:
+            card_information = self._next_card_information(
+                answered_card_id, card_information)
+        updated = self._update_card_information(card_information)
+        # The answer of the refreshed card is shown if the batch ended with 'show'
+        self._current_state = state
+        if updated and state == AnkiStates.QUESTION and answer in executed[-1:]:
+            self._read_question_aloud()
+        elif updated and state == AnkiStates.ANSWER and self._read_aloud and self._card_answer is not None:
+            answer_text = card_field_to_speech(self._card_answer)
+            if answer_text != "":
+                audio_feedback_queue.put_nowait(answer_text)
+        return executed, outcome
+
+    def grade_spoken_answer(self, transcript, confidence=None):
+        """Grades a spoken answer against the answer of the current card, and then shows the
+        answer and answers the card with the grade in a single request (or only answers the
+        card, if its answer is already shown). Speech that matches no word of the answer (e.g.,
+        a cough, or a side remark), or that was recognised with low confidence, is not graded,
+        so the card is left as it is.
+
+        Args:
+            transcript (str): The words identified through speech-to-text analysis.
+            confidence (float, optional): The recogniser's mean word confidence. Defaults to None (not known).
+
+        Returns:
+            str: The outcome ('executed', 'failed', 'journaled', 'partial', or 'no_answer' if there is no card answer to grade against, or the speech was not an answer).
+            str: The grade ('again', 'difficult', 'good', or 'easy'), or None if not graded.
+            float: The score of the spoken answer (0 to 1), or None if not scored.
+        """
+        if self._answer_grader is None or self._current_state not in [AnkiStates.QUESTION, AnkiStates.ANSWER]:
+            return "no_answer", None, None
+        if confidence is not None and confidence < AnswerGrader.MIN_CONFIDENCE:
+            console.print(
+                f"Not graded: '{transcript}' (recogniser confidence {confidence:.2f})")
+            return "no_answer", None, None
+        started = time.perf_counter()
+        score = self._answer_grader.score(transcript)
+        grade = self._answer_grader.grade(score)
+        latency_metrics.observe("answer_scoring", time.perf_counter() - started)
+        if score == 0:
+            console.print(
+                f"Not graded: '{transcript}' (no words of the answer '{self._answer_grader.answer}')")
+            return "no_answer", None, score
+        console.print(
+            f"Graded: '{transcript}' against '{self._answer_grader.answer}' (score {score:.2f}, {grade})")
+        commands = [grade] if self._current_state == AnkiStates.ANSWER else [
+            "show", grade]
+        return self.execute_sequence(commands), grade, score
+
+    def again(self):
+        """Marks the current card shown within the Anki user interface with an 'again' answer.
+
+        Returns:
+            str: The outcome ('executed', 'invalid_state', 'failed', or 'journaled').
+        """
+        return self._answer_card(1, "again", "mark card as Failed")
+
+    def difficult(self):
+        """
+        Marks the current card shown within the Anki user interface with a 'difficult' answer.
+        Note that in the user interface this is shown as 'hard'; however, the primary command
+        of 'difficult' is used here as it's more successfully detected by the speech-to-text
+        module.
+
+        Returns:
+            str: The outcome ('executed', 'invalid_state', 'failed', or 'journaled').
+        """
+        return self._answer_card(self._card_difficult_value,
+                          "difficult", "mark card as Difficult (Hard)")
+
+    def good(self):
+        """Marks the current card shown within the Anki user interface with a 'good' answer.
+
+        Returns:
+            str: The outcome ('executed', 'invalid_state', 'failed', or 'journaled').
+        """
+        return self._answer_card(self._card_good_value, "good", "mark card as Good")
 
     def easy(self):
-        """Marks the current card shown within the Anki user interface with an 'easy' answer."""
-        # Check valid state
-        if self._current_state not in [AnkiStates.ANSWER]:
-            return
-        # Request to show answer
-        http_method = "POST"
-        payload = {
-            "action": "guiAnswerCard",
-            "version": 6,
-            "params": {
-                "ease": self._card_easy_value
-            }
-        }
-        error_message = "mark card as Easy"
-        success, response = self._send_ankiconnect_request(
-            http_method, payload, error_message)
-        # Change current context
-        if success:
-            print("Executed: easy")
-            self._current_state = AnkiStates.QUESTION
-            self.get_current_card_information()
+        """Marks the current card shown within the Anki user interface with an 'easy' answer.
+
+        Returns:
+            str: The outcome ('executed', 'invalid_state', 'failed', or 'journaled').
+        """
+        return self._answer_card(self._card_easy_value, "easy", "mark card as Easy")
 
     def close(self):
-        """Closes the current deck review session and returns to the 'Default' Anki deck screen."""
+        """Closes the current deck review session and returns to the 'Default' Anki deck screen.
+
+        Returns:
+            str: The outcome ('executed', 'invalid_state', or 'failed').
+        """
         # Check valid state
         if self._current_state not in [AnkiStates.QUESTION, AnkiStates.ANSWER]:
-            return
+            return "invalid_state"
         # Request to close deck (returns to "Default" deck)
         http_method = "POST"
         payload = {
@@ -266,188 +1178,2147 @@ class AnkiActionHandler():
             }
         }
         error_message = "close current deck and return to default"
-        success, response = self._send_ankiconnect_request(
+        success, response = self._anki_connect.request(
             http_method, payload, error_message)
         # Change current context
-        if success:
-            print("Executed: close")
-            self._current_state = AnkiStates.NONQUIZ
+        if not success:
+            return "failed"
+        console.print("Executed: close")
+        self._current_state = AnkiStates.NONQUIZ
+        return "executed"
+
+
+class AudioRingBuffer():
+    """Thread-safe ring buffer of raw audio, preallocated so that the capture stage never
+    allocates or blocks while writing (the oldest audio is discarded if it becomes full)."""
+
+    def __init__(self, capacity):
+        """Constructor for AudioRingBuffer.
+
+        Args:
+            capacity (int): The size of the buffer in bytes.
+        """
+        self._buffer = bytearray(capacity)
+        self._capacity = capacity
+        self._read_position = 0
+        self._size = 0
+        self._closed = False
+        self._condition = threading.Condition()
+        # Statistics
+        self.written_bytes = 0
+        self.overflow_bytes = 0
+        self.overflow_count = 0
+
+    @property
+    def available(self):
+        """int: The number of bytes waiting to be read."""
+        return self._size
+
+    def write(self, data, block=False):
+        """Writes audio to the buffer.
+
+        Args:
+            data (bytes): The raw audio to be written (or any buffer of it, such as a NumPy array).
+            block (bool, optional): Waits for space rather than discarding the oldest audio when full. Defaults to False.
+        """
+        data = memoryview(data).cast("B")
+        with self._condition:
+            if block:
+                while self._capacity - self._size < min(len(data), self._capacity) and not self._closed:
+                    self._condition.wait()
+            self.written_bytes += len(data)
+            # Discard the oldest audio to make room
+            if len(data) > self._capacity:
+                self.overflow_bytes += len(data) - self._capacity
+                data = data[-self._capacity:]
+            overflow = len(data) - (self._capacity - self._size)
+            if overflow > 0:
+                self._read_position = (
+                    self._read_position + overflow) % self._capacity
+                self._size -= overflow
+                self.overflow_bytes += overflow
+                self.overflow_count += 1
+            write_position = (self._read_position +
+                              self._size) % self._capacity
+            first_part = min(len(data), self._capacity - write_position)
+            self._buffer[write_position:write_position +
+                         first_part] = data[:first_part]
+            self._buffer[:len(data) - first_part] = data[first_part:]
+            self._size += len(data)
+            self._condition.notify_all()
+
+    def read(self, size):
+        """Reads audio from the buffer, waiting until enough is available.
+
+        Args:
+            size (int): The number of bytes to read.
+
+        Returns:
+            bytes: The audio read (shorter only once the buffer has been closed, and empty when exhausted).
+        """
+        with self._condition:
+            while self._size < size and not self._closed:
+                self._condition.wait()
+            size = min(size, self._size)
+            first_part = min(size, self._capacity - self._read_position)
+            data = bytes(self._buffer[self._read_position:self._read_position + first_part]) + \
+                bytes(self._buffer[:size - first_part])
+            self._read_position = (self._read_position + size) % self._capacity
+            self._size -= size
+            self._condition.notify_all()
+            return data
+
+    def close(self):
+        """Closes the buffer, releasing any waiting readers or writers."""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+
+
+class VoiceActivityGate():
+    """Energy and zero-crossing rate based voice activity detection, used to skip speech
+    recognition for silent audio."""
+
+    def __init__(self, rms_threshold=300, zero_crossing_threshold=0.25, hangover_chunks=6, preroll_chunks=2):
+        """Constructor for VoiceActivityGate.
+
+        Args:
+            rms_threshold (int, optional): RMS amplitude (of 16-bit samples) above which audio is considered voice activity. Defaults to 300.
+            zero_crossing_threshold (float, optional): Zero-crossing rate above which quieter audio (e.g., 's' or 'sh' sounds) is considered voice activity. Defaults to 0.25.
+            hangover_chunks (int, optional): Chunks passed on after voice activity ends, so the recogniser can detect the end of an utterance. Defaults to 6.
+            preroll_chunks (int, optional): Chunks held back before voice activity starts, so the start of words are not clipped. Defaults to 2.
+        """
+        self._rms_threshold = rms_threshold
+        self._zero_crossing_threshold = zero_crossing_threshold
+        self._hangover_chunks = hangover_chunks
+        self._hangover_remaining = 0
+        self._preroll = collections.deque(maxlen=preroll_chunks)
+        self._active = False
+        # Statistics
+        self.total_chunks = 0
+        self.total_bytes = 0
+
+    @property
+    def in_hangover(self):
+        """bool: Whether the last chunk was passed on after voice activity ended (i.e., where the recogniser may detect the end of an utterance)."""
+        return self._active and self._hangover_remaining < self._hangover_chunks
+
+    def is_voice_activity(self, data):
+        """Determines whether a chunk of audio contains voice activity.
+
+        Args:
+            data (bytes): 16-bit mono audio.
+
+        Returns:
+            bool: Indicator of whether voice activity was detected.
+        """
+        samples = np.frombuffer(data, dtype=np.int16)
+        if samples.size == 0:
+            return False
+        rms = np.sqrt(np.mean(np.square(samples, dtype=np.float32)))
+        zero_crossing_rate = np.count_nonzero(
+            np.diff(np.signbit(samples))) / samples.size
+        return bool(rms >= self._rms_threshold or
+                    (rms >= self._rms_threshold / 2 and zero_crossing_rate >= self._zero_crossing_threshold))
+
+    def process(self, data):
+        """Gates a chunk of audio.
+
+        Args:
+            data (bytes): 16-bit mono audio.
+
+        Returns:
+            list: The chunks of audio to be decoded (including any held back before voice activity started).
+            bool: Indicator of whether voice activity has just ended (i.e., the utterance should be finalised).
+        """
+        self.total_chunks += 1
+        self.total_bytes += len(data)
+        if self.is_voice_activity(data):
+            audio_to_decode = [data] if self._active else list(
+                self._preroll) + [data]
+            self._preroll.clear()
+            self._active = True
+            self._hangover_remaining = self._hangover_chunks
+            return audio_to_decode, False
+        if self._active and self._hangover_remaining > 0:
+            self._hangover_remaining -= 1
+            return [data], False
+        self._preroll.append(data)
+        if self._active:
+            self._active = False
+            return [], True
+        return [], False
+
+
+class PolyphaseResampler():
+    """Stateful polyphase resampler for 16-bit audio (e.g., from a device's native 44.1kHz or
+    48kHz to the 16kHz the recogniser expects). A windowed sinc low-pass filter is split into
+    one short filter per output phase, so each output sample is a single dot product over
+    input samples. Output samples of the same phase use input windows a fixed stride apart, so
+    each phase's filter is applied to a strided view of the input (or, where there are more
+    phases than taps, the filters are applied one tap at a time), without copying a window of
+    input samples for each output sample."""
+
+    def __init__(self, input_rate, output_rate=16000, taps_per_phase=48):
+        """Constructor for PolyphaseResampler.
+
+        Args:
+            input_rate (int): Sample rate of the input audio.
+            output_rate (int, optional): Sample rate of the output audio. Defaults to 16000.
+            taps_per_phase (int, optional): Input samples per output sample (higher is more accurate but slower). Defaults to 48.
+        """
+        divisor = math.gcd(int(input_rate), int(output_rate))
+        self._up = int(output_rate) // divisor
+        self._down = int(input_rate) // divisor
+        self._taps = taps_per_phase
+        # Low-pass filter (just below the Nyquist frequency of the lower rate) at the upsampled rate
+        length = self._taps * self._up
+        cutoff = 0.45 / max(self._up, self._down)
+        time_points = np.arange(length) - (length - 1) / 2
+        prototype = 2 * cutoff * np.sinc(2 * cutoff * time_points) * \
+            np.kaiser(length, 8.0) * self._up
+        # Filter for each phase, ordered to apply to input samples from oldest to newest
+        self._phase_filters = np.ascontiguousarray(prototype.reshape(
+            self._taps, self._up).T[:, ::-1].astype(np.float32))
+        # The same filters by tap (i.e., the coefficient of each tap for every phase)
+        self._tap_filters = np.ascontiguousarray(self._phase_filters.T)
+        # Previous input samples needed by the filter, and the (upsampled) position of the next output sample
+        self._history = np.zeros(self._taps - 1, dtype=np.float32)
+        self._position = 0
+
+    def process(self, data):
+        """Resamples a block of audio, continuing from the previous block.
+
+        Args:
+            data (bytes): 16-bit mono audio at the input rate.
+
+        Returns:
+            numpy.ndarray: 16-bit mono audio at the output rate.
+        """
+        samples = np.frombuffer(data, dtype=np.int16)
+        if self._up == self._down:
+            return samples
+        signal_block = np.concatenate((self._history, samples))
+        # Upsampled positions of the output samples that this block completes
+        end = len(samples) * self._up
+        positions = np.arange(self._position, end, self._down)
+        self._position += len(positions) * self._down - end
+        self._history = signal_block[len(signal_block) - (self._taps - 1):]
+        # Each output sample is the dot product of its phase's filter and the preceding input samples
+        if self._up <= self._taps:
+            output = np.empty(len(positions), dtype=np.float32)
+            windows = np.lib.stride_tricks.sliding_window_view(
+                signal_block, self._taps)
+            for first in range(min(self._up, len(positions))):
+                # Every up-th output sample has the same phase, and starts down input samples later
+                phase_output = output[first::self._up]
+                phase_windows = windows[positions[first] //
+                                        self._up::self._down][:len(phase_output)]
+                np.matmul(phase_windows,
+                          self._phase_filters[positions[first] % self._up], out=phase_output)
+        else:
+            output = np.zeros(len(positions), dtype=np.float32)
+            oldest_samples = positions // self._up
+            phases = positions % self._up
+            for tap_filter in self._tap_filters:
+                output += tap_filter[phases] * signal_block[oldest_samples]
+                oldest_samples += 1
+        return np.clip(np.rint(output), -32768, 32767).astype(np.int16)
+
+
+class AudioSource(ABC):
+    """Base class for sources of 16kHz mono 16-bit audio, which write into the ring buffer
+    consumed by the recognition stage."""
+
+    # Bytes of audio replaced by silence as they were captured while feedback was spoken
+    muted_bytes = 0
+
+    @abstractmethod
+    def start(self, audio_buffer):
+        """Starts writing audio to the ring buffer.
+
+        Args:
+            audio_buffer (AudioRingBuffer): The buffer to write captured audio to.
+        """
+
+    @abstractmethod
+    def stop(self):
+        """Stops writing audio."""
+
+    def _write_captured(self, audio_buffer, data, block=False):
+        """Writes captured audio to the ring buffer. Audio captured while feedback is spoken (e.g.,
+        a card read aloud) is replaced by silence (rather than skipped, so an utterance in progress
+        still ends), so that card text is not recognised as commands, or graded as a spoken answer.
+        This is decided as the audio is captured, rather than when it is decoded (possibly after
+        the feedback has finished).
+
+        Args:
+            audio_buffer (AudioRingBuffer): The buffer to write captured audio to.
+            data (bytes): The captured audio (or any buffer of it, such as a NumPy array).
+            block (bool, optional): Waits for space rather than discarding the oldest audio when full. Defaults to False.
+        """
+        if audio_feedback_speaking.is_set():
+            data = bytes(memoryview(data).nbytes)
+            self.muted_bytes += len(data)
+        audio_buffer.write(data, block=block)
+
+
+class MicrophoneAudioSource(AudioSource):
+    """Captures audio from a microphone through a pyaudio callback. Audio is captured at the
+    device's native sample rate (which many USB and Bluetooth devices require), and resampled
+    to 16kHz."""
+
+    def __init__(self, chunk_ms=128, rate=None, device_index=None):
+        """Constructor for MicrophoneAudioSource.
+
+        Args:
+            chunk_ms (int, optional): Milliseconds of audio captured per callback. Defaults to 128.
+            rate (int, optional): Sample rate to capture at. Defaults to the device's native sample rate.
+            device_index (int, optional): The pyaudio input device. Defaults to the default input device.
+        """
+        self._chunk_ms = chunk_ms
+        self._rate = rate
+        self._device_index = device_index
+        self._resampler = None
+        self._audio_buffer = None
+        self._stream = None
+
+    def start(self, audio_buffer):
+        """Opens the microphone stream, and starts writing audio to the ring buffer.
+
+        Args:
+            audio_buffer (AudioRingBuffer): The buffer to write captured audio to.
+        """
+        self._audio_buffer = audio_buffer
+        audio = pyaudio.PyAudio()
+        rate = self._rate
+        if rate is None:
+            try:
+                device_info = audio.get_default_input_device_info() if self._device_index is None else \
+                    audio.get_device_info_by_index(self._device_index)
+                rate = int(device_info["defaultSampleRate"])
+            except Exception as ex:
+                logging.warning(
+                    f"The native sample rate of the microphone could not be determined (capturing at 16kHz): {ex}")
+                rate = 16000
+        self._resampler = PolyphaseResampler(rate) if rate != 16000 else None
+        self._stream = audio.open(format=pyaudio.paInt16, channels=1, rate=rate, input=True,
+                                  input_device_index=self._device_index,
+                                  frames_per_buffer=max(rate * self._chunk_ms // 1000, 1),
+                                  stream_callback=self._audio_callback)
+        self._stream.start_stream()
+
+    def stop(self):
+        """Stops the microphone stream."""
+        if self._stream is not None:
+            self._stream.stop_stream()
+
+    def _audio_callback(self, in_data, frame_count, time_info, status):
+        """Capture stage. Called by pyaudio (on its own thread) for each block of captured audio.
+
+        Args:
+            in_data (bytes): The captured audio.
+            frame_count (int): The number of frames captured.
+            time_info (dict): Timing information from pyaudio.
+            status (int): pyaudio status flags.
+
+        Returns:
+            tuple: No output data, and the flag to continue capturing.
+        """
+        if self._resampler is not None:
+            in_data = self._resampler.process(in_data)
+        self._write_captured(self._audio_buffer, in_data)
+        return (None, pyaudio.paContinue)
+
+
+class WaveFileAudioSource(AudioSource):
+    """Streams recorded audio files in place of a microphone, either at real-time speed or
+    as fast as speech recognition allows. Each file is treated as a single utterance."""
+
+    def __init__(self, paths, realtime=True, frames_per_buffer=2048, trailing_silence=1.0):
+        """Constructor for WaveFileAudioSource.
+
+        Args:
+            paths (list): WAV files of mono 16-bit audio (resampled to 16kHz if required), or raw PCM files (.raw or .pcm) of 16kHz mono 16-bit audio.
+            realtime (bool, optional): Streams audio at real-time speed (otherwise as fast as possible). Defaults to True.
+            frames_per_buffer (int, optional): Number of frames written at a time. Defaults to 2048.
+            trailing_silence (float, optional): Seconds of silence written after each file, so utterances end. Defaults to 1.0.
+
+        Raises:
+            AnkiVoiceError: Handles audio files that are not mono 16-bit audio.
+        """
+        self._audio = [self._load_audio(path) for path in paths]
+        self._realtime = realtime
+        self._frames_per_buffer = frames_per_buffer
+        self._trailing_silence = bytes(2 * int(16000 * trailing_silence))
+        self._stopped = threading.Event()
+        self._thread = None
+        # Position (in bytes) of the start and speech end of each file, and when its speech was written
+        self.utterance_start_positions = []
+        self.utterance_end_positions = []
+        self.utterance_end_times = []
+
+    @staticmethod
+    def _load_audio(path):
+        """Loads the raw audio from a WAV or raw PCM file.
+
+        Args:
+            path (str): The audio file.
+
+        Raises:
+            AnkiVoiceError: Handles audio files that are not mono 16-bit audio.
+
+        Returns:
+            bytes: 16kHz mono 16-bit audio.
+        """
+        if Path(path).suffix.lower() in [".raw", ".pcm"]:
+            return Path(path).read_bytes()
+        with wave.open(str(path), "rb") as wave_file:
+            if wave_file.getnchannels() != 1 or wave_file.getsampwidth() != 2:
+                raise AnkiVoiceError(
+                    f"Audio file must be mono 16-bit audio: {path}")
+            audio = wave_file.readframes(wave_file.getnframes())
+            if wave_file.getframerate() != 16000:
+                audio = PolyphaseResampler(
+                    wave_file.getframerate()).process(audio).tobytes()
+            return audio
+
+    @property
+    def duration(self):
+        """float: Total seconds of audio streamed (including trailing silence)."""
+        return sum(len(audio) + len(self._trailing_silence) for audio in self._audio) / (2 * 16000)
+
+    def start(self, audio_buffer):
+        """Starts streaming the audio files to the ring buffer (which is closed once complete).
+
+        Args:
+            audio_buffer (AudioRingBuffer): The buffer to write audio to.
+        """
+        self._thread = threading.Thread(
+            target=self._stream_audio, args=(audio_buffer,), daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stops streaming audio."""
+        self._stopped.set()
+
+    def _stream_audio(self, audio_buffer):
+        """Writes each file (followed by silence) to the ring buffer, paced to real-time if required.
+
+        Args:
+            audio_buffer (AudioRingBuffer): The buffer to write audio to.
+        """
+        chunk_size = 2 * self._frames_per_buffer
+        position = 0
+        started = time.perf_counter()
+        for audio in self._audio:
+            self.utterance_start_positions.append(position)
+            for section in [audio, self._trailing_silence]:
+                for offset in range(0, len(section), chunk_size):
+                    if self._stopped.is_set():
+                        audio_buffer.close()
+                        return
+                    chunk = section[offset:offset + chunk_size]
+                    if self._realtime:
+                        # Wait until the chunk would have been captured by a microphone
+                        delay = started + \
+                            (position + len(chunk)) / \
+                            (2 * 16000) - time.perf_counter()
+                        if delay > 0:
+                            time.sleep(delay)
+                    self._write_captured(audio_buffer, chunk, block=True)
+                    position += len(chunk)
+                if section is audio:
+                    self.utterance_end_positions.append(position)
+                    self.utterance_end_times.append(time.perf_counter())
+        audio_buffer.close()
+
+
+def phonetic_key(text):
+    """Derives a phonetic key for text (a simplified form of Metaphone), so that words which
+    sound alike (e.g., "a touch" and "attach") share the same key.
+
+    Args:
+        text (str): The text (one or more words).
+
+    Returns:
+        str: The phonetic key.
+    """
+    key = ""
+    for word in re.sub(r"[^a-z ]", "", text.lower()).split():
+        for spelling, sound in [("sch", "sk"), ("tch", "X"), ("sh", "X"), ("ch", "X"), ("ph", "f"), ("th", "0"),
+                                ("ck", "k"), ("gh", ""), ("kn", "n"), ("wr", "r"), ("wh", "w"), ("qu", "kw")]:
+            word = word.replace(spelling, sound)
+        word = re.sub(r"c(?=[eiy])", "s", word)
+        # Merge letters with similar (e.g., voiced and unvoiced) sounds
+        word = word.translate(str.maketrans("cqzxbdgv", "kkssptkf"))
+        # Silent letters only (e.g., "gh")
+        if word == "":
+            continue
+        # Keep an initial vowel, and 'h', 'w', and 'y' only before a vowel
+        word_key = "A" if word[0] in "aeiou" else ""
+        for index, letter in enumerate(word):
+            next_letter_is_vowel = index + \
+                1 < len(word) and word[index + 1] in "aeiou"
+            if letter in "aeiou" or (letter in "hwy" and not next_letter_is_vowel):
+                continue
+            word_key += letter
+        key += word_key
+    # Collapse repeated sounds
+    return re.sub(r"(.)\1+", r"\1", key)
+
+
+def edit_distance(first, second):
+    """Calculates the Levenshtein edit distance between two strings.
+
+    Args:
+        first (str): The first string.
+        second (str): The second string.
+
+    Returns:
+        int: The minimum number of single character insertions, deletions, and substitutions.
+    """
+    if len(first) < len(second):
+        first, second = second, first
+    previous_row = list(range(len(second) + 1))
+    for first_index, first_character in enumerate(first, 1):
+        current_row = [first_index]
+        for second_index, second_character in enumerate(second, 1):
+            current_row.append(min(previous_row[second_index] + 1, current_row[second_index - 1] + 1,
+                                   previous_row[second_index - 1] + (first_character != second_character)))
+        previous_row = current_row
+    return previous_row[-1]
+
+
+class CommandMatcher():
+    """Matches detected words to anki-voice commands. Compiled once from the JSON command
+    configuration into a hash index of phrases (for exact matches), and phonetic and deletion
+    indexes (for near misses not listed in 'related_words'), so that matching takes near-constant
+    time regardless of the number of phrases."""
+
+    COMMANDS = ["attach", "show", "again", "difficult",
+                "good", "easy", "pause", "unpause", "close", "quit"]
+    # Commands that are only recognised if defined in the configuration
+    OPTIONAL_COMMANDS = ["reload"]
+    # Commands that are too disruptive to execute from a near miss (e.g., "quiet" for "quit")
+    EXACT_ONLY_COMMANDS = ["close", "quit"]
+    # Detected words whose normalised form is kept, so that repeated speech is not normalised again
+    NORMALISED_CACHE_SIZE = 1024
+
+    def __init__(self, command_config_json, fuzzy_threshold=0.75, spelling_threshold=0.85):
+        """Constructor for CommandMatcher.
+
+        Args:
+            command_config_json (dict): The parsed JSON command configuration.
+            fuzzy_threshold (float, optional): Minimum spelling similarity (0 to 1) for near misses that sound like a command phrase. Defaults to 0.75.
+            spelling_threshold (float, optional): Minimum spelling similarity (0 to 1) for near misses that do not sound like a command phrase (e.g., "difficul"). Defaults to 0.85.
+
+        Raises:
+            AnkiVoiceError: Handles anki-voice errors, in particular here for missing command definitions.
+        """
+        self._fuzzy_threshold = fuzzy_threshold
+        self._spelling_threshold = spelling_threshold
+        # Detected words -> normalised words (cleared when full, as matchers are shared between threads in server mode)
+        self._normalised_words = {}
+        # Normalised phrase -> command
+        self._phrase_index = {}
+        for command in self.COMMANDS + self.OPTIONAL_COMMANDS:
+            if command not in command_config_json:
+                if command in self.OPTIONAL_COMMANDS:
+                    continue
+                raise AnkiVoiceError(
+                    f"Malformed commands. Missing the command (key): {command}")
+            related_words = command_config_json[command].get("related_words") if isinstance(
+                command_config_json[command], dict) else None
+            if not isinstance(related_words, list) or not all(isinstance(phrase, str) for phrase in related_words):
+                raise AnkiVoiceError(
+                    f"Malformed commands. 'related_words' must be a list of words for the command: {command}")
+            for phrase in [command] + related_words:
+                normalised_phrase = self.normalise(phrase)
+                if normalised_phrase == "":
+                    raise AnkiVoiceError(
+                        f"Malformed commands. 'related_words' must not contain empty words for the command: {command}")
+                if self._phrase_index.setdefault(normalised_phrase, command) != command:
+                    raise AnkiVoiceError(
+                        f"Malformed commands. The words '{phrase}' are used for both the commands: {self._phrase_index[normalised_phrase]} and {command}")
+        # All command phrases, used to constrain the recogniser vocabulary
+        self.phrases = sorted(self._phrase_index)
+        self._longest_phrase = max(len(phrase.split()) for phrase in self.phrases)
+        # Phrases that can be executed from a partial result, excluding those that begin a longer phrase (e.g., "detection")
+        self.partial_phrases = {phrase for phrase in self.phrases if not any(
+            other.startswith(phrase + " ") for other in self.phrases)}
+        # Phonetic key -> phrases, and single character deletion -> phrases
+        self._phonetic_index = collections.defaultdict(set)
+        self._deletion_index = collections.defaultdict(set)
+        for phrase in self.phrases:
+            if self._phrase_index[phrase] in self.EXACT_ONLY_COMMANDS:
+                continue
+            self._phonetic_index[phonetic_key(phrase)].add(phrase)
+            for deletion in self._deletions(phrase):
+                self._deletion_index[deletion].add(phrase)
+
+    @staticmethod
+    def normalise(words):
+        """Normalises words for matching (lower case, without punctuation or repeated spaces).
+
+        Args:
+            words (str): The words to be normalised.
+
+        Returns:
+            str: The normalised words.
+        """
+        return " ".join(re.sub(r"[^\w' ]", " ", words.lower()).split())
+
+    @staticmethod
+    def _deletions(phrase):
+        """Gets the phrase, and each variant of it with a single character deleted.
+
+        Args:
+            phrase (str): The phrase.
+
+        Returns:
+            set: The phrase and its deletion variants.
+        """
+        return {phrase} | {phrase[:index] + phrase[index + 1:] for index in range(len(phrase))}
+
+    def match(self, detected_words, fuzzy=True):
+        """Matches detected words to a command.
+
+        Args:
+            detected_words (str): The words identified through speech-to-text analysis.
+            fuzzy (bool, optional): Permits near miss matches (otherwise only exact phrases match). Defaults to True.
+
+        Returns:
+            str: The command (e.g., "show"), or None if the words are not a command.
+            float: The confidence of the match (1.0 for exact matches).
+        """
+        # Recogniser output is usually already normalised
+        command = self._phrase_index.get(detected_words)
+        if command is not None:
+            return command, 1.0
+        words = self._normalised_words.get(detected_words)
+        if words is None:
+            words = self.normalise(detected_words)
+            if len(self._normalised_words) >= self.NORMALISED_CACHE_SIZE:
+                self._normalised_words.clear()
+            self._normalised_words[detected_words] = words
+        command = self._phrase_index.get(words)
+        if command is not None:
+            return command, 1.0
+        # Very short words are too easily confused to match approximately
+        if not fuzzy or len(words.replace(" ", "")) < 3:
+            return None, 0.0
+        # Candidates that sound alike, or are a single edit away
+        words_key = phonetic_key(words)
+        phonetic_candidates = self._phonetic_index.get(words_key, set())
+        candidates = set(phonetic_candidates)
+        for deletion in self._deletions(words):
+            candidates |= self._deletion_index.get(deletion, set())
+        best_command, best_confidence, ambiguous = None, 0.0, False
+        for phrase in candidates:
+            similarity = 1 - edit_distance(words, phrase) / \
+                max(len(words), len(phrase))
+            # Sounding alike is stronger evidence than similar spelling, so words that only look
+            # alike (e.g., "food" and "good") must be spelt more similarly
+            if phrase in phonetic_candidates:
+                if similarity < self._fuzzy_threshold:
+                    continue
+                similarity = (1 + similarity) / 2
+            elif similarity < self._spelling_threshold:
+                continue
+            command = self._phrase_index[phrase]
+            if similarity > best_confidence:
+                best_command, best_confidence, ambiguous = command, similarity, False
+            elif similarity == best_confidence and command != best_command:
+                ambiguous = True
+        if best_command is None or ambiguous:
+            return None, 0.0
+        return best_command, best_confidence
+
+    def identify(self, detected_words):
+        """Identifies which command (or sequence of commands) detected words correspond to. Exact
+        phrases are preferred, then a sequence of commands, and then a near miss of a phrase. Words
+        that were not recognised ('[unk]') are ignored.
+
+        Args:
+            detected_words (str): The words identified through speech-to-text analysis.
+
+        Returns:
+            str: The command (e.g., "show"), the commands separated by spaces for several commands (e.g., "show good"), or None if the words are not a command.
+            float: The confidence of the match (1.0 for exact matches, and for several commands).
+        """
+        words = " ".join(word for word in detected_words.split() if word != "[unk]")
+        command, confidence = self.match(words, fuzzy=False)
+        if command is None:
+            commands = self.tokenize(words)
+            if len(commands) > 1:
+                return " ".join(commands), 1.0
+            command, confidence = self.match(words)
+        return command, confidence
+
+    def tokenize(self, detected_words, fuzzy=True):
+        """Splits detected words into a sequence of commands (e.g., "show good" into "show" and
+        "good"), matching the longest command phrase at each position. Only single words are
+        matched approximately.
+
+        Args:
+            detected_words (str): The words identified through speech-to-text analysis.
+            fuzzy (bool, optional): Permits near miss matches of single words. Defaults to True.
+
+        Returns:
+            list: The commands in order, or an empty list if any words (other than '[unk]') are not part of a command.
+        """
+        words = self.normalise(" ".join(
+            word for word in detected_words.split() if word != "[unk]")).split()
+        commands = []
+        index = 0
+        while index < len(words):
+            for length in range(min(self._longest_phrase, len(words) - index), 0, -1):
+                command, _ = self.match(
+                    " ".join(words[index:index + length]), fuzzy=fuzzy and length == 1)
+                if command is not None:
+                    commands.append(command)
+                    index += length
+                    break
+            else:
+                return []
+        return commands
+
+
+class AnswerGrader():
+    """Grades a spoken answer against the answer of a card. The card's answer is normalised and
+    indexed (by its words and their phonetic keys) once, when the card is shown, so that grading
+    an utterance only looks up each spoken word, and finishes within a millisecond of the
+    utterance ending."""
+
+    # Minimum score (0 to 1) for each grade, from the highest (lower scores are graded 'again')
+    GRADE_THRESHOLDS = [(0.9, "easy"), (0.75, "good"), (0.5, "difficult")]
+    # Minimum recogniser confidence (mean word confidence) for an utterance to be graded as an answer
+    MIN_CONFIDENCE = 0.6
+    # Words that carry little meaning on their own (including hesitations), so are ignored in answers and spoken answers
+    IGNORED_WORDS = {"a", "an", "the", "and", "or", "of", "to", "in", "on", "is", "are", "was", "it", "it's", "its",
+                     "i", "i'm", "think", "maybe", "um", "uh", "er", "erm", "unk"}
+
+    def __init__(self, answer):
+        """Constructor for AnswerGrader.
+
+        Args:
+            answer (str): The HTML value of the card's answer field.
+        """
+        self.answer = card_field_to_speech(answer)
+        self._words = self.normalise(self.answer)
+        self._word_counts = collections.Counter(self._words)
+        # Phonetic key -> answer words (e.g., for names spelt differently to how they are transcribed)
+        self._phonetic_index = collections.defaultdict(set)
+        for word in self._word_counts:
+            key = phonetic_key(word)
+            # Words without a phonetic key (e.g., "gh") are only matched by spelling
+            if key != "":
+                self._phonetic_index[key].add(word)
+
+    @classmethod
+    def normalise(cls, text):
+        """Normalises text into the words that are compared between answers (without plural
+        endings, e.g., "ribosomes" and "ribosome" are the same word).
+
+        Args:
+            text (str): The text (e.g., a card answer, or a transcript).
+
+        Returns:
+            list: The normalised words.
+        """
+        return [word[:-1] if len(word) > 3 and word.endswith("s") and not word.endswith("ss") else word
+                for word in CommandMatcher.normalise(text).split() if word not in cls.IGNORED_WORDS]
+
+    def score(self, transcript):
+        """Scores a spoken answer by the similarity of its words to the card's answer (each answer
+        word is matched at most once). Missing answer words count against the score more than
+        extra spoken words (e.g., "I think it's ...").
+
+        Args:
+            transcript (str): The words identified through speech-to-text analysis.
+
+        Returns:
+            float: The score, from 0 (no similarity) to 1 (every word matched).
+        """
+        spoken_words = self.normalise(transcript)
+        if len(self._words) == 0 or len(spoken_words) == 0:
+            return 0.0
+        unmatched = collections.Counter(self._word_counts)
+        matched = 0.0
+        index = 0
+        while index < len(spoken_words):
+            word = spoken_words[index]
+            index += 1
+            # A word transcribed as two (e.g., "washing ton" for "washington")
+            if unmatched[word] == 0 and index < len(spoken_words) and unmatched[word + spoken_words[index]] > 0:
+                word += spoken_words[index]
+                index += 1
+            if unmatched[word] > 0:
+                match, similarity = word, 1.0
+            else:
+                # Sounding alike is stronger evidence than similar spelling
+                match, similarity = next((
+                    (candidate, 0.9) for candidate in self._phonetic_index.get(phonetic_key(word), ())
+                    if unmatched[candidate] > 0), (None, 0.0))
+                if match is None and len(word) >= 4:
+                    for candidate, count in unmatched.items():
+                        if count == 0 or abs(len(candidate) - len(word)) > 2:
+                            continue
+                        candidate_similarity = 1 - edit_distance(word, candidate) / max(len(word), len(candidate))
+                        if candidate_similarity >= 0.75 and candidate_similarity > similarity:
+                            match, similarity = candidate, candidate_similarity
+            if match is not None:
+                unmatched[match] -= 1
+                matched += similarity
+        recall = matched / len(self._words)
+        precision = matched / len(spoken_words)
+        if recall == 0:
+            return 0.0
+        # F-score weighting recall twice as much as precision
+        return 5 * precision * recall / (4 * precision + recall)
+
+    def grade(self, score):
+        """Maps a score to an answer command.
+
+        Args:
+            score (float): The score of a spoken answer.
+
+        Returns:
+            str: The answer command ('again', 'difficult', 'good', or 'easy').
+        """
+        return next((grade for threshold, grade in self.GRADE_THRESHOLDS if score >= threshold), "again")
+
+
+def model_directories():
+    """Gets the directories searched for speech recognition models given by name.
+
+    Returns:
+        list: The current folder, the anki-voice folder (and its 'models' folder), and the folder vosk downloads models to.
+    """
+    script_directory = Path(__file__).resolve().parent
+    return [Path.cwd(), script_directory, script_directory / "models", Path.home() / ".cache" / "vosk"]
+
+
+def installed_models():
+    """Finds the speech recognition models installed in the model directories.
+
+    Returns:
+        list: The path of each model directory (e.g., ".../models/vosk-model-small-en-us-0.15").
+    """
+    models = {}
+    for directory in model_directories():
+        if not directory.is_dir():
+            continue
+        for path in sorted(directory.iterdir()):
+            # Recent models have 'am' and 'conf' folders, and older models have their files at the top level
+            if path.is_dir() and (Path(path, "am").is_dir() or Path(path, "conf", "model.conf").is_file()
+                                  or Path(path, "final.mdl").is_file()):
+                models.setdefault(path.resolve(), str(path))
+    return list(models.values())
+
+
+def find_model(model="model"):
+    """Finds a speech recognition model by path, or by name in the model directories. A name may
+    be part of a model's name, if it matches only one installed model (e.g., "small" for
+    "vosk-model-small-en-us-0.15").
+
+    Args:
+        model (str, optional): The path or name of the model. Defaults to "model".
+
+    Returns:
+        str: The path of the model directory, or None if the model could not be found.
+    """
+    if Path(model).is_dir():
+        return str(Path(model))
+    for directory in model_directories():
+        if Path(directory, model).is_dir():
+            return str(Path(directory, model))
+    matches = matching_models(model)
+    return matches[0] if len(matches) == 1 else None
+
+
+def matching_models(model):
+    """Finds the installed speech recognition models whose names contain a name.
+
+    Args:
+        model (str): The name (or part of the name) of the model.
+
+    Returns:
+        list: The path of each matching model directory.
+    """
+    return [path for path in installed_models() if model.lower() in Path(path).name.lower()]
+
+
+def model_not_found_reason(model):
+    """Describes why a speech recognition model could not be found: either no installed model
+    matches it, or several do (e.g., "small" for two small models).
+
+    Args:
+        model (str): The path or name of the model that could not be found.
+
+    Returns:
+        str: The reason, naming any installed models that match.
+    """
+    matches = matching_models(model)
+    if len(matches) > 1:
+        return (f"The speech recognition model '{model}' is ambiguous, as it matches several installed models: "
+                f"{', '.join(Path(path).name for path in matches)}")
+    return f"The speech recognition model '{model}' could not be found"
+
+
+def print_model_not_found(model):
+    """Prints why a speech recognition model could not be found, and how to install one (or
+    the models already installed).
+
+    Args:
+        model (str): The path or name of the model that could not be found.
+    """
+    print(f"{model_not_found_reason(model)}.")
+    if len(matching_models(model)) > 1:
+        print("Please select one of these models by its full name with --model.")
+        return
+    print("Please download a model from https://github.com/alphacep/vosk-api/blob/master/doc/models.md and unpack as 'model' (directory) in the current folder, "
+          "or into a 'models' folder and select it with --model.")
+    models = installed_models()
+    if len(models) > 0:
+        print("Installed models: " + ", ".join(Path(path).name for path in models))
+
+
+def missing_vocabulary(model, phrases):
+    """Finds the words of command phrases that are not in the vocabulary of a speech recognition
+    model. Vosk ignores such words in a grammar (without a warning, as its logging is disabled), so
+    a phrase containing one can never be recognised.
+
+    Args:
+        model (Model): The vosk model.
+        phrases (list): The command phrases.
+
+    Returns:
+        list: The missing words (empty if the model can not look up words).
+    """
+    words = sorted({word for phrase in phrases for word in phrase.split()})
+    try:
+        # Named 'vosk_model_find_word' in older versions of vosk
+        find_word = getattr(model, "find_word", None) or model.vosk_model_find_word
+        return [word for word in words if find_word(word) == -1]
+    except (AttributeError, OSError) as ex:
+        logging.error(
+            f"An error occured when attempting to check the command words against the speech recognition model: {ex}")
+        return []
+
+
+def log_missing_vocabulary(model, matcher):
+    """Logs the command phrases that can not be recognised, as their words are not in the
+    vocabulary of the speech recognition model.
+
+    Args:
+        model (Model): The vosk model.
+        matcher (CommandMatcher): The compiled command configuration.
+    """
+    missing_words = set(missing_vocabulary(model, matcher.phrases))
+    if len(missing_words) == 0:
+        return
+    phrases = [phrase for phrase in matcher.phrases if missing_words & set(phrase.split())]
+    logging.warning(
+        f"Command phrases that can not be recognised, as the speech recognition model does not know the words "
+        f"'{', '.join(sorted(missing_words))}' (use other words, or --full_vocabulary): {', '.join(phrases)}")
+
+
+def recogniser_confidence(result):
+    """Gets the recogniser's confidence in a final result, as the mean confidence of its words.
+
+    Args:
+        result (dict): The parsed JSON result from a recogniser with word information enabled.
+
+    Returns:
+        float: The mean word confidence (0 to 1), or None if the result has no word information.
+    """
+    words = result.get("result", [])
+    if len(words) == 0:
+        return None
+    return round(sum(word.get("conf", 0.0) for word in words) / len(words), 3)
 
 
 class AnkiSpeechToCommand():
     """ Manages speech-to-text for Anki-related commands."""
 
-    def __init__(self, command_config="commands.json", alert_sound_enabled=True):
+    # Seconds between attempts to replay journaled answers while no commands are issued
+    JOURNAL_RETRY_INTERVAL = 2.0
+    # Seconds between checks for changes to the JSON command file
+    COMMAND_CONFIG_POLL_INTERVAL = 1.0
+    # Most chunks decoded in a single recogniser call with adaptive chunking
+    MAX_CHUNKS_PER_DECODE = 8
+    # Commands that control anki-voice itself, rather than Anki
+    CONTROL_COMMANDS = ["pause", "unpause", "quit", "reload"]
+
+    def __init__(self, command_config="commands.json", alert_sound_enabled=True, anki_connect_client=None, full_vocabulary=False, partial_results=False, partial_stability=2, vad_enabled=True, vad_threshold=300, audio_source=None, read_aloud=False, journal=None, watch_command_config=False, chunk_ms=128, adaptive_chunking=False, answer_grading=False, model="model"):
         """Constructor for AnkiSpeechToCommand. Initialises vosk speech-to-text module,
         AnkiConnect API handler object, and derives word commands from a JSON file.
 
         Args:
             command_config (str, optional): Filename for the JSON command file. Defaults to "commands.json".
             alert_sound_enabled (bool, optional): Controls confirmation sound for attach, pause, and unpause commands. Defaults to True.
+            anki_connect_client (AnkiConnectClient, optional): Client used for all AnkiConnect API requests. Defaults to a client for localhost.
+            full_vocabulary (bool, optional): Decodes against the full model vocabulary rather than only the command words. Defaults to False.
+            partial_results (bool, optional): Executes commands from stable partial results, rather than waiting for the final result. Defaults to False.
+            partial_stability (int, optional): Number of consecutive identical partial results required before a command is executed. Defaults to 2.
+            vad_enabled (bool, optional): Skips speech recognition for audio without voice activity. Defaults to True.
+            vad_threshold (int, optional): RMS amplitude (of 16-bit samples) above which audio is considered voice activity. Defaults to 300.
+            audio_source (AudioSource, optional): Source of audio for speech recognition. Defaults to the default microphone.
+            read_aloud (bool, optional): Speaks the question of each new card, and the answer when shown. Defaults to False.
+            journal (AnswerJournal, optional): Journal of answers, replayed if AnkiConnect could not be reached. Defaults to None (answers are not journaled).
+            watch_command_config (bool, optional): Reloads the JSON command file whenever it is modified. Defaults to False.
+            chunk_ms (int, optional): Milliseconds of audio per chunk for capture and voice activity detection (smaller is lower latency, but uses more CPU). Defaults to 128.
+            adaptive_chunking (bool, optional): Decodes several chunks per recogniser call when speech recognition falls behind. Defaults to False.
+            answer_grading (bool, optional): Transcribes utterances that are not commands with a parallel full vocabulary recogniser, and grades them as spoken answers to the current card (requires voice activity detection). Defaults to False.
+            model (str, optional): The path or name of the speech recognition model (see find_model). Defaults to "model".
 
         Raises:
             json.decoder.JSONDecodeError: Handles decode errors from the JSON command file, such as malformed syntax.
             AnkiVoiceError: Handles anki-voice errors, in particular here for missing command definitions.
         """
         # Verify speech-to-text engine (vosk) model exists
-        if not Path(Path(__file__).resolve().parent, "Model").is_dir():
-            print("Please download the model from https://github.com/alphacep/vosk-api/blob/master/doc/models.md and unpack as 'model' (directory) in the current folder.")
+        self._model_path = find_model(model)
+        if self._model_path is None:
+            print_model_not_found(model)
             sys.exit(1)
-        # Configure speech-to-text engine
+        # Parse command JSON configuation (required for the recogniser grammar)
+        self._command_config = command_config
+        self.command_config_load(command_config)
+        # A reloaded configuration, swapped in by the recognition stage at the end of an utterance
+        self._pending_matcher = None
+        self._pending_matcher_lock = threading.Lock()
+        self._watch_command_config = watch_command_config
+        # Configure speech-to-text engine (the model is loaded in the background, as it is slow to load)
         SetLogLevel(-10)
-        self._model = Model("model")
-        self._recogniser = KaldiRecognizer(self._model, 16000)
-        self._stream = pyaudio.PyAudio().open(format=pyaudio.paInt16, channels=1,
-                                              rate=16000, input=True, frames_per_buffer=2048)
-        self._stream.start_stream()
+        self._full_vocabulary = full_vocabulary
+        self._model = None
+        self._recogniser = None
+        self._answer_recogniser = None
+        # Spoken answers: speech is also passed to a parallel full vocabulary recogniser, followed by
+        # a marker at the end of each utterance (at most 30 seconds of audio wait to be decoded)
+        if answer_grading and not vad_enabled:
+            logging.warning(
+                "Spoken answers are only graded with voice activity detection enabled.")
+        self._answer_audio_queue = queue.Queue() if answer_grading and vad_enabled else None
+        self._answer_audio_limit = max(30000 // chunk_ms, 1)
+        self._answer_audio_incomplete = False
+        self._utterance_commands = 0
+        self._dropped_answer_audio = 0
+        self._model_ready = threading.Event()
+        self.model_load_time = None
+        self._model_loading = threading.Thread(
+            target=self._load_model, daemon=True)
+        self._model_loading.start()
+        # Pipeline stages: capture (audio source) -> ring buffer -> recognition -> command queue -> dispatch
+        if audio_source is None:
+            audio_source = MicrophoneAudioSource(chunk_ms=chunk_ms)
+        self._audio_source = audio_source
+        # 30 seconds (also holds audio captured while the model is loading)
+        self._audio_buffer = AudioRingBuffer(16000 * 2 * 30)
+        self._chunk_bytes = 2 * 16 * chunk_ms
+        self._adaptive_chunking = adaptive_chunking
+        self._audio_position = 0
+        self._command_queue = queue.Queue(maxsize=16)
+        self._dropped_commands = 0
+        self._reported_overflow_count = 0
+        # Voice activity detection (in front of the recogniser)
+        # (the hangover and preroll durations are independent of the chunk size)
+        self._voice_activity_gate = VoiceActivityGate(rms_threshold=vad_threshold, hangover_chunks=max(round(768 / chunk_ms), 1),
+                                                      preroll_chunks=max(round(256 / chunk_ms), 1)) if vad_enabled else None
+        self._decoded_bytes = 0
+        self._decode_cpu_time = 0.0
+        self._audio_received_time = None
+        # (time, audio position, detected words, command) for each detected command
+        self.command_history = collections.deque(maxlen=10000)
         # Create AnkiConnect API handler object
         self._anki_action = AnkiActionHandler(
-            alert_sound_enabled=alert_sound_enabled)
+            alert_sound_enabled=alert_sound_enabled, anki_connect_client=anki_connect_client, read_aloud=read_aloud,
+            journal=journal, answer_grading=self._answer_audio_queue is not None)
+        self._command_actions = {
+            "attach": lambda: self._anki_action.get_current_card_information(called_through_attach_command=True),
+            "show": self._anki_action.show,
+            "again": self._anki_action.again,
+            "difficult": self._anki_action.difficult,
+            "good": self._anki_action.good,
+            "easy": self._anki_action.easy,
+            "pause": self.pause,
+            "unpause": self.unpause,
+            "close": self._anki_action.close,
+            "quit": self.quit,
+            "reload": lambda: "executed" if self.reload_command_config() else "failed"
+        }
         # Behaviour configuration
         self._speech_to_text_paused = False
         self._alert_sound_enabled = alert_sound_enabled
-        # Parse command JSON configuation
-        self.command_config_load(command_config)
-        # tba
-        self.engine = pyttsx3.init()
+        # Partial result tracking (for the current utterance)
+        self._partial_results = partial_results
+        self._partial_stability = partial_stability
+        self._partial_candidate = None
+        self._partial_candidate_count = 0
+        self._partial_executed = None
+        self._partial_executed_command = None
+        self._partial_executed_time = None
+        self._partial_latency_saved = []
 
     def command_config_load(self, command_config):
+        """Loads command words from a JSON file, and compiles them into a command matcher.
+
+        Args:
+            command_config (str): Filename for the JSON command file.
+
+        Raises:
+            json.decoder.JSONDecodeError: Handles decode errors from the JSON command file, such as malformed syntax.
+            AnkiVoiceError: Handles anki-voice errors, in particular here for missing command definitions.
+        """
         try:
             with open(command_config) as command_config_raw:
                 command_config_json = json.load(command_config_raw)
-                for command in ["attach", "show", "again", "difficult", "good", "easy", "pause", "unpause", "close", "quit"]:
-                    if command not in command_config_json:
-                        raise Exception(
-                            f"Malformed commands in {command_config}. Missing the command (key): {command}")
-                    if command == "attach":
-                        self._attach_commands = [
-                            command] + command_config_json[command]["related_words"]
-                    elif command == "show":
-                        self._show_commands = [
-                            command] + command_config_json[command]["related_words"]
-                    elif command == "again":
-                        self._again_commands = [
-                            command] + command_config_json[command]["related_words"]
-                    elif command == "difficult":
-                        self._difficult_commands = [
-                            command] + command_config_json[command]["related_words"]
-                    elif command == "good":
-                        self._good_commands = [
-                            command] + command_config_json[command]["related_words"]
-                    elif command == "easy":
-                        self._easy_commands = [
-                            command] + command_config_json[command]["related_words"]
-                    elif command == "pause":
-                        self._pause_commands = [
-                            command] + command_config_json[command]["related_words"]
-                    elif command == "unpause":
-                        self._unpause_commands = [
-                            command] + command_config_json[command]["related_words"]
-                    elif command == "close":
-                        self._close_commands = [
-                            command] + command_config_json[command]["related_words"]
-                    elif command == "quit":
-                        self._quit_commands = [
-                            command] + command_config_json[command]["related_words"]
+            self._matcher = CommandMatcher(command_config_json)
         except json.decoder.JSONDecodeError as ex:
             logging.error(
                 f"A JSON decoder error occured when attempting to obtain Anki command words: {ex}")
             sys.exit(1)
         except AnkiVoiceError as ex:
             logging.error(
-                f"An anki-voice error occured: {ex}")
+                f"An anki-voice error occured in {command_config}: {ex}")
             sys.exit(1)
         except Exception as ex:
             logging.error(
                 f"An unknown exception occured when attempting to obtain Anki command words: {ex}")
             sys.exit(1)
 
+    def reload_command_config(self):
+        """Reloads command words from the JSON command file while running (e.g., when the file is
+        modified, on SIGHUP, or through the 'reload' command). The new configuration is validated
+        by compiling it, and then swapped in with a recogniser for its grammar at the end of the
+        current utterance, so the model and audio stream are never reloaded. If the new
+        configuration is invalid, the current configuration remains in use.
+
+        Returns:
+            bool: Indicator of whether the new configuration was valid.
+        """
+        try:
+            with open(self._command_config) as command_config_raw:
+                command_config_json = json.load(command_config_raw)
+            matcher = CommandMatcher(command_config_json)
+        except json.decoder.JSONDecodeError as ex:
+            logging.error(
+                f"A JSON decoder error occured when attempting to reload Anki command words (the previous commands remain in use): {ex}")
+            return False
+        except AnkiVoiceError as ex:
+            logging.error(
+                f"An anki-voice error occured in {self._command_config} (the previous commands remain in use): {ex}")
+            return False
+        except Exception as ex:
+            logging.error(
+                f"An unknown exception occured when attempting to reload Anki command words (the previous commands remain in use): {ex}")
+            return False
+        with self._pending_matcher_lock:
+            self._pending_matcher = matcher
+        console.print(f"Reloading: {self._command_config}")
+        return True
+
+    def _apply_pending_command_config(self):
+        """Swaps in a reloaded command configuration, recreating the recogniser if its grammar has
+        changed (only called by the recognition stage, between utterances)."""
+        with self._pending_matcher_lock:
+            matcher, self._pending_matcher = self._pending_matcher, None
+        if matcher is None:
+            return
+        started = time.perf_counter()
+        grammar_changed = matcher.phrases != self._matcher.phrases
+        self._matcher = matcher
+        if grammar_changed and not self._full_vocabulary:
+            log_missing_vocabulary(self._model, matcher)
+            self._recogniser = self._create_recogniser()
+        self._reset_partial_result()
+        console.print(f"Command configuration reloaded ({len(matcher.phrases)} phrases"
+                      f"{', grammar recompiled' if grammar_changed and not self._full_vocabulary else ''} "
+                      f"in {1000 * (time.perf_counter() - started):.1f} ms)")
+
+    def _command_config_modified(self):
+        """Gets the modification time and size of the JSON command file.
+
+        Returns:
+            tuple: The modification time (in nanoseconds) and size, or None if the file can not be read.
+        """
+        try:
+            status = os.stat(self._command_config)
+        except OSError:
+            return None
+        return status.st_mtime_ns, status.st_size
+
+    def _cyclic_command_config_watch(self):
+        """Reloads the command configuration whenever the JSON command file is modified."""
+        last_modified = self._command_config_modified()
+        while True:
+            time.sleep(self.COMMAND_CONFIG_POLL_INTERVAL)
+            modified = self._command_config_modified()
+            if modified != last_modified:
+                last_modified = modified
+                self.reload_command_config()
+
+    def _load_model(self):
+        """Loads the speech-to-text model and creates the recogniser (run in the background)."""
+        started = time.perf_counter()
+        try:
+            self._model = Model(self._model_path)
+            if not self._full_vocabulary:
+                log_missing_vocabulary(self._model, self._matcher)
+            self._recogniser = self._create_recogniser()
+            if self._answer_audio_queue is not None:
+                self._answer_recogniser = KaldiRecognizer(self._model, 16000)
+                self._answer_recogniser.SetWords(True)
+            self.model_load_time = time.perf_counter() - started
+            console.print(
+                f"Speech recognition model loaded ({self.model_load_time:.1f} s)\n")
+        except Exception as ex:
+            logging.error(
+                f"An unknown exception occured when attempting to load the speech recognition model: {ex}")
+        self._model_ready.set()
+
+    def wait_until_ready(self):
+        """Waits until the speech-to-text model has loaded.
+
+        Returns:
+            bool: Indicator of whether the model was successfully loaded.
+        """
+        self._model_ready.wait()
+        return self._recogniser is not None
+
+    def _create_recogniser(self):
+        """Creates the vosk recogniser. Unless full vocabulary decoding is enabled, decoding is
+        constrained to a grammar of the command phrases, with an '[unk]' fallback for any other
+        speech, which reduces decoding time and misrecognised commands. Final results include
+        the confidence of each word (for the event log).
+
+        Returns:
+            KaldiRecognizer: The recogniser for 16kHz audio.
+        """
+        if self._full_vocabulary:
+            recogniser = KaldiRecognizer(self._model, 16000)
+        else:
+            recogniser = KaldiRecognizer(
+                self._model, 16000, json.dumps(self._matcher.phrases + ["[unk]"]))
+        recogniser.SetWords(True)
+        return recogniser
+
     def run(self):
-        """Starts thread to handle speech-to-text module functionality."""
+        """Starts the audio source, and threads to handle speech-to-text and command dispatch functionality."""
+        self._audio_source.start(self._audio_buffer)
         self._command_detection = threading.Thread(
-            target=self._cyclic_word_detection)
+            target=self._cyclic_word_detection, daemon=True)
+        self._command_dispatch = threading.Thread(
+            target=self._cyclic_command_dispatch, daemon=True)
+        self._command_dispatch.start()
         self._command_detection.start()
+        if self._answer_audio_queue is not None:
+            threading.Thread(
+                target=self._cyclic_answer_transcription, daemon=True).start()
+        if self._watch_command_config:
+            threading.Thread(
+                target=self._cyclic_command_config_watch, daemon=True).start()
+
+    def join(self):
+        """Waits until the audio source is exhausted (e.g., a recorded audio file has been fully
+        streamed), and all detected commands have been executed."""
+        self._command_detection.join()
+        self._command_queue.join()
+
+    def pipeline_statistics(self):
+        """Gets counters for audio and commands lost between pipeline stages.
+
+        Returns:
+            dict: Pipeline statistics, including audio overflow, dropped commands, and audio skipped by voice activity detection.
+        """
+        statistics = {
+            "captured_bytes": self._audio_buffer.written_bytes,
+            "audio_overflow_bytes": self._audio_buffer.overflow_bytes,
+            "audio_overflow_count": self._audio_buffer.overflow_count,
+            "buffered_bytes": self._audio_buffer.available,
+            "queued_commands": self._command_queue.qsize(),
+            "dropped_commands": self._dropped_commands,
+            "dropped_answer_audio_chunks": self._dropped_answer_audio,
+            "feedback_muted_bytes": self._audio_source.muted_bytes,
+            "decode_cpu_seconds": round(self._decode_cpu_time, 3)
+        }
+        if self._voice_activity_gate is not None and self._voice_activity_gate.total_bytes > 0:
+            gated_bytes = self._voice_activity_gate.total_bytes - self._decoded_bytes
+            statistics["vad_gated_fraction"] = round(
+                gated_bytes / self._voice_activity_gate.total_bytes, 3)
+            # Estimated from the mean recogniser CPU time of decoded audio
+            if self._decoded_bytes > 0:
+                statistics["vad_cpu_saved_seconds"] = round(
+                    gated_bytes * self._decode_cpu_time / self._decoded_bytes, 3)
+        return statistics
 
     def pause(self):
-        """Pauses speech-to-text monitoring (except for 'unpause' commands)."""
+        """Pauses speech-to-text monitoring (except for 'unpause' commands).
+
+        Returns:
+            str: The outcome ('executed').
+        """
         self._speech_to_text_paused = True
-        print("Executed: pause")
+        console.print("Executed: pause")
         if self._alert_sound_enabled:
             audio_feedback_queue.put_nowait("Success: Paused.")
+        return "executed"
 
     def unpause(self):
-        """Unpauses speech-to-text monitoring (permitting any commands)."""
+        """Unpauses speech-to-text monitoring (permitting any commands).
+
+        Returns:
+            str: The outcome ('executed').
+        """
         self._speech_to_text_paused = False
-        print("Executed: unpause")
+        console.print("Executed: unpause")
         if self._alert_sound_enabled:
             audio_feedback_queue.put_nowait("Success: Unpaused.")
+        return "executed"
 
     def quit(self):
         """Triggers exit of anki-voice."""
-        print("Executed: quit")
+        console.print("Executed: quit")
+        console.print("Pipeline statistics:", self.pipeline_statistics())
+        self._audio_source.stop()
+        self._audio_buffer.close()
+        # Release the main thread from the audio feedback loop
+        audio_feedback_queue.put_nowait(None)
         sys.exit(0)
 
     def _cyclic_word_detection(self):
-        """Loops through audio input and identifies speech to text for possible commands."""
+        """Recognition stage. Loops through buffered audio input and identifies speech to text for
+        possible commands, which are queued for the dispatch stage. Audio captured while the
+        model is loading is decoded once it is ready."""
+        if not self.wait_until_ready():
+            return
         while True:
-            data = self._stream.read(2048, exception_on_overflow=False)
+            data = self._audio_buffer.read(self._read_size())
             if len(data) == 0:
                 break
-            if self._recogniser.AcceptWaveform(data):
-                res = json.loads(self._recogniser.Result())
-                # Identify sentence blocks
-                if "text" in res:
-                    detected_words = res["text"].lower()
-                    if detected_words != "":
-                        self._action_command(detected_words)
+            position = self._audio_position
+            self._audio_position += len(data)
+            self._audio_received_time = time.perf_counter()
+            if self._audio_buffer.overflow_count != self._reported_overflow_count:
+                self._reported_overflow_count = self._audio_buffer.overflow_count
+                logging.warning(
+                    f"Audio was discarded as speech recognition fell behind ({self._audio_buffer.overflow_bytes} bytes in total).")
+            if self._voice_activity_gate is None:
+                for offset in range(0, len(data), self._chunk_bytes):
+                    self._process_audio(data[offset:offset + self._chunk_bytes])
+                continue
+            # Only decode audio that may contain speech (consecutive chunks of speech are decoded in one call)
+            audio_to_decode = []
+            data = memoryview(data)
+            for offset in range(0, len(data), self._chunk_bytes):
+                chunk = data[offset:offset + self._chunk_bytes]
+                chunk_to_decode, utterance_ended = self._voice_activity_gate.process(
+                    chunk)
+                audio_to_decode.extend(chunk_to_decode)
+                if self._answer_audio_queue is not None:
+                    self._queue_answer_audio(chunk_to_decode)
+                if len(chunk_to_decode) > 0:
+                    # Commands are attributed to the end of the audio decoded in the same call
+                    self._audio_position = position + offset + len(chunk)
+                if self._voice_activity_gate.in_hangover:
+                    # After speech, each chunk is decoded in turn, so the recogniser can detect the end of the utterance
+                    self._process_audio(b"".join(audio_to_decode))
+                    audio_to_decode = []
+                elif utterance_ended:
+                    if len(audio_to_decode) > 0:
+                        self._process_audio(b"".join(audio_to_decode))
+                        audio_to_decode = []
+                    self._process_final_result(self._recogniser.FinalResult())
+                    if self._answer_audio_queue is not None:
+                        self._end_answer_utterance()
+                elif len(chunk_to_decode) == 0 and self._pending_matcher is not None:
+                    # Between utterances
+                    self._apply_pending_command_config()
+            if len(audio_to_decode) > 0:
+                self._process_audio(b"".join(audio_to_decode))
+            self._audio_position = position + len(data)
+
+    def _queue_answer_audio(self, chunks):
+        """Passes speech to the answer transcription stage, discarding it if too much audio is
+        already waiting to be decoded.
+
+        Args:
+            chunks (list): Chunks of 16kHz mono 16-bit audio.
+        """
+        for chunk in chunks:
+            if self._answer_audio_queue.qsize() >= self._answer_audio_limit:
+                self._dropped_answer_audio += 1
+                self._answer_audio_incomplete = True
+            else:
+                self._answer_audio_queue.put_nowait(bytes(chunk))
+
+    def _end_answer_utterance(self):
+        """Marks the end of an utterance for the answer transcription stage. The utterance is only
+        graded as a spoken answer if no commands were detected in it, and none of its audio was
+        discarded."""
+        self._answer_audio_queue.put_nowait(
+            (self._utterance_commands == 0 and not self._answer_audio_incomplete, time.perf_counter()))
+        self._utterance_commands = 0
+        self._answer_audio_incomplete = False
+
+    def _cyclic_answer_transcription(self):
+        """Answer transcription stage. Decodes speech with the full vocabulary recogniser (in
+        parallel with the command recogniser), and queues the transcript of each utterance without
+        commands for grading by the dispatch stage."""
+        while True:
+            item = self._answer_audio_queue.get()
+            if isinstance(item, bytes):
+                self._answer_recogniser.AcceptWaveform(item)
+                continue
+            grade_utterance, utterance_end_time = item
+            result = json.loads(self._answer_recogniser.FinalResult())
+            result_time = time.perf_counter()
+            latency_metrics.observe(
+                "answer_transcription", result_time - utterance_end_time)
+            transcript = result.get("text", "").lower()
+            if not grade_utterance or len(AnswerGrader.normalise(transcript)) == 0:
+                continue
+            trace = {
+                "audio_received": utterance_end_time,
+                "result": result_time,
+                "queued": time.perf_counter()
+            }
+            utterance = {"event_time": time.monotonic(), "text": transcript, "confidence": recogniser_confidence(result),
+                         "command": None, "partial": False, "spoken_answer": True}
+            try:
+                self._command_queue.put_nowait(
+                    (transcript, (None, 0.0), trace, utterance))
+            except queue.Full:
+                self._dropped_commands += 1
+                event_log.record("utterance", **utterance, outcome="dropped")
+                logging.warning(
+                    f"Spoken answer dropped as previous commands are still being executed: {transcript}")
+
+    def _read_size(self):
+        """Gets the amount of audio to read for the next recogniser call. With adaptive chunking,
+        a backlog (e.g., after the model has loaded, or when decoding falls behind) is read in
+        larger blocks, so there are fewer recogniser calls, while audio arriving in real-time is
+        read a chunk at a time for the lowest latency.
+
+        Returns:
+            int: The number of bytes to read.
+        """
+        if not self._adaptive_chunking:
+            return self._chunk_bytes
+        backlog_chunks = self._audio_buffer.available // self._chunk_bytes
+        return self._chunk_bytes * min(max(backlog_chunks, 1), self.MAX_CHUNKS_PER_DECODE)
+
+    def _process_audio(self, data):
+        """Passes audio to the recogniser, and handles any resulting final or partial result.
+
+        Args:
+            data (bytes): 16kHz mono 16-bit audio.
+        """
+        started = time.thread_time()
+        utterance_ended = self._recogniser.AcceptWaveform(data)
+        self._decode_cpu_time += time.thread_time() - started
+        self._decoded_bytes += len(data)
+        if utterance_ended:
+            self._process_final_result(self._recogniser.Result())
+        elif self._partial_results:
+            self._check_partial_result(
+                json.loads(self._recogniser.PartialResult())["partial"])
+
+    def _process_final_result(self, result):
+        """Identifies commands in the final result of an utterance.
+
+        Args:
+            result (str): The JSON result from the recogniser.
+        """
+        result_time = time.perf_counter()
+        res = json.loads(result)
+        # Identify sentence blocks
+        if "text" in res:
+            detected_words = res["text"].lower()
+            confidence = recogniser_confidence(res)
+            # Ignore speech that did not match the command grammar
+            if detected_words != "" and set(detected_words.split()) != {"[unk]"}:
+                # Skip commands already executed from a partial result of this utterance (compared
+                # by command, as the final words may differ, e.g., "sure" then "show")
+                final_command = None if self._partial_executed is None else self._matcher.identify(
+                    detected_words)[0]
+                if self._partial_executed is not None and final_command == self._partial_executed_command:
+                    self._partial_latency_saved.append(
+                        time.perf_counter() - self._partial_executed_time)
+                    console.print(
+                        f"Partial result executed {1000 * self._partial_latency_saved[-1]:.0f} ms before final result "
+                        f"(mean: {1000 * sum(self._partial_latency_saved) / len(self._partial_latency_saved):.0f} ms)")
+                elif self._partial_executed is not None and detected_words.startswith(self._partial_executed + " "):
+                    # Only the commands that followed the one executed (e.g., "good" of "show good")
+                    self._queue_command(
+                        detected_words[len(self._partial_executed) + 1:], result_time, confidence)
+                elif final_command is not None and final_command.startswith(f"{self._partial_executed_command} "):
+                    # As above, where the executed words changed (e.g., "sure" then "show good")
+                    self._queue_command(
+                        final_command[len(self._partial_executed_command) + 1:], result_time, confidence)
+                else:
+                    self._queue_command(
+                        detected_words, result_time, confidence)
+        self._reset_partial_result()
+        if self._pending_matcher is not None:
+            self._apply_pending_command_config()
+
+    def _check_partial_result(self, partial_words):
+        """Executes a command from a partial result once it has been an unambiguous command phrase
+        for enough consecutive partial results, avoiding the wait for trailing silence.
+
+        Args:
+            partial_words (str): The words identified so far in the current utterance.
+        """
+        result_time = time.perf_counter()
+        # Only one command is executed from partial results per utterance
+        if self._partial_executed is not None:
+            return
+        partial_words = partial_words.lower()
+        if partial_words not in self._matcher.partial_phrases:
+            self._partial_candidate = None
+            self._partial_candidate_count = 0
+            return
+        if partial_words == self._partial_candidate:
+            self._partial_candidate_count += 1
+        else:
+            self._partial_candidate = partial_words
+            self._partial_candidate_count = 1
+        if self._partial_candidate_count >= self._partial_stability:
+            self._partial_executed = partial_words
+            self._partial_executed_time = time.perf_counter()
+            self._partial_executed_command = self._queue_command(
+                partial_words, result_time, partial=True)
+
+    def _reset_partial_result(self):
+        """Clears partial result tracking at the end of an utterance."""
+        self._partial_candidate = None
+        self._partial_candidate_count = 0
+        self._partial_executed = None
+        self._partial_executed_command = None
+        self._partial_executed_time = None
+
+    def submit_transcript(self, detected_words):
+        """Passes words to the dispatch stage as if they had been recognised (e.g., to replay the
+        command stream of a recorded session), waiting if previous commands are still queued.
+
+        Args:
+            detected_words (str): The words to execute commands for.
+        """
+        self._audio_received_time = time.perf_counter()
+        self._queue_command(
+            detected_words, self._audio_received_time, block=True)
 
-    def _action_command(self, detected_words):
-        """Analyses speech-to-text strings for anki-voice commands.
+    def _queue_command(self, detected_words, result_time, confidence=None, partial=False, block=False):
+        """Passes detected words to the dispatch stage without waiting for any AnkiConnect requests.
 
         Args:
             detected_words (str): The words identified through speech-to-text analysis.
+            result_time (float): When the recogniser produced the result (from time.perf_counter).
+            confidence (float, optional): The recogniser's mean word confidence. Defaults to None (not known, e.g., for partial results).
+            partial (bool, optional): Indicates if the words are from a partial result. Defaults to False.
+            block (bool, optional): Waits for space in the queue, rather than dropping the command. Defaults to False.
+
+        Returns:
+            str: The identified command (as from _identify_command), or None if the words are not a command.
+        """
+        matching_started = time.perf_counter()
+        command, match_confidence = self._identify_command(detected_words)
+        queued_time = time.perf_counter()
+        latency_metrics.observe(
+            "audio_to_result", result_time - self._audio_received_time)
+        latency_metrics.observe(
+            "command_match", queued_time - matching_started)
+        self.command_history.append(
+            (queued_time, self._audio_position, detected_words, command))
+        if command is not None:
+            self._utterance_commands += 1
+        # Timestamps for each stage of handling the utterance
+        trace = {
+            "audio_received": self._audio_received_time,
+            "result": result_time,
+            "queued": queued_time
+        }
+        # Fields of the utterance for the event log (its outcome is added once executed)
+        utterance = {"event_time": time.monotonic(), "text": detected_words, "confidence": confidence,
+                     "command": command, "partial": partial}
+        try:
+            self._command_queue.put(
+                (detected_words, (command, match_confidence), trace, utterance), block=block)
+        except queue.Full:
+            self._dropped_commands += 1
+            event_log.record("utterance", **utterance, outcome="dropped")
+            logging.warning(
+                f"Command dropped as previous commands are still being executed: {detected_words}")
+        return command
+
+    def _cyclic_command_dispatch(self):
+        """Dispatch stage. Executes queued commands in order, so that slow AnkiConnect requests
+        do not delay speech recognition."""
+        while True:
+            try:
+                detected_words, (command, match_confidence), trace, utterance = self._command_queue.get(
+                    timeout=self.JOURNAL_RETRY_INTERVAL)
+            except queue.Empty:
+                # Retry any journaled answers while idle (e.g., once Anki has restarted)
+                self._anki_action.flush_journal()
+                continue
+            dispatched_time = time.perf_counter()
+            outcome = "failed"
+            try:
+                if utterance.get("spoken_answer"):
+                    outcome = self._action_spoken_answer(
+                        detected_words, utterance)
+                else:
+                    outcome = self._action_command(
+                        detected_words, command, match_confidence)
+            except SystemExit:
+                # The 'quit' command
+                outcome = "executed"
+                raise
+            finally:
+                event_log.record("utterance", **utterance, outcome=outcome, queue_wait=round(dispatched_time - trace["queued"], 6),
+                                 execution=round(time.perf_counter() - dispatched_time, 6))
+            executed_time = time.perf_counter()
+            latency_metrics.observe(
+                "queue_wait", dispatched_time - trace["queued"])
+            latency_metrics.observe(
+                "command_execution", executed_time - dispatched_time)
+            latency_metrics.observe(
+                "end_to_end", executed_time - trace["audio_received"])
+            self._command_queue.task_done()
+
+    def _action_command(self, detected_words, command, confidence):
+        """Executes the anki-voice command (or commands) identified in speech-to-text strings.
+
+        Args:
+            detected_words (str): The words identified through speech-to-text analysis.
+            command (str): The command identified by the recognition stage (as from _identify_command), or None if the words are not a command.
+            confidence (float): The confidence of the match (1.0 for exact matches).
+
+        Returns:
+            str: The outcome of the command (e.g., 'executed', 'invalid_state', 'failed', 'journaled', 'paused', or 'no_command').
         """
+        if command is not None and " " in command:
+            return self._action_command_sequence(detected_words, command.split())
         # Verify if paused, and if so, only proceed if command is to unpause
         if self._speech_to_text_paused:
-            if detected_words not in self._unpause_commands:
-                return
+            if command != "unpause":
+                return "paused"
         # Process commands
-        print("Detected:", detected_words)
-        if detected_words in self._attach_commands:
-            self._anki_action.get_current_card_information(
-                called_through_attach_command=True)
-        elif detected_words in self._show_commands:
-            self._anki_action.show()
-        elif detected_words in self._again_commands:
-            self._anki_action.again()
-        elif detected_words in self._difficult_commands:
-            self._anki_action.difficult()
-        elif detected_words in self._good_commands:
-            self._anki_action.good()
-        elif detected_words in self._easy_commands:
-            self._anki_action.easy()
-        elif detected_words in self._pause_commands:
-            self.pause()
-        elif detected_words in self._unpause_commands:
-            self.unpause()
-        elif detected_words in self._close_commands:
-            self._anki_action.close()
-        elif detected_words in self._quit_commands:
-            self.quit()
+        if command is not None and confidence < 1.0:
+            console.print("Detected:", detected_words,
+                          f"(matched '{command}' with confidence {confidence:.2f})")
+        else:
+            console.print("Detected:", detected_words)
+        if command not in self._command_actions:
+            return "no_command"
+        # Journaled answers are applied first, so commands act on the card actually shown
+        if command not in self.CONTROL_COMMANDS:
+            self._anki_action.flush_journal()
+        return self._command_actions[command]()
+
+    def _action_spoken_answer(self, transcript, utterance):
+        """Grades a spoken answer to the current card, and answers the card with the grade.
+
+        Args:
+            transcript (str): The words identified by the full vocabulary recogniser.
+            utterance (dict): The fields of the utterance for the event log (updated with its grade and score).
+
+        Returns:
+            str: The outcome (e.g., 'executed', 'paused', or 'no_answer' if the transcript was not graded).
+        """
+        if self._speech_to_text_paused:
+            return "paused"
+        self._anki_action.flush_journal()
+        outcome, utterance["command"], utterance["score"] = self._anki_action.grade_spoken_answer(
+            transcript, utterance["confidence"])
+        return outcome
+
+    def _action_command_sequence(self, detected_words, commands):
+        """Executes several commands detected in a single utterance (e.g., "show good"). Consecutive
+        Anki commands are executed together in a single AnkiConnect request, and commands that
+        control anki-voice itself (e.g., 'pause') are executed in order between them.
+
+        Args:
+            detected_words (str): The words identified through speech-to-text analysis.
+            commands (list): The commands identified in the words, in order.
+
+        Returns:
+            str: 'executed' if every command was executed, otherwise the outcome of the first that was not.
+        """
+        # Verify if paused, and if so, only proceed from a command to unpause
+        if self._speech_to_text_paused:
+            if "unpause" not in commands:
+                return "paused"
+            commands = commands[commands.index("unpause"):]
+        console.print("Detected:", detected_words,
+                      f"(commands: {', '.join(commands)})")
+        outcomes = []
+        anki_commands = []
+        for command in commands + [None]:
+            if command in self.CONTROL_COMMANDS or command is None:
+                if len(anki_commands) > 0:
+                    self._anki_action.flush_journal()
+                    if len(anki_commands) == 1:
+                        outcomes.append(
+                            self._command_actions[anki_commands[0]]())
+                    else:
+                        outcomes.append(
+                            self._anki_action.execute_sequence(anki_commands))
+                    anki_commands = []
+                if command is None:
+                    break
+                # Commands after 'pause' are ignored (other than 'unpause')
+                if self._speech_to_text_paused and command != "unpause":
+                    continue
+                outcomes.append(self._command_actions[command]())
+            elif not self._speech_to_text_paused:
+                anki_commands.append(command)
+        return next((outcome for outcome in outcomes if outcome != "executed"), "executed")
+
+    def _identify_command(self, detected_words):
+        """Identifies which anki-voice command (if any) detected words correspond to.
+
+        Args:
+            detected_words (str): The words identified through speech-to-text analysis.
+
+        Returns:
+            str: The command (e.g., "show"), the commands separated by spaces for several commands (e.g., "show good"), or None if the words are not a command.
+            float: The confidence of the match (1.0 for exact matches, and for several commands).
+        """
+        return self._matcher.identify(detected_words)
 
     def __del__(self):
-        """Destructor for AnkiSpeechToCommand. Stops pyaudio stream used by vosk speech-to-text module.
+        """Destructor for AnkiSpeechToCommand. Stops the audio source (e.g., pyaudio stream) used by vosk speech-to-text module.
 
         Raises:
             AttributeError: Handles situation where "module" folder validation fails in constructor. Not required to be logged.
         """
         try:
-            self._stream.stop_stream()
+            self._audio_source.stop()
         except AttributeError as ex:
             pass
         except Exception as ex:
             logging.error(
-                f"An unknown exception occured when attempting to stop the pyaudio stream for the vosk module: {ex}")
+                f"An unknown exception occured when attempting to stop the audio source for the vosk module: {ex}")
+
+
+class RecognitionSession():
+    """A single user's session in server mode, with its own recogniser (sharing the server's
+    loaded model), voice activity detection, Anki state, and AnkiConnect endpoint. Audio is
+    decoded on the server's shared worker pool."""
+
+    # Chunks decoded before yielding the worker to other sessions
+    CHUNKS_PER_TURN = 8
+    # Audio waiting to be decoded (10 seconds) above which reading from the client is paused
+    MAX_PENDING_BYTES = 16000 * 2 * 10
+
+    def __init__(self, name, recogniser, matcher, anki_connect_client, decoder_pool, connection, vad_enabled=True, vad_threshold=300):
+        """Constructor for RecognitionSession.
+
+        Args:
+            name (str): A name for the session (used in logs).
+            recogniser (KaldiRecognizer): The recogniser for this session.
+            matcher (CommandMatcher): The (shared) command matcher.
+            anki_connect_client (AnkiConnectClient): Client for this session's AnkiConnect API.
+            decoder_pool (ThreadPoolExecutor): The (shared) worker pool used for decoding.
+            connection (socket.socket): The connection to the client, to which detected commands are reported.
+            vad_enabled (bool, optional): Skips speech recognition for audio without voice activity. Defaults to True.
+            vad_threshold (int, optional): RMS amplitude (of 16-bit samples) above which audio is considered voice activity. Defaults to 300.
+        """
+        self.name = name
+        self._recogniser = recogniser
+        self._matcher = matcher
+        self._decoder_pool = decoder_pool
+        self._connection = connection
+        self._voice_activity_gate = VoiceActivityGate(
+            rms_threshold=vad_threshold) if vad_enabled else None
+        self._anki_action = AnkiActionHandler(
+            alert_sound_enabled=False, anki_connect_client=anki_connect_client)
+        self._command_actions = {
+            "attach": lambda: self._anki_action.get_current_card_information(called_through_attach_command=True),
+            "show": self._anki_action.show,
+            "again": self._anki_action.again,
+            "difficult": self._anki_action.difficult,
+            "good": self._anki_action.good,
+            "easy": self._anki_action.easy,
+            "close": self._anki_action.close
+        }
+        self._paused = False
+        # Audio waiting to be decoded, and whether a worker has been scheduled to decode it
+        self._pending_audio = collections.deque()
+        self._pending_bytes = 0
+        self._lock = threading.Lock()
+        self._pending_audio_decoded = threading.Condition(self._lock)
+        self._decoding_scheduled = False
+        self._closing = False
+        self._finished = threading.Event()
+        # Commands are executed in order on a thread for this session
+        self._command_queue = queue.Queue()
+        self._command_dispatch = threading.Thread(
+            target=self._cyclic_command_dispatch, daemon=True)
+        self._command_dispatch.start()
+        # Statistics
+        self.received_bytes = 0
+        self.detected_commands = 0
+
+    def feed(self, data):
+        """Queues received audio for decoding. Blocks while decoding has fallen too far behind, so
+        that the client is slowed down (by TCP flow control) rather than audio building up.
+
+        Args:
+            data (bytes): 16kHz mono 16-bit audio.
+        """
+        with self._lock:
+            self.received_bytes += len(data)
+            self._pending_audio.append(data)
+            self._pending_bytes += len(data)
+            self._schedule_decoding()
+            while self._pending_bytes > self.MAX_PENDING_BYTES:
+                self._pending_audio_decoded.wait()
+
+    def close(self):
+        """Decodes any remaining audio, and waits for all commands to be executed."""
+        with self._lock:
+            self._closing = True
+            self._schedule_decoding()
+        self._finished.wait()
+        self._command_queue.put(None)
+        self._command_dispatch.join()
+
+    def _schedule_decoding(self):
+        """Submits the session to the worker pool, unless it is already scheduled (the lock must be held)."""
+        if not self._decoding_scheduled:
+            self._decoding_scheduled = True
+            self._decoder_pool.submit(self._decode_pending_audio)
+
+    def _decode_pending_audio(self):
+        """Decodes pending audio (run on the worker pool). A session only decodes a limited number
+        of chunks before being rescheduled, so that workers are shared fairly between sessions."""
+        try:
+            for _ in range(self.CHUNKS_PER_TURN):
+                with self._lock:
+                    if len(self._pending_audio) == 0:
+                        break
+                    data = self._pending_audio.popleft()
+                    self._pending_bytes -= len(data)
+                    self._pending_audio_decoded.notify_all()
+                self._decode(data)
+            with self._lock:
+                if len(self._pending_audio) > 0:
+                    self._decoder_pool.submit(self._decode_pending_audio)
+                    return
+                self._decoding_scheduled = False
+                finishing = self._closing and not self._finished.is_set()
+            if finishing:
+                self._process_final_result(self._recogniser.FinalResult())
+                self._finished.set()
+        except Exception as ex:
+            logging.error(
+                f"An unknown exception occured when decoding audio for session {self.name}: {ex}")
+            # The failed audio is discarded, and decoding continues with any later audio
+            with self._lock:
+                self._decoding_scheduled = False
+                if len(self._pending_audio) > 0:
+                    self._schedule_decoding()
+                elif self._closing:
+                    self._finished.set()
+
+    def _decode(self, data):
+        """Passes audio (where it may contain speech) to the recogniser.
+
+        Args:
+            data (bytes): 16kHz mono 16-bit audio.
+        """
+        audio_to_decode, utterance_ended = ([data], False) if self._voice_activity_gate is None else \
+            self._voice_activity_gate.process(data)
+        for audio in audio_to_decode:
+            if self._recogniser.AcceptWaveform(audio):
+                self._process_final_result(self._recogniser.Result())
+        if utterance_ended:
+            self._process_final_result(self._recogniser.FinalResult())
+
+    def _process_final_result(self, result):
+        """Queues any command in the final result of an utterance.
+
+        Args:
+            result (str): The JSON result from the recogniser.
+        """
+        res = json.loads(result)
+        detected_words = res.get("text", "").lower()
+        if detected_words != "" and set(detected_words.split()) != {"[unk]"}:
+            self._command_queue.put(
+                (detected_words, recogniser_confidence(res), time.monotonic()))
+
+    def _cyclic_command_dispatch(self):
+        """Executes queued commands in order, and reports them to the client."""
+        while True:
+            queued = self._command_queue.get()
+            if queued is None:
+                return
+            detected_words, word_confidence, detected_time = queued
+            command, confidence = self._matcher.identify(detected_words)
+            commands = [] if command is None else command.split()
+            # Verify if paused, and if so, only proceed from a command to unpause
+            if self._paused:
+                if "unpause" not in commands:
+                    event_log.record("utterance", event_time=detected_time, session=self.name, text=detected_words,
+                                     confidence=word_confidence, command=command, outcome="paused")
+                    continue
+                commands = commands[commands.index("unpause"):]
+            self.detected_commands += 1
+            outcome = "no_command" if command is None else self._execute_commands(
+                commands)
+            event_log.record("utterance", event_time=detected_time, session=self.name, text=detected_words,
+                             confidence=word_confidence, command=command, outcome=outcome)
+            try:
+                self._connection.sendall((json.dumps(
+                    {"detected": detected_words, "command": command}) + "\n").encode())
+            except OSError:
+                pass
+
+    def _execute_commands(self, commands):
+        """Executes the commands detected in an utterance, in order. Consecutive Anki commands
+        (e.g., "show good") are executed together in a single AnkiConnect request, and commands
+        that control the session (e.g., 'pause') are executed in order between them.
+
+        Args:
+            commands (list): The commands identified in the utterance, in order.
+
+        Returns:
+            str: 'executed' if every command was executed, otherwise the outcome of the first that was not.
+        """
+        outcomes = []
+        anki_commands = []
+        for command in commands + [None]:
+            if command in self._command_actions:
+                # Commands after 'pause' are ignored (other than 'unpause')
+                if not self._paused:
+                    anki_commands.append(command)
+                continue
+            if len(anki_commands) == 1:
+                outcomes.append(self._command_actions[anki_commands[0]]())
+            elif len(anki_commands) > 1:
+                outcomes.append(
+                    self._anki_action.execute_sequence(anki_commands))
+            anki_commands = []
+            if command is None:
+                break
+            if self._paused and command != "unpause":
+                continue
+            if command == "pause":
+                self._paused = True
+            elif command == "unpause":
+                self._paused = False
+            elif command == "quit":
+                # Ends the session (as if the client stopped sending audio)
+                with contextlib.suppress(OSError):
+                    self._connection.shutdown(socket.SHUT_RD)
+        return next((outcome for outcome in outcomes if outcome != "executed"), "executed")
+
+
+class AnkiVoiceServer():
+    """Serves speech-to-text for several users (e.g., review stations) from a single loaded
+    model. Each client connects over TCP, sends a JSON header line (with its 'name' and
+    'ankiconnect_url'), and then streams 16kHz mono 16-bit audio. Detected commands are sent
+    back as JSON lines."""
+
+    def __init__(self, command_config="commands.json", host="127.0.0.1", port=8766, workers=None, full_vocabulary=False, vad_enabled=True, vad_threshold=300, model="model"):
+        """Constructor for AnkiVoiceServer. Loads the model and command configuration once, for
+        all sessions.
+
+        Args:
+            command_config (str, optional): Filename for the JSON command file. Defaults to "commands.json".
+            host (str, optional): The interface to listen on. Defaults to "127.0.0.1".
+            port (int, optional): The port to listen on (0 selects a free port). Defaults to 8766.
+            workers (int, optional): Number of decoding workers. Defaults to the number of CPU cores.
+            full_vocabulary (bool, optional): Decodes against the full model vocabulary rather than only the command words. Defaults to False.
+            vad_enabled (bool, optional): Skips speech recognition for audio without voice activity. Defaults to True.
+            vad_threshold (int, optional): RMS amplitude (of 16-bit samples) above which audio is considered voice activity. Defaults to 300.
+            model (str, optional): The path or name of the speech recognition model (see find_model). Defaults to "model".
+
+        Raises:
+            AnkiVoiceError: Handles anki-voice errors, in particular here for a model that could not be found.
+        """
+        model_path = find_model(model)
+        if model_path is None:
+            raise AnkiVoiceError(f"{model_not_found_reason(model)}.")
+        with open(command_config) as command_config_raw:
+            self._matcher = CommandMatcher(json.load(command_config_raw))
+        self._grammar = None if full_vocabulary else json.dumps(
+            self._matcher.phrases + ["[unk]"])
+        self._vad_enabled = vad_enabled
+        self._vad_threshold = vad_threshold
+        SetLogLevel(-10)
+        self._model = Model(model_path)
+        if self._grammar is not None:
+            log_missing_vocabulary(self._model, self._matcher)
+        self._decoder_pool = ThreadPoolExecutor(
+            max_workers=workers or os.cpu_count())
+        self.sessions = []
+        server = self
+
+        class SessionRequestHandler(socketserver.StreamRequestHandler):
+            def handle(self):
+                server._handle_connection(self.connection, self.rfile)
+
+        self._server = socketserver.ThreadingTCPServer(
+            (host, port), SessionRequestHandler)
+        self._server.daemon_threads = True
+
+    @property
+    def address(self):
+        """tuple: The host and port the server is listening on."""
+        return self._server.server_address[:2]
+
+    def serve_forever(self):
+        """Accepts client connections until shutdown."""
+        self._server.serve_forever()
+
+    def shutdown(self):
+        """Stops accepting connections, and stops the decoding workers."""
+        self._server.shutdown()
+        self._server.server_close()
+        self._decoder_pool.shutdown()
+
+    @staticmethod
+    def session_ankiconnect_url(requested_url, client_host):
+        """Gets the AnkiConnect URL for a session. The server only sends requests to AnkiConnect on
+        the client's own computer (so clients can not make the server send requests elsewhere), and
+        a loopback address (e.g., "localhost") refers to the client's computer.
+
+        Args:
+            requested_url (str): The AnkiConnect URL sent by the client.
+            client_host (str): The IP address the client connected from.
+
+        Raises:
+            AnkiVoiceError: Handles anki-voice errors, in particular here for a URL that is not on the client's computer.
+
+        Returns:
+            str: The AnkiConnect URL to use for the session.
+        """
+        try:
+            parsed = urllib.parse.urlsplit(str(requested_url))
+            port = parsed.port
+        except ValueError as ex:
+            raise AnkiVoiceError(f"Invalid AnkiConnect URL '{requested_url}': {ex}")
+        if parsed.scheme not in ["http", "https"] or parsed.hostname is None:
+            raise AnkiVoiceError(
+                f"Invalid AnkiConnect URL '{requested_url}' (must be http or https, with a host)")
+        client_address = ipaddress.ip_address(client_host)
+        try:
+            requested_address = ipaddress.ip_address(parsed.hostname)
+        except ValueError:
+            requested_address = None
+        requested_loopback = parsed.hostname == "localhost" or (
+            requested_address is not None and requested_address.is_loopback)
+        if requested_loopback and not client_address.is_loopback:
+            # The client's own computer, as seen from the server
+            host = f"[{client_address}]" if client_address.version == 6 else str(client_address)
+            return parsed._replace(netloc=host if port is None else f"{host}:{port}").geturl()
+        if requested_loopback or requested_address == client_address:
+            return parsed.geturl()
+        raise AnkiVoiceError(
+            f"The AnkiConnect URL '{requested_url}' is not on the client's computer ({client_host})")
+
+    def _handle_connection(self, connection, reader):
+        """Runs a session for a client connection, until the client stops sending audio.
+
+        Args:
+            connection (socket.socket): The client connection.
+            reader (io.BufferedReader): Reader for the client connection.
+        """
+        try:
+            header = json.loads(reader.readline())
+            if not isinstance(header, dict):
+                raise ValueError("the header must be a JSON object")
+            ankiconnect_url = self.session_ankiconnect_url(
+                header.get("ankiconnect_url", "http://localhost:8765"), connection.getpeername()[0])
+        except OSError as ex:
+            logging.error(f"A connection error occured when reading the session header from client: {ex}")
+            return
+        except (ValueError, AnkiVoiceError) as ex:
+            logging.error(f"Malformed session header from client: {ex}")
+            with contextlib.suppress(OSError):
+                connection.sendall(
+                    (json.dumps({"error": f"Malformed session header: {ex}"}) + "\n").encode())
+            return
+        recogniser = KaldiRecognizer(self._model, 16000, self._grammar) if self._grammar is not None else \
+            KaldiRecognizer(self._model, 16000)
+        recogniser.SetWords(True)
+        anki_connect_client = AnkiConnectClient(url=ankiconnect_url)
+        session = RecognitionSession(str(header.get("name", connection.getpeername())), recogniser, self._matcher,
+                                     anki_connect_client, self._decoder_pool, connection,
+                                     vad_enabled=self._vad_enabled, vad_threshold=self._vad_threshold)
+        self.sessions.append(session)
+        console.print(f"Session started: {session.name}")
+        try:
+            while True:
+                data = reader.read(2048 * 2)
+                if len(data) == 0:
+                    break
+                session.feed(data)
+        except OSError as ex:
+            # e.g., the client disconnected without closing the connection
+            logging.error(f"A connection error occured in session {session.name}: {ex}")
+        finally:
+            session.close()
+            anki_connect_client.close()
+            self.sessions.remove(session)
+            console.print(f"Session ended: {session.name}")
+
+
+def stream_to_server(address, audio_source, name, ankiconnect_url, on_event=None):
+    """Streams audio to an anki-voice server, until the audio source ends or the session is
+    quit, passing each command detected by the server to a callback.
+
+    Args:
+        address (tuple): The host and port of the server.
+        audio_source (AudioSource): The source of 16kHz mono 16-bit audio.
+        name (str): A name for the session.
+        ankiconnect_url (str): Address of the AnkiConnect API for the session.
+        on_event (function, optional): Called with each detected command (dict). Defaults to printing them.
+
+    Returns:
+        list: The detected commands.
+    """
+    events = []
+    audio_buffer = AudioRingBuffer(16000 * 2 * 30)
+    with socket.create_connection(address) as connection:
+        connection.sendall((json.dumps(
+            {"name": name, "ankiconnect_url": ankiconnect_url}) + "\n").encode())
+
+        def receive_events():
+            for line in connection.makefile("r"):
+                event = json.loads(line)
+                if "error" in event:
+                    logging.error(
+                        f"An error occured when attempting to start a session on the anki-voice server: {event['error']}")
+                    continue
+                events.append(event)
+                (on_event or print)(event)
+            # The server ends the session (e.g., on the quit command)
+            audio_source.stop()
+            audio_buffer.close()
+
+        receiver = threading.Thread(target=receive_events, daemon=True)
+        receiver.start()
+        audio_source.start(audio_buffer)
+        try:
+            while True:
+                data = audio_buffer.read(4096)
+                if len(data) == 0:
+                    break
+                connection.sendall(data)
+            connection.shutdown(socket.SHUT_WR)
+        except OSError:
+            pass
+        receiver.join()
+    audio_source.stop()
+    return events
 
 
 class AnkiStates(Enum):
@@ -474,15 +3345,338 @@ class AnkiVoiceError(Exception):
         super().__init__(message)
 
 
-def CommandAudioFeedback():
-    """Checks queue for information to speak back to user through text-to-speech."""
+class AudioFeedbackCache():
+    """Plays text-to-speech feedback from synthesised audio held in memory. Fixed phrases are
+    synthesised once up front, and other phrases are kept in a least recently used cache, so
+    repeated feedback is played back without repeating synthesis."""
+
+    # Feedback phrases that are known in advance
+    PHRASES = ["Success: Attached.", "Success: Paused.", "Success: Unpaused."]
+
+    def __init__(self, max_cached_phrases=32, max_cached_bytes=32 * 1024 * 1024):
+        """Constructor for AudioFeedbackCache. Creates the single text-to-speech engine and
+        audio output used for all feedback.
+
+        Args:
+            max_cached_phrases (int, optional): Number of phrases (other than fixed phrases) kept in the cache. Defaults to 32.
+            max_cached_bytes (int, optional): Total size of audio (other than fixed phrases) kept in the cache. Defaults to 32MB.
+        """
+        self._engine = pyttsx3.init()
+        self._pyaudio = pyaudio.PyAudio()
+        self._output_streams = {}
+        self._directory = tempfile.TemporaryDirectory(prefix="anki-voice-")
+        self._max_cached_phrases = max_cached_phrases
+        self._max_cached_bytes = max_cached_bytes
+        self._cached_bytes = 0
+        self._fixed_phrases = {}
+        self._cached_phrases = collections.OrderedDict()
+
+    def prerender(self, phrases):
+        """Synthesises phrases that are never evicted from the cache.
+
+        Args:
+            phrases (list): The phrases to be synthesised.
+        """
+        for phrase in phrases:
+            if phrase not in self._fixed_phrases:
+                self._fixed_phrases[phrase] = self._synthesise(phrase)
+
+    def speak(self, text):
+        """Speaks text, from the cache where possible.
+
+        Args:
+            text (str): The text to be spoken.
+        """
+        audio = self._get_audio(text)
+        audio_feedback_speaking.set()
+        try:
+            if audio is None:
+                # Synthesised audio could not be read, so speak directly through the engine
+                self._engine.say(text)
+                self._engine.runAndWait()
+                return
+            self._play(audio)
+        finally:
+            audio_feedback_speaking.clear()
+
+    def prefetch(self, text):
+        """Synthesises text into the cache, ready to be spoken later (e.g., the answer of a card).
+
+        Args:
+            text (str): The text to be synthesised.
+        """
+        self._get_audio(text)
+
+    def _get_audio(self, text):
+        """Gets the synthesised audio for text, synthesising and caching it if required.
+
+        Args:
+            text (str): The text to be spoken.
+
+        Returns:
+            tuple: The audio frames, sample width, channels, and sample rate (or None if synthesis failed).
+        """
+        if text in self._fixed_phrases:
+            return self._fixed_phrases[text]
+        if text in self._cached_phrases:
+            self._cached_phrases.move_to_end(text)
+            return self._cached_phrases[text]
+        audio = self._synthesise(text)
+        self._cached_phrases[text] = audio
+        self._cached_bytes += len(audio[0]) if audio is not None else 0
+        # Evict the least recently used phrases (always keeping the newest)
+        while len(self._cached_phrases) > 1 and (len(self._cached_phrases) > self._max_cached_phrases or self._cached_bytes > self._max_cached_bytes):
+            _, evicted_audio = self._cached_phrases.popitem(last=False)
+            self._cached_bytes -= len(evicted_audio[0]) if evicted_audio is not None else 0
+        return audio
+
+    def _synthesise(self, text):
+        """Synthesises text to audio in memory (via a temporary WAV file).
+
+        Args:
+            text (str): The text to be synthesised.
+
+        Returns:
+            tuple: The audio frames, sample width, channels, and sample rate (or None if synthesis failed).
+        """
+        started = time.perf_counter()
+        path = Path(self._directory.name, "phrase.wav")
+        try:
+            self._engine.save_to_file(text, str(path))
+            self._engine.runAndWait()
+            with wave.open(str(path), "rb") as wave_file:
+                audio = (wave_file.readframes(wave_file.getnframes()), wave_file.getsampwidth(),
+                         wave_file.getnchannels(), wave_file.getframerate())
+        except Exception as ex:
+            logging.warning(
+                f"Text-to-speech audio could not be cached, so will be synthesised each time: {ex}")
+            return None
+        finally:
+            path.unlink(missing_ok=True)
+        latency_metrics.observe("tts_synthesis", time.perf_counter() - started)
+        return audio
+
+    def _play(self, audio):
+        """Plays synthesised audio, reusing an output stream for each audio format. Returns once
+        the audio has been played (not only buffered by the output device).
+
+        Args:
+            audio (tuple): The audio frames, sample width, channels, and sample rate.
+        """
+        frames, sample_width, channels, rate = audio
+        if (sample_width, channels, rate) not in self._output_streams:
+            self._output_streams[(sample_width, channels, rate)] = self._pyaudio.open(
+                format=self._pyaudio.get_format_from_width(sample_width), channels=channels, rate=rate, output=True)
+        stream = self._output_streams[(sample_width, channels, rate)]
+        stream.write(frames)
+        time.sleep(stream.get_output_latency())
+
+    def close(self):
+        """Closes audio output, and removes temporary files."""
+        for stream in self._output_streams.values():
+            stream.close()
+        self._pyaudio.terminate()
+        self._directory.cleanup()
+
+
+class CardTextExtractor(HTMLParser):
+    """Extracts the readable text from the HTML of a card field."""
+
+    # Elements that separate sentences or lines when read aloud
+    BREAK_TAGS = ["br", "div", "p", "li", "tr", "h1", "h2", "h3", "h4", "h5", "h6"]
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self._text = []
+        self._skipped_tags = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in ["script", "style"]:
+            self._skipped_tags += 1
+        elif tag in self.BREAK_TAGS:
+            self._text.append(". ")
+
+    def handle_endtag(self, tag):
+        if tag in ["script", "style"]:
+            self._skipped_tags = max(0, self._skipped_tags - 1)
+        elif tag in self.BREAK_TAGS:
+            self._text.append(". ")
+
+    def handle_data(self, data):
+        if self._skipped_tags == 0:
+            self._text.append(data)
+
+    @property
+    def text(self):
+        """str: The extracted text."""
+        return "".join(self._text)
+
+
+def card_field_to_speech(field):
+    """Normalises the HTML of a card field into text that can be spoken.
+
+    Args:
+        field (str): The HTML value of a card field.
+
+    Returns:
+        str: The speakable text (empty if the field has no readable text, e.g., only an image).
+    """
+    if field is None:
+        return ""
+    # Remove sound references, and reduce cloze deletions to their text (e.g., "{{c1::Paris::city}}")
+    field = re.sub(r"\[sound:[^\]]*\]", " ", field)
+    field = re.sub(r"{{c\d+::(.*?)(::[^}]*)?}}", r"\1", field)
+    extractor = CardTextExtractor()
+    extractor.feed(field)
+    extractor.close()
+    text = re.sub(r"\s+", " ", extractor.text.replace("\u00a0", " "))
+    # Collapse the sentence breaks added between elements
+    text = re.sub(r"(\s*\.\s*){2,}", ". ", text)
+    text = re.sub(r"([?!:;,])(\s*\.)+", r"\1", text)
+    return text.strip(" .") if re.search(r"\w", text) else ""
+
+
+def CommandAudioFeedback(alert_sound_enabled=True):
+    """Checks queue for information to speak back to user through text-to-speech.
+
+    Args:
+        alert_sound_enabled (bool, optional): Synthesises the fixed feedback phrases at startup (otherwise text-to-speech is only started when first required). Defaults to True.
+    """
+    audio_feedback = None
+    if alert_sound_enabled:
+        audio_feedback = AudioFeedbackCache()
+        audio_feedback.prerender(AudioFeedbackCache.PHRASES)
     while True:
         text_to_speak = audio_feedback_queue.get()
-        pyttsx3.speak(text_to_speak)
+        # Sentinel for exit
+        if text_to_speak is None:
+            if audio_feedback is not None:
+                audio_feedback.close()
+            return
+        if audio_feedback is None:
+            audio_feedback = AudioFeedbackCache()
+        if isinstance(text_to_speak, AudioPrefetch):
+            audio_feedback.prefetch(text_to_speak.text)
+            audio_feedback_queue.task_done()
+            continue
+        started = time.perf_counter()
+        audio_feedback.speak(text_to_speak)
+        latency_metrics.observe("tts", time.perf_counter() - started)
         audio_feedback_queue.task_done()
 
 
+def calculate_percentiles(samples, points=(50, 95, 99)):
+    """Calculates nearest-rank percentiles for a set of samples.
+
+    Args:
+        samples (list): The samples (e.g., latencies in seconds).
+        points (tuple, optional): The percentiles to calculate. Defaults to (50, 95, 99).
+
+    Returns:
+        dict: Mapping of percentile to sample value (None if there are no samples).
+    """
+    ordered = sorted(samples)
+    if len(ordered) == 0:
+        return {point: None for point in points}
+    return {point: ordered[max(0, math.ceil(point / 100 * len(ordered)) - 1)] for point in points}
+
+
+def positive_int(value):
+    """Parses a command line argument that must be a positive integer.
+
+    Args:
+        value (str): The argument.
+
+    Raises:
+        argparse.ArgumentTypeError: If the argument is not a positive integer.
+
+    Returns:
+        int: The parsed argument.
+    """
+    try:
+        parsed = int(value)
+    except ValueError:
+        parsed = None
+    if parsed is None or parsed <= 0:
+        raise argparse.ArgumentTypeError(
+            f"'{value}' is not a positive integer")
+    return parsed
+
+
+def positive_int_list(value):
+    """Parses a command line argument that must be a comma separated list of positive integers.
+
+    Args:
+        value (str): The argument.
+
+    Raises:
+        argparse.ArgumentTypeError: If any item is not a positive integer.
+
+    Returns:
+        list: The parsed integers.
+    """
+    return [positive_int(item) for item in value.split(",")]
+
+
+def run_server(args):
+    """Runs anki-voice as a server for several users, sharing one loaded model.
+
+    Args:
+        args (argparse.Namespace): Parsed command line arguments.
+    """
+    print("Starting up server...\n")
+    if find_model(args.model) is None:
+        print_model_not_found(args.model)
+        sys.exit(1)
+    server = AnkiVoiceServer(command_config=args.command_config, host=args.server_host, port=args.server_port,
+                             workers=args.server_workers, full_vocabulary=args.full_vocabulary,
+                             vad_enabled=args.vad_disabled, vad_threshold=args.vad_threshold, model=args.model)
+    host, port = server.address
+    print(f"Listening on {host}:{port} (connect with --server_connect {host}:{port})\n")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()
+
+
 def main(args):
+    # Export latency metrics at exit, and on demand (SIGUSR1, where supported)
+    if args.metrics_file is not None:
+        atexit.register(latency_metrics.dump,
+                        args.metrics_file, args.metrics_format)
+        if hasattr(signal, "SIGUSR1"):
+            signal.signal(signal.SIGUSR1, lambda signal_number, frame: latency_metrics.dump_in_background(
+                args.metrics_file, args.metrics_format))
+    # Benchmarks are imported only when run, as they import this script
+    if args.profile_model is not None:
+        from benchmarks import profile_model
+        profile_model(args)
+        return
+    if args.benchmark is not None:
+        from benchmarks import run_benchmark
+        run_benchmark(args)
+        return
+    if args.event_log is not None and args.server_connect is None:
+        event_log.open(args.event_log)
+        atexit.register(event_log.close)
+    if args.server:
+        run_server(args)
+        return
+    if args.server_connect is not None:
+        host, port = args.server_connect.rsplit(":", 1)
+        print(f"Streaming audio to anki-voice server at {args.server_connect}...\n")
+        try:
+            stream_to_server((host, int(port)), MicrophoneAudioSource(chunk_ms=args.chunk_ms, rate=args.sample_rate),
+                             socket.gethostname(), args.ankiconnect_url,
+                             on_event=lambda event: print(f"Detected: {event['detected']} ({event['command']})"))
+        except KeyboardInterrupt:
+            pass
+        except OSError as ex:
+            logging.error(
+                f"An error occured when attempting to connect to the anki-voice server: {ex}")
+        return
     try:
         print("""              _    _                 _          
    __ _ _ __ | | _(_)    __   _____ (_) ___ ___ 
@@ -495,12 +3689,40 @@ def main(args):
         print("(2) A deck is open in review mode (i.e., question prompts are visible).")
         print("If either of these conditions are not met, errors may occur.")
         print("\nStarting up...\n")
+        anki_connect_client = AnkiConnectClient(url=args.ankiconnect_url,
+                                                connect_timeout=args.ankiconnect_connect_timeout,
+                                                read_timeout=args.ankiconnect_read_timeout,
+                                                retries=args.ankiconnect_retries)
+        journal = AnswerJournal(
+            args.journal_file) if args.journal_file is not None else None
+        if journal is not None and len(journal.pending()) > 0:
+            print(
+                f"{len(journal.pending())} journaled answer(s) will be replayed once AnkiConnect responds.\n")
         control = AnkiSpeechToCommand(
-            command_config=args.command_config, alert_sound_enabled=args.alert_sound_disabled)
+            command_config=args.command_config, alert_sound_enabled=args.alert_sound_disabled,
+            anki_connect_client=anki_connect_client, full_vocabulary=args.full_vocabulary,
+            partial_results=args.partial_results, partial_stability=args.partial_stability,
+            vad_enabled=args.vad_disabled, vad_threshold=args.vad_threshold, read_aloud=args.read_aloud,
+            journal=journal, watch_command_config=args.watch_disabled, answer_grading=args.answer_grading,
+            audio_source=MicrophoneAudioSource(
+                chunk_ms=args.chunk_ms, rate=args.sample_rate),
+            chunk_ms=args.chunk_ms, adaptive_chunking=args.adaptive_chunking, model=args.model)
+        # Reload commands on demand (SIGHUP, where supported), from a separate thread as the main thread may hold locks
+        if hasattr(signal, "SIGHUP"):
+            signal.signal(signal.SIGHUP, lambda signal_number, frame: threading.Thread(
+                target=control.reload_command_config, daemon=True).start())
+        # Audio is captured (and buffered) while the model loads, and AnkiConnect is checked
         control.run()
+        if not anki_connect_client.check_connection():
+            print(
+                "Warning: AnkiConnect could not be reached. Verify that Anki is open with the AnkiConnect plugin installed.\n")
+        # Commands are only recognised once the model has loaded (audio captured meanwhile is decoded then)
+        if not control.wait_until_ready():
+            print("The speech recognition model could not be loaded (see anki-voice.log).")
+            sys.exit(1)
         print("STARTED ||||||||||||||||||||||||||||||||||||||||| REAL-TIME COMMAND LOG:\n")
-        CommandAudioFeedback()
-    except (KeyboardInterrupt, SystemExit):
+        CommandAudioFeedback(alert_sound_enabled=args.alert_sound_disabled)
+    except KeyboardInterrupt:
         sys.exit(0)
 
 
@@ -509,8 +3731,84 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("-c", "--command_config", action="store", default="commands.json",
                         required=False, help="JSON file containing command words.")
+    parser.add_argument("--watch_disabled", action="store_false", default=True,
+                        help="Disable reloading the command file when it is modified (it can still be reloaded with SIGHUP).")
     parser.add_argument("-a", "--alert_sound_disabled", action="store_false", default=True,
                         help="Disasble sounds on context changes for: attach, pause, unpause.")
+    parser.add_argument("-r", "--read_aloud", action="store_true", default=False,
+                        help="Read the question of each card aloud, and the answer when shown.")
+    parser.add_argument("-g", "--answer_grading", action="store_true", default=False,
+                        help="Grade spoken answers against the answer of each card (speech that is not a command).")
+    parser.add_argument("--model", action="store", default="model", required=False,
+                        help="Path or name of the speech recognition model (searched for in the current folder, the anki-voice folder and its 'models' folder, and ~/.cache/vosk).")
+    parser.add_argument("-f", "--full_vocabulary", action="store_true", default=False,
+                        help="Decode speech against the full model vocabulary rather than only the command words.")
+    parser.add_argument("-p", "--partial_results", action="store_true", default=False,
+                        help="Execute commands from stable partial results, rather than waiting for the end of an utterance.")
+    parser.add_argument("--partial_stability", action="store", type=positive_int, default=2, required=False,
+                        help="Consecutive identical partial results required before executing a command.")
+    parser.add_argument("--vad_disabled", action="store_false", default=True,
+                        help="Disable voice activity detection (i.e., decode all audio, including silence).")
+    parser.add_argument("--vad_threshold", action="store", type=int, default=300, required=False,
+                        help="RMS amplitude (of 16-bit samples) above which audio is considered voice activity.")
+    parser.add_argument("--chunk_ms", action="store", type=positive_int, default=128, required=False,
+                        help="Milliseconds of audio per chunk (smaller chunks lower latency, but use more CPU).")
+    parser.add_argument("--adaptive_chunking", action="store_true", default=False,
+                        help="Decode several chunks at once when speech recognition falls behind.")
+    parser.add_argument("--sample_rate", action="store", type=positive_int, default=None, required=False,
+                        help="Sample rate to capture at (defaults to the microphone's native rate, resampled to 16kHz).")
+    parser.add_argument("--ankiconnect_url", action="store", default="http://localhost:8765",
+                        required=False, help="Address of the AnkiConnect API.")
+    parser.add_argument("--ankiconnect_connect_timeout", action="store", type=float, default=1.0,
+                        required=False, help="Seconds to wait when connecting to AnkiConnect.")
+    parser.add_argument("--ankiconnect_read_timeout", action="store", type=float, default=5.0,
+                        required=False, help="Seconds to wait for an AnkiConnect response.")
+    parser.add_argument("--ankiconnect_retries", action="store", type=int, default=2,
+                        required=False, help="Reconnection attempts (with backoff) when AnkiConnect can not be reached.")
+    parser.add_argument("-s", "--server", action="store_true", default=False,
+                        help="Run as a server for several users (sharing one loaded model), rather than using the microphone.")
+    parser.add_argument("--server_host", action="store", default="127.0.0.1", required=False,
+                        help="Interface for the server to listen on.")
+    parser.add_argument("--server_port", action="store", type=int, default=8766, required=False,
+                        help="Port for the server to listen on.")
+    parser.add_argument("--server_workers", action="store", type=int, default=None, required=False,
+                        help="Number of speech recognition workers for the server (defaults to the number of CPU cores).")
+    parser.add_argument("--server_connect", action="store", default=None, required=False,
+                        help="Stream the microphone to an anki-voice server (host:port), rather than recognising speech locally.")
+    parser.add_argument("-j", "--journal_file", action="store", default="anki-voice-journal.jsonl", required=False,
+                        help="File journaling answers, so that answers made while AnkiConnect can not be reached are replayed.")
+    parser.add_argument("--journal_disabled", action="store_const", const=None, dest="journal_file",
+                        help="Disable the answer journal.")
+    parser.add_argument("-e", "--event_log", action="store", default="anki-voice-events.jsonl", required=False,
+                        help="File logging each utterance (text, confidence, command, and outcome) as JSON lines, rotated by size.")
+    parser.add_argument("--event_log_disabled", action="store_const", const=None, dest="event_log",
+                        help="Disable the event log.")
+    parser.add_argument("-m", "--metrics_file", action="store", default=None, required=False,
+                        help="File to write per-stage latency metrics to at exit (and on SIGUSR1).")
+    parser.add_argument("--metrics_format", action="store", default="json", required=False,
+                        choices=["json", "prometheus"], help="Format of the metrics file.")
+    parser.add_argument("-b", "--benchmark", action="store", default=None, required=False,
+                        choices=["answer_latency", "replay", "matcher", "startup", "server", "journal", "chunk_size", "session", "grading", "models"],
+                        help="Run a benchmark (against a local mock AnkiConnect server) instead of starting anki-voice.")
+    parser.add_argument("--benchmark_corpus", action="store", default=None, required=False,
+                        help="JSON manifest of recorded commands (audio, transcript, and expected command), or an event log (.jsonl), for benchmarks.")
+    parser.add_argument("--benchmark_max_speed", action="store_true", default=False,
+                        help="Replay recorded audio as fast as possible, rather than at real-time speed.")
+    parser.add_argument("--benchmark_iterations", action="store", type=int, default=200,
+                        required=False, help="Number of iterations for benchmarks.")
+    parser.add_argument("--benchmark_server_latency", action="store", type=float, default=5.0,
+                        required=False, help="Simulated AnkiConnect processing time (ms) per request in benchmarks.")
+    parser.add_argument("--benchmark_chunk_sizes", action="store", type=positive_int_list, default="32,64,128,256", required=False,
+                        help="Comma separated chunk sizes (ms) for the chunk size benchmark.")
+    parser.add_argument("--benchmark_drop_rate", action="store", type=float, default=0.2, required=False,
+                        help="Fraction of requests (and separately, responses) dropped by the mock AnkiConnect server in the journal benchmark.")
+    parser.add_argument("--benchmark_sessions", action="store", default="1,2,4,8", required=False,
+                        help="Comma separated numbers of concurrent sessions for the server benchmark.")
+    parser.add_argument("--benchmark_models", action="store", default=None, required=False,
+                        help="Comma separated paths or names of models for the models benchmark (defaults to all installed models).")
+    # Profiles one model in a fresh process (run by the models benchmark)
+    parser.add_argument("--profile_model", action="store", default=None, required=False,
+                        help=argparse.SUPPRESS)
     args = parser.parse_args()
 
     main(args)
@@ -0,0 +1,62 @@
+"""Benchmarks for anki-voice, run with 'python anki-voice.py -b <benchmark>'. The benchmarks
+import anki-voice.py as the 'anki_voice' module: when it is run as a script this is the running
+script, so that the benchmarks share its state (e.g., latency metrics); otherwise (e.g., in tests)
+it is loaded here."""
+
+import importlib.util
+from pathlib import Path
+import sys
+
+
+def load_anki_voice():
+    """Loads anki-voice.py as the 'anki_voice' module, unless it has already been loaded (or is
+    being run as a script, in which case the script is used).
+
+    Returns:
+        module: The anki-voice module.
+    """
+    script_path = Path(__file__).resolve().parent.parent / "anki-voice.py"
+    main_path = getattr(sys.modules.get("__main__"), "__file__", None)
+    if "anki_voice" not in sys.modules and main_path is not None and Path(main_path).resolve() == script_path:
+        sys.modules["anki_voice"] = sys.modules["__main__"]
+    if "anki_voice" not in sys.modules:
+        spec = importlib.util.spec_from_file_location(
+            "anki_voice", script_path)
+        module = importlib.util.module_from_spec(spec)
+        sys.modules["anki_voice"] = module
+        try:
+            spec.loader.exec_module(module)
+        except BaseException:
+            del sys.modules["anki_voice"]
+            raise
+    return sys.modules["anki_voice"]
+
+
+load_anki_voice()
+
+from benchmarks.journal import benchmark_journal  # noqa: E402
+from benchmarks.latency import benchmark_answer_latency, benchmark_chunk_size, benchmark_replay, benchmark_session  # noqa: E402
+from benchmarks.matching import benchmark_grading, benchmark_matcher  # noqa: E402
+from benchmarks.mock_anki_connect import MockAnkiConnectServer  # noqa: E402, F401
+from benchmarks.resources import benchmark_models, benchmark_server, benchmark_startup, profile_model  # noqa: E402, F401
+
+
+def run_benchmark(args):
+    """Runs the benchmark selected through the command line arguments.
+
+    Args:
+        args (argparse.Namespace): Parsed command line arguments.
+    """
+    benchmarks = {
+        "answer_latency": benchmark_answer_latency,
+        "replay": benchmark_replay,
+        "matcher": benchmark_matcher,
+        "startup": benchmark_startup,
+        "server": benchmark_server,
+        "journal": benchmark_journal,
+        "chunk_size": benchmark_chunk_size,
+        "session": benchmark_session,
+        "grading": benchmark_grading,
+        "models": benchmark_models
+    }
+    benchmarks[args.benchmark](args)
@@ -0,0 +1,207 @@
+"""Helpers shared by the benchmarks: loading a corpus of recorded commands, replaying it through
+the pipeline, and reporting latencies and memory."""
+
+import bisect
+import contextlib
+import io
+import json
+from pathlib import Path
+import random
+import sys
+import time
+
+from anki_voice import (AnkiConnectClient, AnkiSpeechToCommand, CommandMatcher, WaveFileAudioSource,
+                        calculate_percentiles, load_event_log)
+from benchmarks.mock_anki_connect import MockAnkiConnectServer
+
+
+def resident_memory():
+    """Measures the resident memory of this process.
+
+    Returns:
+        tuple: The current and peak resident memory (in bytes), or None where unavailable.
+    """
+    try:
+        with open("/proc/self/status") as status:
+            fields = dict(line.split(":", 1) for line in status)
+        return int(fields["VmRSS"].split()[0]) * 1024, int(fields["VmHWM"].split()[0]) * 1024
+    except (OSError, KeyError, ValueError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None, None
+    # Only the peak is available (in kilobytes, other than on macOS)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return None, peak if sys.platform == "darwin" else peak * 1024
+
+
+def print_latency_summary(label, samples):
+    """Prints the mean and percentiles of latency samples (in seconds) as milliseconds.
+
+    Args:
+        label (str): A description of what was measured.
+        samples (list): The latency samples in seconds.
+    """
+    if len(samples) == 0:
+        print(f"{label:<40} no samples")
+        return
+    summary = calculate_percentiles(samples)
+    print(f"{label:<40} mean {1000 * sum(samples) / len(samples):8.2f} ms | "
+          f"p50 {1000 * summary[50]:8.2f} ms | p95 {1000 * summary[95]:8.2f} ms | p99 {1000 * summary[99]:8.2f} ms")
+
+
+def load_benchmark_corpus(corpus_path):
+    """Loads a benchmark corpus manifest. The manifest is a JSON list of entries, each of which
+    may contain an 'audio' file (relative to the manifest), its 'transcript', and the expected
+    'command' (null if the entry is not a command). An event log (.jsonl) may be used instead,
+    giving an entry for each recorded utterance with its 'transcript', 'command', and recorded
+    'time' and 'outcome' (spoken answers are not included).
+
+    Args:
+        corpus_path (str): The corpus manifest JSON file, or event log.
+
+    Returns:
+        list: The corpus entries, with audio paths resolved.
+    """
+    if corpus_path is None:
+        print("Please provide a corpus manifest with --benchmark_corpus for this benchmark.")
+        sys.exit(1)
+    if corpus_path.endswith(".jsonl"):
+        return [{"transcript": event["text"], "command": event.get("command"), "time": event["time"],
+                 "outcome": event.get("outcome")} for event in load_event_log(corpus_path)
+                if event.get("event") == "utterance" and "text" in event and not event.get("spoken_answer")]
+    with open(corpus_path) as corpus_raw:
+        corpus = json.load(corpus_raw)
+    for entry in corpus:
+        if "audio" in entry:
+            entry["audio"] = str(Path(corpus_path).resolve().parent / entry["audio"])
+    return corpus
+
+
+def replay_corpus(args, corpus, chunk_ms=128, adaptive_chunking=False):
+    """Replays a corpus of recorded commands through the full pipeline, against a local mock
+    AnkiConnect server.
+
+    Args:
+        args (argparse.Namespace): Parsed command line arguments.
+        corpus (list): The corpus entries (each with an 'audio' file).
+        chunk_ms (int, optional): Milliseconds of audio per chunk. Defaults to 128.
+        adaptive_chunking (bool, optional): Decodes several chunks per recogniser call when speech recognition falls behind. Defaults to False.
+
+    Returns:
+        AnkiSpeechToCommand: The pipeline (with its command history and statistics).
+        WaveFileAudioSource: The audio source (with the positions and times of each utterance).
+        MockAnkiConnectServer: The mock server (with its request log).
+        float: Seconds taken to replay the corpus.
+    """
+    server = MockAnkiConnectServer(
+        latency=args.benchmark_server_latency / 1000)
+    server.start()
+    client = AnkiConnectClient(url=server.url)
+    audio_source = WaveFileAudioSource([entry["audio"] for entry in corpus], realtime=not args.benchmark_max_speed,
+                                       frames_per_buffer=16 * chunk_ms)
+    with contextlib.redirect_stdout(io.StringIO()):
+        control = AnkiSpeechToCommand(command_config=args.command_config, alert_sound_enabled=False,
+                                      anki_connect_client=client, full_vocabulary=args.full_vocabulary,
+                                      partial_results=args.partial_results, partial_stability=args.partial_stability,
+                                      vad_enabled=args.vad_disabled, vad_threshold=args.vad_threshold,
+                                      audio_source=audio_source, chunk_ms=chunk_ms, adaptive_chunking=adaptive_chunking,
+                                      model=args.model)
+        control.wait_until_ready()
+        started = time.perf_counter()
+        control.run()
+        control.join()
+        elapsed = time.perf_counter() - started
+    client.close()
+    server.stop()
+    return control, audio_source, server, elapsed
+
+
+def score_replay(corpus, control, audio_source, server):
+    """Scores a replayed corpus: which utterances were recognised as the expected command, and
+    the latency from the end of each utterance to its AnkiConnect request.
+
+    Args:
+        corpus (list): The corpus entries (each with an 'audio' file and expected 'command').
+        control (AnkiSpeechToCommand): The pipeline the corpus was replayed through.
+        audio_source (WaveFileAudioSource): The audio source the corpus was replayed from.
+        server (MockAnkiConnectServer): The mock server the commands were sent to.
+
+    Returns:
+        int: The number of utterances recognised as the expected command.
+        list: The latency (in seconds) of each utterance that resulted in an AnkiConnect request.
+        list: Descriptions of misrecognised utterances.
+    """
+    # Attribute executed commands to utterances by their position in the audio
+    detections = [[] for _ in corpus]
+    for executed_time, position, detected_words, command in control.command_history:
+        index = bisect.bisect_right(
+            audio_source.utterance_start_positions, position) - 1
+        detections[max(index, 0)].append((executed_time, command))
+    executed_times = sorted(executed_time for executed_time,
+                            _, _, _ in control.command_history)
+    request_times = sorted(request_time for request_time,
+                           _, _ in server.request_log)
+    correct = 0
+    latencies = []
+    misrecognised = []
+    for index, entry in enumerate(corpus):
+        detected = detections[index][0][1] if detections[index] else None
+        if detected == entry.get("command"):
+            correct += 1
+        else:
+            misrecognised.append(
+                f"{Path(entry['audio']).name}: expected {entry.get('command')}, detected {detected}")
+        if not detections[index]:
+            continue
+        # The first AnkiConnect request made before the next command was executed
+        executed_time = detections[index][0][0]
+        request_index = bisect.bisect_left(request_times, executed_time)
+        next_index = bisect.bisect_right(executed_times, executed_time)
+        if request_index < len(request_times) and (next_index >= len(executed_times) or request_times[request_index] < executed_times[next_index]):
+            latencies.append(
+                request_times[request_index] - audio_source.utterance_end_times[index])
+    return correct, latencies, misrecognised
+
+
+def synthetic_transcript_corpus(command_config_json, variants_per_phrase=3):
+    """Generates a transcript corpus of command phrases, misspelt variants of them (a single
+    character deleted, inserted, substituted, or transposed, which are not expected to match
+    commands that are only matched exactly), and words that are not commands (including words
+    close to commands).
+
+    Args:
+        command_config_json (dict): The parsed JSON command configuration.
+        variants_per_phrase (int, optional): Number of misspelt variants of each phrase. Defaults to 3.
+
+    Returns:
+        list: (transcript, expected command) pairs.
+    """
+    generator = random.Random(0)
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    corpus = []
+    for command in CommandMatcher.COMMANDS:
+        for phrase in [command] + command_config_json[command]["related_words"]:
+            corpus.append((phrase, command))
+            for _ in range(variants_per_phrase if len(phrase) >= 4 else 0):
+                index = generator.randrange(len(phrase) - 1)
+                edit = generator.choice(
+                    ["delete", "insert", "substitute", "transpose"])
+                if edit == "delete":
+                    variant = phrase[:index] + phrase[index + 1:]
+                elif edit == "insert":
+                    variant = phrase[:index] + \
+                        generator.choice(letters) + phrase[index:]
+                elif edit == "substitute":
+                    variant = phrase[:index] + \
+                        generator.choice(letters) + phrase[index + 1:]
+                else:
+                    variant = phrase[:index] + phrase[index + 1] + \
+                        phrase[index] + phrase[index + 2:]
+                corpus.append((variant, None if command in CommandMatcher.EXACT_ONLY_COMMANDS else command))
+    for words in ["hello", "the", "what", "thanks", "next card", "okay", "yes", "no", "maybe",
+                  "answer", "question", "repeat", "stop", "i don't know", "um", "quiet", "quite", "lose",
+                  "food", "wood", "gold", "east", "pass", "paws", "snow", "slow"]:
+        corpus.append((words, None))
+    return corpus
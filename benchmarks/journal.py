@@ -0,0 +1,115 @@
+"""Benchmark of the answer journal, against a mock AnkiConnect server that drops requests."""
+
+import contextlib
+import io
+import json
+import logging
+import os
+import tempfile
+import time
+
+from anki_voice import AnkiActionHandler, AnkiConnectClient, AnkiSpeechToCommand, AnswerJournal
+from benchmarks.common import print_latency_summary
+from benchmarks.mock_anki_connect import MockAnkiConnectServer
+
+
+def benchmark_journal(args):
+    """Benchmarks the answer journal against a mock AnkiConnect server that drops requests:
+    the throughput of replaying a backlog of journaled answers, the time to recover a journaled
+    answer once AnkiConnect responds again, and whether any answer is lost or applied twice.
+
+    Args:
+        args (argparse.Namespace): Parsed command line arguments.
+    """
+    iterations = args.benchmark_iterations
+    journal_directory = tempfile.mkdtemp()
+    logging.disable(logging.ERROR)
+    # Replaying a backlog (e.g., from a previous session), including answers that are stale
+    server = MockAnkiConnectServer(
+        latency=args.benchmark_server_latency / 1000, card_count=iterations + 1)
+    server.start()
+    client = AnkiConnectClient(url=server.url)
+    journal = AnswerJournal(os.path.join(journal_directory, "backlog.jsonl"))
+    for index in range(iterations):
+        journal.append(1000 + index, 3, "good")
+        if index % 10 == 0:
+            journal.append(999, 3, "good")
+    backlog_size = len(journal.pending())
+    anki_action = AnkiActionHandler(
+        alert_sound_enabled=False, anki_connect_client=client, journal=journal)
+    with contextlib.redirect_stdout(io.StringIO()):
+        started = time.perf_counter()
+        anki_action.flush_journal()
+        flush_time = time.perf_counter() - started
+    backlog_duplicates = len(server.answered_cards) - \
+        len(set(server.answered_cards))
+    backlog_applied = len(server.answered_cards)
+    journal.close()
+    client.close()
+    server.stop()
+    # Recovering from outages: each answer is journaled while AnkiConnect is unreachable
+    server = MockAnkiConnectServer(
+        latency=args.benchmark_server_latency / 1000, card_count=iterations + 1)
+    server.start()
+    client = AnkiConnectClient(
+        url=server.url, connect_timeout=0.5, read_timeout=1.0, retries=0)
+    journal = AnswerJournal(os.path.join(journal_directory, "outage.jsonl"))
+    anki_action = AnkiActionHandler(
+        alert_sound_enabled=False, anki_connect_client=client, journal=journal)
+    recovery_times = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        anki_action.get_current_card_information()
+        for _ in range(min(iterations, 50)):
+            anki_action.show()
+            server.available = False
+            anki_action.good()
+            server.available = True
+            started = time.perf_counter()
+            anki_action.flush_journal()
+            recovery_times.append(time.perf_counter() - started)
+    outage_applied = len(server.answered_cards)
+    outage_attempts = len(recovery_times)
+    journal.close()
+    client.close()
+    server.stop()
+    # Reviewing while requests (or their responses) are randomly dropped
+    server = MockAnkiConnectServer(latency=args.benchmark_server_latency / 1000, card_count=iterations + 1,
+                                   drop_rate=args.benchmark_drop_rate, lost_response_rate=args.benchmark_drop_rate)
+    server.start()
+    client = AnkiConnectClient(
+        url=server.url, connect_timeout=0.5, read_timeout=1.0, retries=0)
+    journal = AnswerJournal(os.path.join(journal_directory, "drops.jsonl"))
+    anki_action = AnkiActionHandler(
+        alert_sound_enabled=False, anki_connect_client=client, journal=journal)
+    with contextlib.redirect_stdout(io.StringIO()):
+        started = time.perf_counter()
+        for _ in range(iterations):
+            anki_action.flush_journal()
+            anki_action.get_current_card_information()
+            anki_action.show()
+            anki_action.good()
+        # Until the journal is replayed (requests are still dropped)
+        while not anki_action.flush_journal():
+            pass
+        review_time = time.perf_counter() - started
+    drop_duplicates = len(server.answered_cards) - \
+        len(set(server.answered_cards))
+    drop_applied = len(server.answered_cards)
+    journal.close()
+    # Cards answered (the same card may be answered again if its first answer was journaled)
+    with open(os.path.join(journal_directory, "drops.jsonl")) as journal_file:
+        issued_cards = {entry["card_id"] for entry in map(
+            json.loads, journal_file) if "status" not in entry}
+    client.close()
+    server.stop()
+    logging.disable(logging.NOTSET)
+    print(f"Answer journal (simulated AnkiConnect processing time: {args.benchmark_server_latency} ms per request)\n")
+    print(f"Backlog replay: {backlog_size} journaled answers ({backlog_size - iterations} stale) in "
+          f"{1000 * flush_time:.1f} ms ({backlog_size / flush_time:.0f} answers/s) | "
+          f"applied {backlog_applied} | applied twice {backlog_duplicates}")
+    print(f"Outage recovery: {outage_applied}/{outage_attempts} answers journaled during an outage were applied once AnkiConnect responded")
+    print_latency_summary("Recovery time (reconcile and replay)", recovery_times)
+    print(f"(while idle, journaled answers are retried every {AnkiSpeechToCommand.JOURNAL_RETRY_INTERVAL} s)")
+    print(f"\nReviewing with {100 * args.benchmark_drop_rate:.0f}% of requests and {100 * args.benchmark_drop_rate:.0f}% of responses dropped: "
+          f"{drop_applied} answers applied ({len(issued_cards)} journaled) in {review_time:.2f} s | "
+          f"lost {len(issued_cards - set(server.answered_cards))} | applied twice {drop_duplicates}")
@@ -0,0 +1,231 @@
+"""Benchmarks of command latency: answering cards, replaying recorded commands and sessions, and
+the audio chunk size."""
+
+import contextlib
+import io
+import numpy as np
+import os
+import sys
+import tempfile
+import time
+
+from anki_voice import (AnkiActionHandler, AnkiConnectClient, AnkiSpeechToCommand, PolyphaseResampler,
+                        WaveFileAudioSource, calculate_percentiles, event_log, latency_metrics, load_event_log)
+from benchmarks.common import load_benchmark_corpus, print_latency_summary, replay_corpus, score_replay
+from benchmarks.mock_anki_connect import MockAnkiConnectServer
+
+
+def measure_answer_latency(args, next_card_deferred):
+    """Measures answering cards against a local mock AnkiConnect server: with separate answer and
+    refresh round trips, with the answer and refresh batched in a 'multi' request (as the answer
+    commands do), and showing and answering a card as separate commands and chained.
+
+    Args:
+        args (argparse.Namespace): Parsed command line arguments.
+        next_card_deferred (bool): Whether the mock server shows the next card only once the answering request has completed (as from Anki 2.1.45).
+
+    Returns:
+        dict: The latency samples (in seconds) of each approach.
+    """
+    server = MockAnkiConnectServer(
+        latency=args.benchmark_server_latency / 1000, next_card_deferred=next_card_deferred)
+    server.start()
+    client = AnkiConnectClient(url=server.url)
+    anki_action = AnkiActionHandler(
+        alert_sound_enabled=False, anki_connect_client=client)
+    latencies = {"sequential": [], "batched": [], "separate": [], "chained": []}
+    with contextlib.redirect_stdout(io.StringIO()):
+        anki_action.get_current_card_information()
+        for _ in range(args.benchmark_iterations):
+            # Previous behaviour: answer, then a separate request for the next card
+            client.request(
+                "GET", {"action": "guiShowAnswer", "version": 6}, "show a card answer")
+            started = time.perf_counter()
+            client.request("POST", {"action": "guiAnswerCard", "version": 6, "params": {
+                           "ease": 3}}, "mark card as Good")
+            client.request(
+                "GET", {"action": "guiCurrentCard", "version": 6}, "get current card information")
+            latencies["sequential"].append(time.perf_counter() - started)
+            # Batched behaviour: answer and next card in a single request (refreshed again if required)
+            anki_action.get_current_card_information()
+            anki_action.show()
+            started = time.perf_counter()
+            anki_action.good()
+            latencies["batched"].append(time.perf_counter() - started)
+        for _ in range(args.benchmark_iterations):
+            # Showing and answering as separate commands, and chained in one utterance ("show good")
+            started = time.perf_counter()
+            anki_action.show()
+            anki_action.good()
+            latencies["separate"].append(time.perf_counter() - started)
+            started = time.perf_counter()
+            anki_action.execute_sequence(["show", "good"])
+            latencies["chained"].append(time.perf_counter() - started)
+    client.close()
+    server.stop()
+    return latencies
+
+
+def benchmark_answer_latency(args):
+    """Compares answering a card with separate answer and refresh round trips against a
+    batched 'multi' round trip, and showing and answering a card as separate commands against a
+    single chained utterance, using a local mock AnkiConnect server. Both are measured for Anki
+    before 2.1.45 (where the next card is shown as soon as a card is answered), and from 2.1.45
+    (where it is only shown once the answering request has completed, so the next card is
+    fetched in a further round trip).
+
+    Args:
+        args (argparse.Namespace): Parsed command line arguments.
+    """
+    print(f"Answer latency over {args.benchmark_iterations} cards "
+          f"(simulated AnkiConnect processing time: {args.benchmark_server_latency} ms per request)")
+    for next_card_deferred, description in [(False, "Anki before 2.1.45: next card shown immediately"),
+                                            (True, "Anki 2.1.45 and later: next card shown after the request")]:
+        latencies = measure_answer_latency(args, next_card_deferred)
+        print(f"\n{description}\n")
+        print_latency_summary("Answer + refresh (2 round trips)",
+                              latencies["sequential"])
+        print_latency_summary("Batched 'multi'", latencies["batched"])
+        print(f"Mean speedup: {sum(latencies['sequential']) / sum(latencies['batched']):.2f}x")
+        print_latency_summary("'show', then 'good'",
+                              latencies["separate"])
+        print_latency_summary("'show good'", latencies["chained"])
+        print(f"Mean speedup: {sum(latencies['separate']) / sum(latencies['chained']):.2f}x "
+              "(excluding the silence timeout saved for each command after the first)")
+
+
+def benchmark_replay(args):
+    """Replays a corpus of recorded commands through the full pipeline, against a local mock
+    AnkiConnect server, and reports command accuracy, throughput, and the latency from the end
+    of each utterance to its AnkiConnect request.
+
+    Args:
+        args (argparse.Namespace): Parsed command line arguments.
+    """
+    corpus = [entry for entry in load_benchmark_corpus(
+        args.benchmark_corpus) if "audio" in entry]
+    control, audio_source, server, elapsed = replay_corpus(
+        args, corpus, chunk_ms=args.chunk_ms, adaptive_chunking=args.adaptive_chunking)
+    correct, latencies, misrecognised = score_replay(
+        corpus, control, audio_source, server)
+    print(f"Replayed {len(corpus)} utterances ({audio_source.duration:.1f} s of audio) at "
+          f"{'maximum' if args.benchmark_max_speed else 'real-time'} speed\n")
+    print(
+        f"Command accuracy: {100 * correct / max(len(corpus), 1):.1f}% ({correct}/{len(corpus)})")
+    print(f"Throughput: {audio_source.duration / elapsed:.2f}x real-time")
+    if args.benchmark_max_speed:
+        print("Utterance end to AnkiConnect request latency is only measured at real-time speed")
+    else:
+        print_latency_summary(
+            "Utterance end to AnkiConnect request", latencies)
+    print("Pipeline statistics:", control.pipeline_statistics())
+    print("\nStage latencies:")
+    for stage, stage_summary in latency_metrics.summary().items():
+        print(f"  {stage:<24} n={stage_summary['count']:<6} p50 {1000 * stage_summary['p50']:8.2f} ms | "
+              f"p95 {1000 * stage_summary['p95']:8.2f} ms | p99 {1000 * stage_summary['p99']:8.2f} ms")
+    if len(misrecognised) > 0:
+        print("\nMisrecognised utterances:")
+        for description in misrecognised:
+            print(f"  {description}")
+
+
+def benchmark_session(args):
+    """Replays the command stream of a recorded session (from its event log) through command
+    matching and dispatch, against a local mock AnkiConnect server, at the recorded pace (or at
+    maximum speed). Reports the commands and outcomes that differ from the recording (e.g.,
+    after changing the command configuration), and the dispatch latencies.
+
+    Args:
+        args (argparse.Namespace): Parsed command line arguments.
+    """
+    if args.benchmark_corpus is None or not args.benchmark_corpus.endswith(".jsonl"):
+        print("Please provide an event log (.jsonl) with --benchmark_corpus for this benchmark.")
+        sys.exit(1)
+    recorded = [entry for entry in load_benchmark_corpus(
+        args.benchmark_corpus) if entry["outcome"] != "dropped"]
+    server = MockAnkiConnectServer(
+        latency=args.benchmark_server_latency / 1000)
+    server.start()
+    client = AnkiConnectClient(url=server.url)
+    replay_path = os.path.join(tempfile.mkdtemp(), "replay.jsonl")
+    event_log.open(replay_path)
+    with contextlib.redirect_stdout(io.StringIO()):
+        control = AnkiSpeechToCommand(command_config=args.command_config, alert_sound_enabled=False,
+                                      anki_connect_client=client, audio_source=WaveFileAudioSource([]), model=args.model)
+        control.run()
+        started = time.perf_counter()
+        for entry in recorded:
+            if not args.benchmark_max_speed:
+                # Keeps the recorded time between utterances
+                delay = entry["time"] - recorded[0]["time"] - \
+                    (time.perf_counter() - started)
+                if delay > 0:
+                    time.sleep(delay)
+            control.submit_transcript(entry["transcript"])
+        control.join()
+        elapsed = time.perf_counter() - started
+    event_log.close()
+    client.close()
+    server.stop()
+    replayed = [event for event in load_event_log(
+        replay_path) if event["event"] == "utterance"]
+    command_differences = [(entry, event) for entry, event in zip(
+        recorded, replayed) if entry["command"] != event["command"]]
+    outcome_differences = [(entry, event) for entry, event in zip(
+        recorded, replayed) if entry["outcome"] != event["outcome"]]
+    duration = recorded[-1]["time"] - recorded[0]["time"] if len(recorded) > 0 else 0.0
+    print(f"Replayed {len(replayed)}/{len(recorded)} utterances from {args.benchmark_corpus} "
+          f"(recorded over {duration:.1f} s) in {elapsed:.2f} s\n")
+    print(f"Commands matching the recording: {len(recorded) - len(command_differences)}/{len(recorded)}")
+    print(f"Outcomes matching the recording: {len(recorded) - len(outcome_differences)}/{len(recorded)} "
+          "(the mock server does not reproduce the state of Anki)")
+    print_latency_summary("Queue wait", [event["queue_wait"]
+                          for event in replayed if "queue_wait" in event])
+    print_latency_summary("Command execution", [
+                          event["execution"] for event in replayed if "execution" in event])
+    if len(command_differences) > 0:
+        print("\nCommands that differ from the recording:")
+        for entry, event in command_differences:
+            print(f"  '{entry['transcript']}': recorded {entry['command']}, replayed {event['command']}")
+
+
+def benchmark_chunk_size(args):
+    """Compares chunk sizes (with and without adaptive chunking) by replaying a corpus of
+    recorded commands: the recogniser CPU time, command accuracy, and (at real-time speed) the
+    latency from the end of each utterance to its AnkiConnect request. Also measures the CPU
+    time of resampling audio captured at common native sample rates for each chunk size.
+
+    Args:
+        args (argparse.Namespace): Parsed command line arguments.
+    """
+    corpus = [entry for entry in load_benchmark_corpus(
+        args.benchmark_corpus) if "audio" in entry]
+    print(f"Replaying {len(corpus)} utterances at {'maximum' if args.benchmark_max_speed else 'real-time'} speed "
+          "for each chunk size\n")
+    for chunk_ms in args.benchmark_chunk_sizes:
+        for adaptive_chunking in [False, True]:
+            control, audio_source, server, elapsed = replay_corpus(
+                args, corpus, chunk_ms=chunk_ms, adaptive_chunking=adaptive_chunking)
+            correct, latencies, _ = score_replay(
+                corpus, control, audio_source, server)
+            decode_cpu = control.pipeline_statistics()["decode_cpu_seconds"]
+            description = f"{chunk_ms} ms{' (adaptive)' if adaptive_chunking else ''}"
+            latency = "" if args.benchmark_max_speed or len(latencies) == 0 else \
+                f" | latency p50 {1000 * calculate_percentiles(latencies)[50]:7.1f} ms"
+            print(f"{description:<18} recogniser CPU {1000 * decode_cpu / audio_source.duration:6.1f} ms/s of audio | "
+                  f"{audio_source.duration / elapsed:7.2f}x real-time | accuracy {100 * correct / max(len(corpus), 1):5.1f}%{latency}")
+    print("\nResampling to 16kHz (CPU time per second of audio):")
+    generator = np.random.default_rng(0)
+    for rate in [44100, 48000]:
+        audio = (generator.standard_normal(rate * 10) *
+                 3000).astype(np.int16).tobytes()
+        timings = []
+        for chunk_ms in args.benchmark_chunk_sizes:
+            resampler = PolyphaseResampler(rate)
+            chunk_bytes = 2 * (rate * chunk_ms // 1000)
+            started = time.thread_time()
+            for offset in range(0, len(audio), chunk_bytes):
+                resampler.process(audio[offset:offset + chunk_bytes])
+            timings.append(
+                f"{chunk_ms} ms: {100 * (time.thread_time() - started):5.2f} ms")
+        print(f"  {rate} Hz  " + " | ".join(timings))
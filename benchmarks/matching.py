@@ -0,0 +1,135 @@
+"""Benchmarks of matching transcripts: to commands, and to card answers (spoken answer grading)."""
+
+import collections
+import json
+import time
+from vosk import Model, KaldiRecognizer, SetLogLevel
+
+from anki_voice import AnswerGrader, CommandMatcher, WaveFileAudioSource, find_model, print_model_not_found
+from benchmarks.common import load_benchmark_corpus, print_latency_summary, synthetic_transcript_corpus
+
+
+def benchmark_matcher(args):
+    """Benchmarks matching transcripts to commands: the time per lookup of the previous linear
+    search of command lists against the compiled matcher, and the accuracy of exact against
+    near miss (fuzzy) matching.
+
+    Args:
+        args (argparse.Namespace): Parsed command line arguments.
+    """
+    with open(args.command_config) as command_config_raw:
+        command_config_json = json.load(command_config_raw)
+    matcher = CommandMatcher(command_config_json)
+    if args.benchmark_corpus is not None:
+        corpus = [(entry["transcript"], entry.get("command")) for entry in load_benchmark_corpus(
+            args.benchmark_corpus) if "transcript" in entry]
+        corpus_description = args.benchmark_corpus
+    else:
+        corpus = synthetic_transcript_corpus(command_config_json)
+        corpus_description = "synthetic corpus of command phrases, misspellings, and non-commands"
+    # Previous behaviour: a list of phrases for each command, searched in turn
+    command_lists = [(command, [command] + command_config_json[command]["related_words"])
+                     for command in CommandMatcher.COMMANDS]
+
+    def linear_search(words):
+        for command, phrases in command_lists:
+            if words in phrases:
+                return command
+        return None
+
+    lookups = {
+        "Linear search of command lists": linear_search,
+        "Compiled matcher (exact only)": lambda words: matcher.match(words, fuzzy=False)[0],
+        "Compiled matcher (with fuzzy)": lambda words: matcher.match(words)[0]
+    }
+    print(f"Command matching over {len(corpus)} transcripts ({corpus_description})\n")
+    for description, lookup in lookups.items():
+        started = time.perf_counter()
+        for _ in range(args.benchmark_iterations):
+            for transcript, _ in corpus:
+                lookup(transcript)
+        elapsed = time.perf_counter() - started
+        correct = false_matches = misses = 0
+        for transcript, expected in corpus:
+            command = lookup(transcript)
+            if command == expected:
+                correct += 1
+            elif command is None:
+                misses += 1
+            else:
+                false_matches += 1
+        print(f"{description:<34} {1e9 * elapsed / (args.benchmark_iterations * len(corpus)):9.0f} ns/lookup | "
+              f"accuracy {100 * correct / len(corpus):5.1f}% | missed {misses:4} | false matches {false_matches:4}")
+
+
+def benchmark_grading(args):
+    """Benchmarks grading spoken answers: the time to index each card's answer (when the card is
+    shown), to finalise the transcript and score it once the utterance ends, and the agreement
+    between automatic grades and manual grades. Each corpus entry has the card 'answer', the
+    manual 'grade', and either the 'transcript' of the spoken answer or its 'audio'.
+
+    Args:
+        args (argparse.Namespace): Parsed command line arguments.
+    """
+    corpus = [entry for entry in load_benchmark_corpus(args.benchmark_corpus)
+              if "answer" in entry and "grade" in entry and ("transcript" in entry or "audio" in entry)]
+    grades = ["again", "difficult", "good", "easy"]
+    # Audio is transcribed with a full vocabulary recogniser, as when reviewing
+    model = None
+    if any("audio" in entry for entry in corpus):
+        model_path = find_model(args.model)
+        if model_path is None:
+            print_model_not_found(args.model)
+            return
+        SetLogLevel(-10)
+        model = Model(model_path)
+    transcription_latencies = []
+    for entry in corpus:
+        if "audio" not in entry:
+            continue
+        recogniser = KaldiRecognizer(model, 16000)
+        audio = WaveFileAudioSource._load_audio(entry["audio"])
+        for offset in range(0, len(audio), 4096):
+            recogniser.AcceptWaveform(audio[offset:offset + 4096])
+        started = time.perf_counter()
+        entry["transcript"] = json.loads(recogniser.FinalResult())["text"]
+        transcription_latencies.append(time.perf_counter() - started)
+    indexing_latencies = []
+    scoring_latencies = []
+    for _ in range(args.benchmark_iterations):
+        for entry in corpus:
+            started = time.perf_counter()
+            grader = AnswerGrader(entry["answer"])
+            indexing_latencies.append(time.perf_counter() - started)
+            started = time.perf_counter()
+            grader.grade(grader.score(entry["transcript"]))
+            scoring_latencies.append(time.perf_counter() - started)
+    # Manual grade -> automatic grade
+    confusion = collections.Counter()
+    disagreements = []
+    for entry in corpus:
+        grader = AnswerGrader(entry["answer"])
+        score = grader.score(entry["transcript"])
+        # Speech matching no word of the answer is not graded (the card is left as it is)
+        grade = grader.grade(score) if score > 0 else "ungraded"
+        confusion[(entry["grade"], grade)] += 1
+        if grade != entry["grade"]:
+            disagreements.append(
+                f"'{entry['transcript']}' for '{grader.answer}': manual {entry['grade']}, automatic {grade} (score {score:.2f})")
+    agreement = sum(confusion[(grade, grade)] for grade in grades)
+    within_one = sum(count for (manual, automatic), count in confusion.items()
+                     if manual in grades and automatic in grades and abs(grades.index(manual) - grades.index(automatic)) <= 1)
+    print(f"Spoken answer grading over {len(corpus)} answers ({args.benchmark_corpus})\n")
+    print_latency_summary("Answer indexing (when a card is shown)", indexing_latencies)
+    print_latency_summary("Scoring and grading", scoring_latencies)
+    if len(transcription_latencies) > 0:
+        print_latency_summary("Final transcript (after utterance end)", transcription_latencies)
+    print(f"\nAgreement with manual grades: {100 * agreement / max(len(corpus), 1):.1f}% ({agreement}/{len(corpus)}) | "
+          f"within one grade: {100 * within_one / max(len(corpus), 1):.1f}%")
+    print(f"\n{'manual / automatic':<20}" + "".join(f"{grade:>11}" for grade in grades + ["ungraded"]))
+    for manual in grades:
+        print(f"{manual:<20}" + "".join(f"{confusion[(manual, automatic)]:>11}" for automatic in grades + ["ungraded"]))
+    if len(disagreements) > 0:
+        print("\nDisagreements:")
+        for description in disagreements:
+            print(f"  {description}")
@@ -0,0 +1,199 @@
+"""Local stand-in for the AnkiConnect API, so that anki-voice can be benchmarked (and tested)
+without a running Anki."""
+
+import http.server
+import json
+import random
+import threading
+import time
+
+
+class MockAnkiConnectServer():
+    """Local stand-in for the AnkiConnect API, used to benchmark anki-voice without a running Anki."""
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0, card_count=20, drop_rate=0.0, lost_response_rate=0.0,
+                 next_card_deferred=True):
+        """Constructor for MockAnkiConnectServer. Creates a simulated deck review session that
+        responds to the same GUI actions used by anki-voice.
+
+        Args:
+            host (str, optional): The interface to listen on. Defaults to "127.0.0.1".
+            port (int, optional): The port to listen on (0 selects a free port). Defaults to 0.
+            latency (float, optional): Simulated processing time (in seconds) for each HTTP request. Defaults to 0.0.
+            card_count (int, optional): Number of cards in the simulated deck, which repeats once exhausted. Defaults to 20.
+            drop_rate (float, optional): Fraction of requests dropped before they are processed. Defaults to 0.0.
+            lost_response_rate (float, optional): Fraction of requests processed, but whose response is dropped. Defaults to 0.0.
+            next_card_deferred (bool, optional): Shows the next card only once the request that answered a card has completed, as from Anki 2.1.45 (otherwise it is shown immediately, as in earlier versions). Defaults to True.
+        """
+        self._latency = latency
+        # Simulated outages: while unavailable (or when dropped), connections are closed without a response
+        self.available = True
+        self._drop_rate = drop_rate
+        self._lost_response_rate = lost_response_rate
+        self._random = random.Random(0)
+        self._lock = threading.Lock()
+        self._cards = [{
+            "cardId": 1000 + index,
+            "fields": {
+                "Front": {"value": f"Question {index}", "order": 0},
+                "Back": {"value": f"Answer {index}", "order": 1}
+            },
+            "buttons": [1, 2, 3, 4] if index % 2 == 0 else [1, 2, 3]
+        } for index in range(card_count)]
+        # Card ID -> number of reviews and modification time (last reviewed a day ago)
+        self._card_reviews = {card["cardId"]: {"reps": 1, "mod": int(time.time()) - 86400}
+                              for card in self._cards}
+        self._card_index = 0
+        self._reviewing = True
+        self._answer_shown = False
+        self._next_card_deferred = next_card_deferred
+        # Whether a card has been answered, but the next card not yet shown
+        self._next_card_pending = False
+        # (time, action, params) for every action received, including those within 'multi' requests
+        self.request_log = []
+        # Card ID of every answer applied
+        self.answered_cards = []
+        self._server = http.server.ThreadingHTTPServer(
+            (host, port), self._create_request_handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        """str: The address of the mock AnkiConnect API."""
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        """Starts serving requests in a background thread."""
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stops serving requests and closes the listening socket."""
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _create_request_handler(self):
+        """Creates the HTTP request handler class bound to this mock server.
+
+        Returns:
+            type: A BaseHTTPRequestHandler subclass that dispatches requests to this server.
+        """
+        mock_server = self
+
+        class MockAnkiConnectRequestHandler(http.server.BaseHTTPRequestHandler):
+            # Keep-alive, as with AnkiConnect
+            protocol_version = "HTTP/1.1"
+            # Send headers and body together (avoids delayed ACK stalls on keep-alive connections)
+            wbufsize = -1
+
+            def do_POST(self):
+                body = self.rfile.read(
+                    int(self.headers.get("Content-Length", 0)))
+                if not mock_server.available or mock_server._should_drop(mock_server._drop_rate):
+                    self.close_connection = True
+                    return
+                response = json.dumps(
+                    mock_server.handle_request(json.loads(body))).encode()
+                if mock_server._should_drop(mock_server._lost_response_rate):
+                    self.close_connection = True
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(response)))
+                self.end_headers()
+                self.wfile.write(response)
+
+            do_GET = do_POST
+
+            def log_message(self, format, *args):
+                pass
+
+        return MockAnkiConnectRequestHandler
+
+    def _should_drop(self, rate):
+        """Decides whether to drop a request (or its response).
+
+        Args:
+            rate (float): The fraction of requests to drop.
+
+        Returns:
+            bool: Indicator of whether to drop the request.
+        """
+        with self._lock:
+            return self._random.random() < rate
+
+    def handle_request(self, request):
+        """Handles a single AnkiConnect API request.
+
+        Args:
+            request (dict): The decoded JSON request.
+
+        Returns:
+            dict: The AnkiConnect response, containing 'result' and 'error' members.
+        """
+        if self._latency > 0:
+            time.sleep(self._latency)
+        with self._lock:
+            self._show_next_card()
+            return self._handle_action(request)
+
+    def _show_next_card(self):
+        """Shows the next card, once a card has been answered (and the request answering it has completed)."""
+        if self._next_card_pending:
+            self._card_index = (self._card_index + 1) % len(self._cards)
+            self._next_card_pending = False
+
+    def _handle_action(self, request):
+        """Applies a single action to the simulated review session.
+
+        Args:
+            request (dict): The action, with an 'action' and optional 'params'.
+
+        Returns:
+            dict: The result of the action, containing 'result' and 'error' members.
+        """
+        action = request.get("action")
+        params = request.get("params", {})
+        self.request_log.append((time.perf_counter(), action, params))
+        card = self._cards[self._card_index]
+        if action == "multi":
+            return {"result": [self._handle_action(sub_request) for sub_request in params["actions"]], "error": None}
+        elif action == "version":
+            return {"result": 6, "error": None}
+        elif action == "guiCurrentCard":
+            if not self._reviewing:
+                return {"result": None, "error": None}
+            return {"result": card, "error": None}
+        elif action == "guiShowAnswer":
+            # Until the next card is shown, the reviewer is still showing the answer of the last card
+            if not self._reviewing or self._next_card_pending:
+                return {"result": False, "error": None}
+            self._answer_shown = True
+            return {"result": True, "error": None}
+        elif action == "guiAnswerCard":
+            if not self._reviewing or not self._answer_shown or self._next_card_pending or params.get("ease") not in card["buttons"]:
+                return {"result": False, "error": None}
+            self.answered_cards.append(card["cardId"])
+            self._card_reviews[card["cardId"]] = {
+                "reps": self._card_reviews[card["cardId"]]["reps"] + 1, "mod": int(time.time())}
+            self._answer_shown = False
+            self._next_card_pending = True
+            if not self._next_card_deferred:
+                self._show_next_card()
+            return {"result": True, "error": None}
+        elif action == "cardsInfo":
+            cards = {card["cardId"]: card for card in self._cards}
+            return {"result": [dict(cards[card_id], **self._card_reviews[card_id]) if card_id in cards else {}
+                               for card_id in params["cards"]], "error": None}
+        elif action == "guiDeckOverview":
+            self._show_next_card()
+            self._reviewing = False
+            self._answer_shown = False
+            return {"result": True, "error": None}
+        elif action == "guiDeckReview":
+            self._reviewing = True
+            return {"result": True, "error": None}
+        return {"result": None, "error": f"unsupported action: {action}"}
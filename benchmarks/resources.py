@@ -0,0 +1,262 @@
+"""Benchmarks of startup time, memory, and speech recognition models."""
+
+import contextlib
+import io
+import json
+import os
+from pathlib import Path
+import pyttsx3
+import subprocess
+import sys
+import threading
+import time
+from vosk import Model, KaldiRecognizer, SetLogLevel
+
+import anki_voice
+from anki_voice import (AnkiConnectClient, AnkiSpeechToCommand, AnkiVoiceServer, AudioRingBuffer, CommandMatcher,
+                        MicrophoneAudioSource, WaveFileAudioSource, find_model, installed_models,
+                        model_not_found_reason, print_model_not_found, stream_to_server)
+from benchmarks.common import load_benchmark_corpus, resident_memory
+from benchmarks.mock_anki_connect import MockAnkiConnectServer
+
+
+def benchmark_startup(args):
+    """Breaks down startup time into importing dependencies, loading the speech-to-text model,
+    opening the audio device, checking the AnkiConnect connection, and creating the
+    text-to-speech engine. Also compares the time until audio is captured when these are done in
+    sequence, against loading the model in the background.
+
+    Args:
+        args (argparse.Namespace): Parsed command line arguments.
+    """
+    print("Startup time breakdown\n")
+    # Imports are measured in a fresh interpreter, as they have already been imported in this one
+    for module in ["numpy", "pyaudio", "pyttsx3", "requests", "vosk"]:
+        result = subprocess.run([sys.executable, "-c", "import time; started = time.perf_counter(); "
+                                 f"import {module}; print(time.perf_counter() - started)"], capture_output=True, text=True)
+        if result.returncode == 0:
+            print(
+                f"{'Import ' + module:<40} {1000 * float(result.stdout):8.1f} ms")
+        else:
+            print(f"{'Import ' + module:<40} failed")
+    timings = {}
+
+    def measure(description, function):
+        started = time.perf_counter()
+        try:
+            function()
+        except Exception as ex:
+            print(f"{description:<40} failed: {ex}")
+            return
+        timings[description] = time.perf_counter() - started
+        print(f"{description:<40} {1000 * timings[description]:8.1f} ms")
+
+    def open_audio_device():
+        audio_source = MicrophoneAudioSource()
+        audio_source.start(AudioRingBuffer(16000 * 2))
+        audio_source.stop()
+
+    SetLogLevel(-10)
+    measure("Load speech recognition model",
+            lambda: Model(find_model(args.model) or args.model))
+    measure("Open audio device", open_audio_device)
+    anki_connect_client = AnkiConnectClient(url=args.ankiconnect_url,
+                                            connect_timeout=args.ankiconnect_connect_timeout,
+                                            read_timeout=args.ankiconnect_read_timeout,
+                                            retries=args.ankiconnect_retries)
+    measure("Check AnkiConnect connection",
+            anki_connect_client.check_connection)
+    measure("Create text-to-speech engine", pyttsx3.init)
+    print(
+        f"\n{'Time until audio capture (sequential)':<40} {1000 * sum(timings.values()):8.1f} ms")
+    # Model loaded in the background, while audio capture starts
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            started = time.perf_counter()
+            control = AnkiSpeechToCommand(command_config=args.command_config, alert_sound_enabled=False,
+                                          anki_connect_client=anki_connect_client, full_vocabulary=args.full_vocabulary,
+                                          model=args.model)
+            control.run()
+            capture_started = time.perf_counter() - started
+            control.wait_until_ready()
+            ready = time.perf_counter() - started
+    except Exception as ex:
+        print(f"{'Time until audio capture (background)':<40} failed: {ex}")
+        return
+    print(f"{'Time until audio capture (background)':<40} {1000 * capture_started:8.1f} ms")
+    print(f"{'Time until model ready (background)':<40} {1000 * ready:8.1f} ms")
+    print("\nNote: the model is loaded twice, so the second load may benefit from operating system file caching.")
+
+
+def benchmark_server(args):
+    """Benchmarks server mode as the number of concurrent sessions grows: each session streams
+    a corpus of recorded commands (as fast as possible) to its own mock AnkiConnect server.
+    Reports throughput, command accuracy, and peak resident memory against the memory one model
+    per session would require.
+
+    Args:
+        args (argparse.Namespace): Parsed command line arguments.
+    """
+    corpus = [entry for entry in load_benchmark_corpus(
+        args.benchmark_corpus) if "audio" in entry]
+    session_counts = [int(count) for count in args.benchmark_sessions.split(",")]
+    baseline_memory, _ = resident_memory()
+    with contextlib.redirect_stdout(io.StringIO()):
+        server = AnkiVoiceServer(command_config=args.command_config, port=0, workers=args.server_workers,
+                                 full_vocabulary=args.full_vocabulary, vad_enabled=args.vad_disabled,
+                                 vad_threshold=args.vad_threshold, model=args.model)
+    model_memory, _ = resident_memory()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"Server mode with {args.server_workers or os.cpu_count()} decoding workers, "
+          f"{len(corpus)} utterances per session\n")
+    if baseline_memory is not None and model_memory is not None:
+        print(f"Memory used by the loaded model: {(model_memory - baseline_memory) / 2**20:.1f} MB\n")
+    for session_count in session_counts:
+        mock_servers = [MockAnkiConnectServer(
+            latency=args.benchmark_server_latency / 1000) for _ in range(session_count)]
+        audio_sources = [WaveFileAudioSource(
+            [entry["audio"] for entry in corpus], realtime=False) for _ in range(session_count)]
+        results = [None] * session_count
+        for mock_server in mock_servers:
+            mock_server.start()
+
+        def run_session(index):
+            results[index] = stream_to_server(server.address, audio_sources[index], f"session-{index}",
+                                              mock_servers[index].url, on_event=lambda event: None)
+
+        peak_memory = [0]
+        finished = threading.Event()
+
+        def sample_memory():
+            while not finished.wait(0.05):
+                current_memory, _ = resident_memory()
+                peak_memory[0] = max(peak_memory[0], current_memory or 0)
+
+        sampler = threading.Thread(target=sample_memory, daemon=True)
+        sampler.start()
+        sessions = [threading.Thread(target=run_session, args=(index,))
+                    for index in range(session_count)]
+        with contextlib.redirect_stdout(io.StringIO()):
+            started = time.perf_counter()
+            for session in sessions:
+                session.start()
+            for session in sessions:
+                session.join()
+            elapsed = time.perf_counter() - started
+        finished.set()
+        sampler.join()
+        for mock_server in mock_servers:
+            mock_server.stop()
+        # Commands are detected in order, so are compared against the corpus in sequence
+        expected = [entry.get("command") for entry in corpus]
+        correct = sum(sum(1 for detected, command in zip([event["command"] for event in events], expected)
+                          if detected == command) for events in results)
+        audio_duration = sum(audio_source.duration for audio_source in audio_sources)
+        memory = f"peak RSS {peak_memory[0] / 2**20:7.1f} MB" if peak_memory[0] > 0 else "peak RSS unavailable"
+        if peak_memory[0] > 0 and baseline_memory is not None and model_memory is not None:
+            memory += f" (one model per session: ~{(baseline_memory + session_count * (model_memory - baseline_memory)) / 2**20:7.1f} MB)"
+        print(f"{session_count:3} sessions: {audio_duration / elapsed:7.2f}x real-time (aggregate) | "
+              f"{elapsed:6.2f} s | accuracy {100 * correct / max(session_count * len(corpus), 1):5.1f}% | {memory}")
+    server.shutdown()
+
+
+def profile_model(args):
+    """Profiles one speech recognition model: the time to load it, the resident memory it uses,
+    and the speed and accuracy of decoding the corpus of recorded commands against the command
+    grammar. Run in a fresh process by the models benchmark, so that peak resident memory is only
+    that of this model. Prints the results as a JSON line.
+
+    Args:
+        args (argparse.Namespace): Parsed command line arguments.
+    """
+    with open(args.command_config) as command_config_raw:
+        matcher = CommandMatcher(json.load(command_config_raw))
+    corpus = [entry for entry in load_benchmark_corpus(
+        args.benchmark_corpus) if "audio" in entry]
+    audio = [WaveFileAudioSource._load_audio(entry["audio"]) for entry in corpus]
+    baseline_memory, _ = resident_memory()
+    SetLogLevel(-10)
+    started = time.perf_counter()
+    model = Model(args.profile_model)
+    load_time = time.perf_counter() - started
+    model_memory, _ = resident_memory()
+    grammar = json.dumps(matcher.phrases + ["[unk]"])
+    chunk_bytes = 32 * args.chunk_ms
+    correct = 0
+    decode_time = 0
+    for entry, entry_audio in zip(corpus, audio):
+        started = time.perf_counter()
+        recogniser = KaldiRecognizer(model, 16000, grammar)
+        texts = []
+        for offset in range(0, len(entry_audio), chunk_bytes):
+            if recogniser.AcceptWaveform(entry_audio[offset:offset + chunk_bytes]):
+                texts.append(json.loads(recogniser.Result()).get("text", ""))
+        texts.append(json.loads(recogniser.FinalResult()).get("text", ""))
+        decode_time += time.perf_counter() - started
+        detected = next((command for command, _ in map(matcher.identify, texts)
+                         if command is not None), None)
+        correct += detected == entry.get("command")
+    _, peak_memory = resident_memory()
+    audio_time = sum(len(entry_audio) for entry_audio in audio) / 32000
+    print(json.dumps({
+        "load_time": load_time,
+        "model_memory": model_memory - baseline_memory if model_memory is not None else None,
+        "peak_memory": peak_memory,
+        "real_time_factor": audio_time / decode_time if decode_time > 0 else None,
+        "accuracy": correct / len(corpus) if corpus else None
+    }))
+
+
+def benchmark_models(args):
+    """Benchmarks the installed speech recognition models (or those selected), to choose a model
+    for the hardware: the time to load each model, the resident memory it uses (and the peak
+    while decoding), how many times faster than real-time it decodes the corpus of recorded
+    commands against the command grammar, and its command accuracy. Each model is profiled in a
+    fresh process, so that memory is not shared between models.
+
+    Args:
+        args (argparse.Namespace): Parsed command line arguments.
+    """
+    if args.benchmark_models is not None:
+        models = []
+        for model in args.benchmark_models.split(","):
+            model_path = find_model(model)
+            if model_path is None:
+                print(f"{model_not_found_reason(model)} (skipped).")
+            else:
+                models.append(model_path)
+    else:
+        models = installed_models()
+    if len(models) == 0:
+        print_model_not_found(args.benchmark_models or args.model)
+        return
+    utterances = len([entry for entry in load_benchmark_corpus(
+        args.benchmark_corpus) if "audio" in entry])
+    print(f"Speech recognition models ({utterances} recorded commands, {args.chunk_ms} ms chunks)\n")
+    print(f"{'Model':<36} {'Load':>8} {'Memory':>10} {'Peak':>10} {'Speed':>10} {'Accuracy':>9}")
+
+    def format_memory(memory):
+        return f"{memory / 2**20:7.0f} MB" if memory is not None else f"{'-':>10}"
+
+    profiles = []
+    for model_path in models:
+        result = subprocess.run([sys.executable, str(Path(anki_voice.__file__).resolve()), "--profile_model", model_path,
+                                 "--benchmark_corpus", args.benchmark_corpus, "-c", args.command_config,
+                                 "--chunk_ms", str(args.chunk_ms)],
+                                capture_output=True, text=True)
+        try:
+            profile = json.loads(result.stdout.strip().splitlines()[-1])
+        except (IndexError, ValueError):
+            error = result.stderr.strip().splitlines()
+            print(f"{Path(model_path).name:<36} failed: {error[-1] if error else result.returncode}")
+            continue
+        speed = f"{profile['real_time_factor']:8.1f}x" if profile["real_time_factor"] is not None else f"{'-':>9}"
+        accuracy = f"{100 * profile['accuracy']:8.1f}%" if profile["accuracy"] is not None else f"{'-':>9}"
+        print(f"{Path(model_path).name:<36} {profile['load_time']:7.2f}s {format_memory(profile['model_memory'])} "
+              f"{format_memory(profile['peak_memory'])} {speed:>10} {accuracy}")
+        profiles.append((model_path, profile))
+    if len(profiles) == 0:
+        return
+    # Suggests the most accurate model, and the smallest of those
+    model_path, _ = max(profiles, key=lambda item: (item[1]["accuracy"] or 0, -(item[1]["peak_memory"] or 0)))
+    print(f"\nSelect a model with --model (e.g., --model {Path(model_path).name}).")
@@ -0,0 +1,78 @@
+import importlib
+import json
+import os
+from pathlib import Path
+import sys
+import types
+
+import pytest
+
+
+@pytest.fixture(scope="session")
+def anki_voice(tmp_path_factory):
+    """The anki-voice script, loaded as a module (skipped where its dependencies are not installed).
+    The audio libraries are only used for audio devices, which the tests do not open, so empty
+    modules stand in for them where they are not installed."""
+    for dependency in ["numpy", "requests", "vosk"]:
+        pytest.importorskip(dependency)
+    for audio_dependency in ["pyaudio", "pyttsx3"]:
+        try:
+            importlib.import_module(audio_dependency)
+        except ImportError:
+            sys.modules[audio_dependency] = types.ModuleType(audio_dependency)
+    # The log file is created in the working directory when the script is loaded
+    working_directory = os.getcwd()
+    os.chdir(tmp_path_factory.mktemp("logs"))
+    try:
+        from benchmarks import load_anki_voice
+        return load_anki_voice()
+    finally:
+        os.chdir(working_directory)
+
+
+@pytest.fixture(scope="session")
+def command_config_json():
+    """The default command configuration."""
+    with open(Path(__file__).resolve().parent.parent / "commands.json") as command_config_raw:
+        return json.load(command_config_raw)
+
+
+class RecordingRecogniser():
+    """A recogniser that records the audio it is given (and recognises nothing)."""
+
+    def __init__(self, model, rate, grammar=None):
+        self.grammar = grammar
+        self.audio = bytearray()
+
+    def SetWords(self, enabled):
+        pass
+
+    def AcceptWaveform(self, data):
+        self.audio += bytes(data)
+        return False
+
+    def PartialResult(self):
+        return '{"partial": ""}'
+
+    def Result(self):
+        return '{"text": ""}'
+
+    def FinalResult(self):
+        return '{"text": ""}'
+
+
+@pytest.fixture
+def speech_to_command(anki_voice, monkeypatch, tmp_path):
+    """Creates an AnkiSpeechToCommand (with the default command configuration) whose model and
+    recognisers are replaced by a RecordingRecogniser, once its model is ready."""
+    monkeypatch.setattr(anki_voice, "Model", lambda path: None)
+    monkeypatch.setattr(anki_voice, "KaldiRecognizer", RecordingRecogniser)
+    monkeypatch.setattr(anki_voice, "log_missing_vocabulary", lambda model, matcher: None)
+
+    def create(command_config=str(Path(__file__).resolve().parent.parent / "commands.json"), **kwargs):
+        control = anki_voice.AnkiSpeechToCommand(
+            command_config=command_config, alert_sound_enabled=False, model=str(tmp_path), **kwargs)
+        assert control.wait_until_ready()
+        return control
+
+    return create
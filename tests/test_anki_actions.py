@@ -0,0 +1,170 @@
+import json
+
+import pytest
+
+
+@pytest.fixture
+def mock_server(anki_voice):
+    from benchmarks import MockAnkiConnectServer
+    servers = []
+
+    def start(**kwargs):
+        server = MockAnkiConnectServer(**kwargs)
+        server.start()
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.stop()
+
+
+def create_handler(anki_voice, server, journal=None):
+    client = anki_voice.AnkiConnectClient(url=server.url, connect_timeout=0.5, read_timeout=1.0, retries=0)
+    handler = anki_voice.AnkiActionHandler(alert_sound_enabled=False, anki_connect_client=client, journal=journal)
+    assert handler.get_current_card_information() == "executed"
+    return handler
+
+
+@pytest.mark.parametrize("next_card_deferred", [False, True])
+def test_answer_tracks_next_card(anki_voice, mock_server, next_card_deferred):
+    server = mock_server(next_card_deferred=next_card_deferred)
+    handler = create_handler(anki_voice, server)
+    for card_id in [1000, 1001, 1002]:
+        assert handler._card_id == card_id
+        assert handler.show() == "executed"
+        assert handler.good() == "executed"
+    assert server.answered_cards == [1000, 1001, 1002]
+    assert handler._card_id == 1003
+    assert handler._card_question == "Question 3"
+
+
+@pytest.mark.parametrize("next_card_deferred", [False, True])
+def test_chained_commands_answer_several_cards(anki_voice, mock_server, next_card_deferred):
+    server = mock_server(next_card_deferred=next_card_deferred)
+    handler = create_handler(anki_voice, server)
+    assert handler.execute_sequence(["show", "good", "show", "easy"]) == "executed"
+    # Card 1001 has three buttons, so 'easy' is its third
+    assert server.answered_cards == [1000, 1001]
+    assert [params["ease"] for _, action, params in server.request_log if action == "guiAnswerCard"] == [3, 3]
+    assert handler._card_id == 1002
+    assert handler._current_state == anki_voice.AnkiStates.QUESTION
+
+
+def test_chained_commands_reject_invalid_sequence(anki_voice, mock_server):
+    server = mock_server()
+    handler = create_handler(anki_voice, server)
+    assert handler.execute_sequence(["good", "show"]) == "rejected"
+    assert handler.execute_sequence(["show", "show"]) == "rejected"
+    assert server.answered_cards == []
+    assert not any(action == "guiShowAnswer" for _, action, _ in server.request_log)
+
+
+def read_journal(path):
+    with open(path) as journal_file:
+        return [json.loads(line) for line in journal_file if line.strip()]
+
+
+def answer_during_outage(server, handler):
+    assert handler.show() == "executed"
+    server.available = False
+    assert handler.good() == "journaled"
+    server.available = True
+
+
+def test_journaled_answer_kept_until_reviewing(anki_voice, mock_server, tmp_path):
+    server = mock_server()
+    journal = anki_voice.AnswerJournal(str(tmp_path / "journal.jsonl"))
+    handler = create_handler(anki_voice, server, journal)
+    answer_during_outage(server, handler)
+    # Anki restarted, and shows the deck list
+    server._reviewing = False
+    assert not handler.flush_journal()
+    assert len(journal.pending()) == 1
+    server._reviewing = True
+    assert handler.flush_journal()
+    assert server.answered_cards == [1000]
+    assert handler._card_id == 1001
+    journal.close()
+    assert read_journal(tmp_path / "journal.jsonl")[-1] == {"sequence": 1, "status": "applied"}
+
+
+def test_journaled_answer_not_applied_twice_when_card_shown_again(anki_voice, mock_server, tmp_path):
+    # A single card deck, so the answered card is shown again
+    server = mock_server(card_count=1)
+    journal = anki_voice.AnswerJournal(str(tmp_path / "journal.jsonl"))
+    handler = create_handler(anki_voice, server, journal)
+    assert handler.show() == "executed"
+    # The answer is applied, but its response is lost
+    server._lost_response_rate = 1.0
+    assert handler.good() == "journaled"
+    server._lost_response_rate = 0.0
+    assert handler.flush_journal()
+    assert server.answered_cards == [1000]
+    journal.close()
+    assert read_journal(tmp_path / "journal.jsonl")[-1] == {"sequence": 1, "status": "applied"}
+
+
+def test_journaled_answer_skipped_once_another_card_shown(anki_voice, mock_server, tmp_path):
+    server = mock_server()
+    journal = anki_voice.AnswerJournal(str(tmp_path / "journal.jsonl"))
+    handler = create_handler(anki_voice, server, journal)
+    answer_during_outage(server, handler)
+    # The card was answered in Anki directly
+    server._card_index = 1
+    assert handler.flush_journal()
+    assert server.answered_cards == []
+    assert handler._card_id == 1001
+    journal.close()
+    assert read_journal(tmp_path / "journal.jsonl")[-1] == {"sequence": 1, "status": "skipped"}
+
+
+def test_card_answer_indexed_for_grading(anki_voice):
+    handler = anki_voice.AnkiActionHandler(alert_sound_enabled=False, answer_grading=True)
+    card_information = {"cardId": 1, "buttons": [1, 2, 3, 4], "fields": {
+        "Front": {"value": "Which hormone stimulates growth?", "order": 0},
+        "Back": {"value": "Growth hormone (GH)", "order": 1}}}
+    assert handler._update_card_information(card_information)
+    assert handler._answer_grader is not None
+
+
+def create_grading_handler(anki_voice, server):
+    client = anki_voice.AnkiConnectClient(url=server.url, connect_timeout=0.5, read_timeout=1.0, retries=0)
+    handler = anki_voice.AnkiActionHandler(alert_sound_enabled=False, anki_connect_client=client, answer_grading=True)
+    assert handler.get_current_card_information() == "executed"
+    return handler
+
+
+def test_filler_speech_is_not_graded(anki_voice, mock_server):
+    server = mock_server()
+    handler = create_grading_handler(anki_voice, server)
+    for transcript in ["hmm", "sorry", "next", "no idea", "hold on let me think"]:
+        assert handler.grade_spoken_answer(transcript, confidence=0.95) == ("no_answer", None, 0.0)
+    # A low confidence transcript is not graded, even if it matches the answer
+    assert handler.grade_spoken_answer("answer zero", confidence=0.3) == ("no_answer", None, None)
+    assert server.answered_cards == []
+    assert handler._card_id == 1000
+
+
+def test_spoken_answer_is_graded(anki_voice, mock_server):
+    server = mock_server()
+    handler = create_grading_handler(anki_voice, server)
+    outcome, grade, score = handler.grade_spoken_answer("answer 0", confidence=0.95)
+    assert (outcome, grade, score) == ("executed", "easy", 1.0)
+    assert server.answered_cards == [1000]
+
+
+def test_unreachable_anki_connect_logged_once_per_outage(anki_voice, mock_server, caplog):
+    server = mock_server()
+    client = anki_voice.AnkiConnectClient(url=server.url, connect_timeout=0.5, read_timeout=1.0, retries=1,
+                                          backoff_factor=0)
+    server.available = False
+    for _ in range(3):
+        assert not client.check_connection()
+    assert [record.levelname for record in caplog.records] == ["ERROR"]
+    server.available = True
+    assert client.check_connection()
+    assert "can be reached again" in caplog.records[-1].getMessage()
+    server.available = False
+    assert not client.check_connection()
+    assert [record.levelname for record in caplog.records] == ["ERROR", "WARNING", "ERROR"]
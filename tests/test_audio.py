@@ -0,0 +1,143 @@
+import threading
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+
+def test_ring_buffer_reads_in_order_across_wraparound(anki_voice):
+    buffer = anki_voice.AudioRingBuffer(8)
+    buffer.write(b"abcdef")
+    assert buffer.read(4) == b"abcd"
+    buffer.write(b"ghijk")
+    assert buffer.available == 7
+    assert buffer.read(7) == b"efghijk"
+
+
+def test_ring_buffer_discards_oldest_audio_when_full(anki_voice):
+    buffer = anki_voice.AudioRingBuffer(4)
+    buffer.write(b"abc")
+    buffer.write(b"def")
+    assert buffer.read(4) == b"cdef"
+    assert buffer.overflow_bytes == 2
+    assert buffer.overflow_count == 1
+    buffer.write(b"0123456789")
+    assert buffer.read(4) == b"6789"
+    assert buffer.written_bytes == 16
+
+
+def test_ring_buffer_accepts_numpy_arrays(anki_voice):
+    buffer = anki_voice.AudioRingBuffer(16)
+    samples = np.array([1, -2, 300], dtype=np.int16)
+    buffer.write(samples)
+    assert buffer.read(6) == samples.tobytes()
+
+
+def test_ring_buffer_close_releases_reader(anki_voice):
+    buffer = anki_voice.AudioRingBuffer(8)
+    buffer.write(b"ab")
+    results = []
+    reader = threading.Thread(target=lambda: results.append(buffer.read(4)))
+    reader.start()
+    buffer.close()
+    reader.join(timeout=1)
+    assert results == [b"ab"]
+    assert buffer.read(4) == b""
+
+
+def test_ring_buffer_blocking_write_waits_for_space(anki_voice):
+    buffer = anki_voice.AudioRingBuffer(4)
+    buffer.write(b"abcd")
+    writer = threading.Thread(target=lambda: buffer.write(b"ef", block=True))
+    writer.start()
+    writer.join(timeout=0.1)
+    assert writer.is_alive()
+    assert buffer.read(2) == b"ab"
+    writer.join(timeout=1)
+    assert buffer.read(4) == b"cdef"
+    assert buffer.overflow_bytes == 0
+
+
+def tone(rate, frequency, seconds=1.0):
+    time_points = np.arange(int(rate * seconds)) / rate
+    return (8000 * np.sin(2 * np.pi * frequency * time_points)).astype(np.int16)
+
+
+def dominant_frequency(samples, rate):
+    spectrum = np.abs(np.fft.rfft(samples * np.hanning(len(samples))))
+    return np.argmax(spectrum) * rate / len(samples)
+
+
+def test_resampler_passes_through_at_output_rate(anki_voice):
+    samples = tone(16000, 440, 0.1)
+    resampler = anki_voice.PolyphaseResampler(16000)
+    assert np.array_equal(resampler.process(samples.tobytes()), samples)
+
+
+def test_resampler_preserves_frequency_and_duration(anki_voice):
+    for rate in [44100, 48000]:
+        output = anki_voice.PolyphaseResampler(rate).process(tone(rate, 440).tobytes())
+        assert abs(len(output) - 16000) <= 1
+        assert abs(dominant_frequency(output, 16000) - 440) < 2
+
+
+def test_resampler_removes_frequencies_above_output_nyquist(anki_voice):
+    output = anki_voice.PolyphaseResampler(48000).process(tone(48000, 12000).tobytes())
+    assert np.sqrt(np.mean(np.square(output[100:], dtype=np.float64))) < 100
+
+
+def test_resampler_is_continuous_across_blocks(anki_voice):
+    # Rates with more phases than filter taps (44.1kHz), one phase (48kHz), and a few phases (8kHz)
+    for rate in [44100, 48000, 8000]:
+        audio = tone(rate, 440).tobytes()
+        whole = anki_voice.PolyphaseResampler(rate).process(audio)
+        resampler = anki_voice.PolyphaseResampler(rate)
+        # Odd block sizes, so that blocks do not align with the resampling ratio
+        block_bytes = 2 * 1237
+        blocks = np.concatenate([resampler.process(audio[offset:offset + block_bytes])
+                                 for offset in range(0, len(audio), block_bytes)])
+        assert np.array_equal(blocks, whole)
+
+
+def test_resampler_upsamples_lower_rates(anki_voice):
+    output = anki_voice.PolyphaseResampler(8000).process(tone(8000, 440).tobytes())
+    assert len(output) == 16000
+    assert abs(dominant_frequency(output, 16000) - 440) < 2
+
+
+def chunk(amplitude, frequency=200, samples=2048):
+    time_points = np.arange(samples) / 16000
+    return (amplitude * np.sin(2 * np.pi * frequency * time_points)).astype(np.int16).tobytes()
+
+
+def test_voice_activity_gate_holds_back_preroll(anki_voice):
+    gate = anki_voice.VoiceActivityGate(rms_threshold=300, hangover_chunks=2, preroll_chunks=2)
+    silence = [chunk(0) + bytes([index]) * 2 for index in range(3)]
+    for silent_chunk in silence:
+        assert gate.process(silent_chunk) == ([], False)
+    speech = chunk(4000)
+    # Only the most recent chunks before voice activity are passed on with it
+    assert gate.process(speech) == (silence[1:] + [speech], False)
+    assert gate.process(speech) == ([speech], False)
+
+
+def test_voice_activity_gate_hangover_and_end_of_utterance(anki_voice):
+    gate = anki_voice.VoiceActivityGate(rms_threshold=300, hangover_chunks=2, preroll_chunks=1)
+    silence = chunk(0)
+    gate.process(chunk(4000))
+    assert not gate.in_hangover
+    for _ in range(2):
+        assert gate.process(silence) == ([silence], False)
+        assert gate.in_hangover
+    # The end of the utterance is signalled once, after the hangover
+    assert gate.process(silence) == ([], True)
+    assert gate.process(silence) == ([], False)
+    assert gate.total_chunks == 5
+
+
+def test_voice_activity_gate_detects_quiet_fricatives(anki_voice):
+    gate = anki_voice.VoiceActivityGate(rms_threshold=300)
+    # Quieter than the threshold, but with a high zero-crossing rate (e.g., 's' sounds)
+    assert gate.is_voice_activity(chunk(300, frequency=5000))
+    assert not gate.is_voice_activity(chunk(300, frequency=200))
+    assert not gate.is_voice_activity(b"")
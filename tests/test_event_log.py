@@ -0,0 +1,35 @@
+def test_event_log_loaded_in_order_across_rotated_files(anki_voice, tmp_path):
+    path = tmp_path / "events.jsonl"
+    event_log = anki_voice.EventLog()
+    # Small enough that each event is rotated into its own file, with more than 10 rotated files kept
+    event_log.open(str(path), max_bytes=1, backup_count=20)
+    for index in range(15):
+        event_log.record("utterance", event_time=float(index), text=f"event {index}")
+    event_log.close()
+    assert (tmp_path / "events.jsonl.12").exists()
+    (tmp_path / "events.jsonl.bak").write_text('{"event": "backup"}\n')
+    events = anki_voice.load_event_log(str(path))
+    assert [event["event"] for event in events] == ["session_start"] + ["utterance"] * 15 + ["session_end"]
+    assert [event["text"] for event in events[1:-1]] == [f"event {index}" for index in range(15)]
+
+
+def test_event_log_rotation_discards_oldest_files(anki_voice, tmp_path):
+    path = tmp_path / "events.jsonl"
+    event_log = anki_voice.EventLog()
+    event_log.open(str(path), max_bytes=1, backup_count=3)
+    for index in range(10):
+        event_log.record("utterance", event_time=float(index), text=f"event {index}")
+    event_log.close()
+    # The most recent events are kept, in the order they were recorded
+    events = anki_voice.load_event_log(str(path))
+    assert [event.get("text", event["event"]) for event in events] == [
+        "event 7", "event 8", "event 9", "session_end"]
+
+
+def test_event_log_skips_partially_written_line(anki_voice, tmp_path):
+    path = tmp_path / "events.jsonl"
+    (tmp_path / "events.jsonl.1").write_text('{"event": "session_start"}\n{"event": "utterance"}\n')
+    path.write_text('{"event": "utterance", "text": "good"}\n{"event": "utter')
+    events = anki_voice.load_event_log(str(path))
+    assert [event["event"] for event in events] == ["session_start", "utterance", "utterance"]
+    assert events[-1]["text"] == "good"
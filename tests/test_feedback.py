@@ -0,0 +1,159 @@
+import pytest
+
+
+class FakeEngine():
+    """A text-to-speech engine that can not synthesise to a file (so phrases are spoken directly)."""
+
+    def __init__(self, speaking_states):
+        self._speaking_states = speaking_states
+
+    def save_to_file(self, text, path):
+        raise RuntimeError("synthesis failed")
+
+    def say(self, text):
+        pass
+
+    def runAndWait(self):
+        self._speaking_states.append(self.speaking.is_set())
+
+
+class FakeStream():
+    def __init__(self, speaking, speaking_states):
+        self._speaking = speaking
+        self._speaking_states = speaking_states
+
+    def write(self, frames):
+        self._speaking_states.append(self._speaking.is_set())
+
+    def get_output_latency(self):
+        return 0.0
+
+    def close(self):
+        pass
+
+
+class FakePyAudio():
+    def __init__(self, speaking, speaking_states):
+        self._speaking = speaking
+        self._speaking_states = speaking_states
+
+    def open(self, **kwargs):
+        return FakeStream(self._speaking, self._speaking_states)
+
+    def get_format_from_width(self, width):
+        return width
+
+    def terminate(self):
+        pass
+
+
+@pytest.fixture
+def feedback(anki_voice, monkeypatch):
+    speaking_states = []
+    engine = FakeEngine(speaking_states)
+    engine.speaking = anki_voice.audio_feedback_speaking
+    monkeypatch.setattr(anki_voice, "pyttsx3", type("pyttsx3", (), {"init": staticmethod(lambda: engine)}))
+    monkeypatch.setattr(anki_voice, "pyaudio", type("pyaudio", (), {
+        "PyAudio": staticmethod(lambda: FakePyAudio(anki_voice.audio_feedback_speaking, speaking_states))}))
+    cache = anki_voice.AudioFeedbackCache()
+    yield cache, speaking_states
+    cache.close()
+
+
+def test_least_recently_used_phrases_are_evicted(anki_voice, feedback):
+    cache = anki_voice.AudioFeedbackCache(max_cached_phrases=3, max_cached_bytes=10)
+    synthesised = []
+    cache._synthesise = lambda text: synthesised.append(text) or (text.encode(), 2, 1, 16000)
+    cache.prerender(["Success: Paused."])
+    for text in ["a", "b", "c", "a"]:
+        cache.prefetch(text)
+    # Over the phrase limit, the least recently used phrase is evicted
+    cache.prefetch("d")
+    assert list(cache._cached_phrases) == ["c", "a", "d"]
+    cache.prefetch("e" * 8)
+    assert list(cache._cached_phrases) == ["a", "d", "e" * 8]
+    # Over the size limit, phrases are evicted until the cache fits
+    cache.prefetch("f" * 4)
+    assert list(cache._cached_phrases) == ["f" * 4]
+    assert cache._cached_bytes == 4
+    # The newest phrase is kept, even if it does not fit
+    cache.prefetch("g" * 20)
+    assert list(cache._cached_phrases) == ["g" * 20]
+    # Fixed phrases are never evicted, and evicted phrases are synthesised again
+    assert list(cache._fixed_phrases) == ["Success: Paused."]
+    cache.prefetch("a")
+    assert synthesised == ["Success: Paused.", "a", "b", "c", "d", "e" * 8, "f" * 4, "g" * 20, "a"]
+    cache.close()
+
+
+def test_speaking_is_flagged_while_playing(anki_voice, feedback):
+    cache, speaking_states = feedback
+    cache._fixed_phrases["Success: Paused."] = (b"\0\0" * 16, 2, 1, 16000)
+    cache.speak("Success: Paused.")
+    assert speaking_states == [True]
+    assert not anki_voice.audio_feedback_speaking.is_set()
+
+
+def test_speaking_is_flagged_when_spoken_through_the_engine(anki_voice, feedback):
+    cache, speaking_states = feedback
+    cache.speak("The question of a card")
+    assert speaking_states == [True]
+    assert not anki_voice.audio_feedback_speaking.is_set()
+
+
+def test_audio_captured_while_speaking_is_muted(anki_voice, speech_to_command, tmp_path):
+    recording = tmp_path / "loud.raw"
+    recording.write_bytes(b"\xff\x7f" * 16000)
+    audio_source = anki_voice.WaveFileAudioSource([str(recording)], realtime=False, trailing_silence=0.0)
+    control = speech_to_command(audio_source=audio_source, vad_enabled=False)
+    anki_voice.audio_feedback_speaking.set()
+    try:
+        control.run()
+        control.join()
+    finally:
+        anki_voice.audio_feedback_speaking.clear()
+    assert control._recogniser.audio == bytes(2 * 16000)
+    assert control.pipeline_statistics()["feedback_muted_bytes"] == 2 * 16000
+
+
+def test_audio_is_muted_when_captured_not_when_decoded(anki_voice, tmp_path):
+    recording = tmp_path / "loud.raw"
+    recording.write_bytes(b"\xff\x7f" * 4096)
+    # Audio captured while speaking is muted, even once speaking has finished
+    audio_source = anki_voice.WaveFileAudioSource([str(recording)], realtime=False, trailing_silence=0.0)
+    audio_buffer = anki_voice.AudioRingBuffer(2 * 16000)
+    anki_voice.audio_feedback_speaking.set()
+    try:
+        audio_source.start(audio_buffer)
+        audio_source._thread.join(timeout=5)
+    finally:
+        anki_voice.audio_feedback_speaking.clear()
+    assert audio_buffer.read(2 * 4096) == bytes(2 * 4096)
+    assert audio_source.muted_bytes == 2 * 4096
+    # Audio captured before speaking started is kept, even if it is read while speaking
+    audio_source = anki_voice.WaveFileAudioSource([str(recording)], realtime=False, trailing_silence=0.0)
+    audio_buffer = anki_voice.AudioRingBuffer(2 * 16000)
+    audio_source.start(audio_buffer)
+    audio_source._thread.join(timeout=5)
+    anki_voice.audio_feedback_speaking.set()
+    try:
+        assert audio_buffer.read(2 * 4096) == b"\xff\x7f" * 4096
+    finally:
+        anki_voice.audio_feedback_speaking.clear()
+    assert audio_source.muted_bytes == 0
+
+
+@pytest.mark.parametrize("field, speech", [
+    ("The capital of France is {{c1::Paris::city}}", "The capital of France is Paris"),
+    ("{{c1::Paris}} and {{c2::Berlin}}", "Paris and Berlin"),
+    ("Bonjour[sound:bonjour.mp3]", "Bonjour"),
+    ("[sound:bonjour.mp3]", ""),
+    ("Hello&nbsp;world", "Hello world"),
+    ('<img src="map.png">', ""),
+    ('<div><img src="map.png"></div><br>', ""),
+    ("<div>First line</div><div>Second line</div>", "First line. Second line"),
+    ("<b>Paris</b><style>b {color: red}</style>", "Paris"),
+    (None, ""),
+])
+def test_card_field_to_speech(anki_voice, field, speech):
+    assert anki_voice.card_field_to_speech(field) == speech
@@ -0,0 +1,47 @@
+import json
+
+
+def test_journal_recovers_unresolved_answers(anki_voice, tmp_path):
+    path = tmp_path / "journal.jsonl"
+    journal = anki_voice.AnswerJournal(str(path))
+    first = journal.append(1000, 3, "good")
+    second = journal.append(1001, 4, "easy")
+    journal.resolve(first, "applied")
+    journal.close()
+    journal = anki_voice.AnswerJournal(str(path))
+    assert [entry["sequence"] for entry in journal.pending()] == [second]
+    assert journal.pending()[0]["card_id"] == 1001
+    # Sequence numbers continue from the previous session
+    assert journal.append(1002, 1, "again") == second + 1
+    journal.close()
+
+
+def test_journal_ignores_partially_written_line(anki_voice, tmp_path):
+    path = tmp_path / "journal.jsonl"
+    journal = anki_voice.AnswerJournal(str(path))
+    journal.append(1000, 3, "good")
+    journal.close()
+    with open(path, "a") as journal_file:
+        journal_file.write('{"sequence": 2, "card_')
+    journal = anki_voice.AnswerJournal(str(path))
+    assert [entry["sequence"] for entry in journal.pending()] == [1]
+    journal.append(1001, 3, "good")
+    journal.close()
+    journal = anki_voice.AnswerJournal(str(path))
+    assert [entry["card_id"] for entry in journal.pending()] == [1000, 1001]
+    journal.close()
+
+
+def test_journal_compacts_once_resolved(anki_voice, tmp_path):
+    path = tmp_path / "journal.jsonl"
+    journal = anki_voice.AnswerJournal(str(path), compact_after=6)
+    for card_id in range(1000, 1003):
+        journal.resolve(journal.append(card_id, 3, "good"), "applied")
+    journal.close()
+    with open(path) as journal_file:
+        entries = [json.loads(line) for line in journal_file if line.strip()]
+    assert entries == [{"sequence": 3, "status": "compacted"}]
+    journal = anki_voice.AnswerJournal(str(path))
+    assert journal.pending() == []
+    assert journal.append(1003, 3, "good") == 4
+    journal.close()
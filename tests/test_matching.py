@@ -0,0 +1,130 @@
+import pytest
+
+
+@pytest.fixture
+def matcher(anki_voice, command_config_json):
+    return anki_voice.CommandMatcher(command_config_json)
+
+
+def test_matches_commands_and_related_words(matcher):
+    assert matcher.match("show") == ("show", 1.0)
+    assert matcher.match("a touch") == ("attach", 1.0)
+    assert matcher.match("Detection  off!") == ("pause", 1.0)
+    assert matcher.match("hello")[0] is None
+
+
+def test_matches_normalised_words_once_cache_is_full(matcher):
+    for index in range(matcher.NORMALISED_CACHE_SIZE + 1):
+        assert matcher.match(f"Word {index}", fuzzy=False)[0] is None
+    assert len(matcher._normalised_words) <= matcher.NORMALISED_CACHE_SIZE
+    assert matcher.match("Detection  off!") == ("pause", 1.0)
+    assert matcher.match("Detection  off!") == ("pause", 1.0)
+
+
+def test_matches_near_misses(matcher):
+    assert matcher.match("difficul")[0] == "difficult"
+    assert matcher.match("atach")[0] == "attach"
+    assert matcher.match("difficul", fuzzy=False)[0] is None
+    # Very short words are not matched approximately
+    assert matcher.match("go")[0] is None
+
+
+def test_ignores_ordinary_words_near_commands(matcher):
+    # Commands that end the session or review are only matched exactly
+    for words in ["quiet", "quite", "lose"]:
+        assert matcher.match(words)[0] is None
+    # Words that look like a command, but do not sound like it (or only sound alike, but are spelt differently)
+    for words in ["food", "wood", "hood", "gold", "east", "pass", "paws", "snow", "slow"]:
+        assert matcher.match(words)[0] is None
+    assert matcher.tokenize("show quiet") == []
+    assert matcher.identify("quiet") == (None, 0.0)
+
+
+def test_tokenizes_chained_commands(matcher):
+    assert matcher.tokenize("show good") == ["show", "good"]
+    assert matcher.tokenize("[unk] show detection off") == ["show", "pause"]
+    assert matcher.tokenize("show me the answer") == []
+
+
+def test_identifies_commands(matcher):
+    assert matcher.identify("show") == ("show", 1.0)
+    assert matcher.identify("show good") == ("show good", 1.0)
+    # A phrase of several words is preferred over the commands within it
+    assert matcher.identify("on pause") == ("unpause", 1.0)
+    assert matcher.identify("i don't know")[0] is None
+    # Words that were not recognised are ignored, for one command or several
+    assert matcher.identify("[unk] good") == ("good", 1.0)
+    assert matcher.identify("[unk] show good") == ("show good", 1.0)
+    assert matcher.identify("show [unk] good") == ("show good", 1.0)
+    assert matcher.identify("[unk]") == (None, 0.0)
+
+
+def test_rejects_malformed_configuration(anki_voice, command_config_json):
+    config = dict(command_config_json)
+    del config["show"]
+    with pytest.raises(anki_voice.AnkiVoiceError):
+        anki_voice.CommandMatcher(config)
+    config = dict(command_config_json, good={"related_words": "fine"})
+    with pytest.raises(anki_voice.AnkiVoiceError):
+        anki_voice.CommandMatcher(config)
+    # Words that normalise to nothing would match empty results
+    for related_word in ["", "?"]:
+        config = dict(command_config_json, good={"related_words": ["fine", related_word]})
+        with pytest.raises(anki_voice.AnkiVoiceError, match="empty"):
+            anki_voice.CommandMatcher(config)
+    # Words can only be used for one command
+    config = dict(command_config_json, good={"related_words": ["fine", "Show!"]})
+    with pytest.raises(anki_voice.AnkiVoiceError, match="both the commands"):
+        anki_voice.CommandMatcher(config)
+
+
+def test_optional_commands(anki_voice, command_config_json):
+    assert anki_voice.CommandMatcher(command_config_json).match("reload")[0] is None
+    config = dict(command_config_json, reload={"related_words": ["reload commands"]})
+    assert anki_voice.CommandMatcher(config).match("reload commands")[0] == "reload"
+
+
+def test_phonetic_key_matches_words_that_sound_alike(anki_voice):
+    assert anki_voice.phonetic_key("a touch") == anki_voice.phonetic_key("attach")
+    assert anki_voice.phonetic_key("fone") == anki_voice.phonetic_key("phone")
+
+
+def test_phonetic_key_of_silent_letters(anki_voice):
+    # Letters removed entirely by the substitutions (previously raised IndexError)
+    assert anki_voice.phonetic_key("gh") == ""
+    assert anki_voice.phonetic_key("GH") == ""
+    assert anki_voice.phonetic_key("growth hormone (GH)") == anki_voice.phonetic_key("growth hormone")
+
+
+def test_grader_scores_answers_with_silent_words(anki_voice):
+    grader = anki_voice.AnswerGrader("Growth hormone (GH)")
+    assert grader.grade(grader.score("growth hormone gh")) == "easy"
+    assert grader.score("why") == 0.0
+
+
+def test_grader_grades_spoken_answers(anki_voice):
+    grader = anki_voice.AnswerGrader("<b>Paris</b>")
+    assert grader.grade(grader.score("i think it's paris")) == "easy"
+    assert grader.grade(grader.score("london")) == "again"
+    grader = anki_voice.AnswerGrader("Mercury, Venus, Earth, Mars")
+    assert grader.grade(grader.score("mercury venus mars")) in ["difficult", "good"]
+
+
+class Vocabulary():
+    """Stands in for a vosk model's vocabulary lookup."""
+
+    def __init__(self, words):
+        self._words = list(words)
+
+    def find_word(self, word):
+        return self._words.index(word) if word in self._words else -1
+
+
+def test_missing_vocabulary(anki_voice, matcher, caplog):
+    words = {word for phrase in matcher.phrases for word in phrase.split()}
+    assert anki_voice.missing_vocabulary(Vocabulary(words), matcher.phrases) == []
+    vocabulary = Vocabulary(words - {"detection", "torch"})
+    assert anki_voice.missing_vocabulary(vocabulary, matcher.phrases) == ["detection", "torch"]
+    with caplog.at_level("WARNING"):
+        anki_voice.log_missing_vocabulary(vocabulary, matcher)
+    assert "a torch, detection off, detection on" in caplog.text
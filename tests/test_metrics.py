@@ -0,0 +1,39 @@
+import json
+
+
+def test_metrics_summary(anki_voice):
+    metrics = anki_voice.LatencyMetrics()
+    for milliseconds in range(1, 101):
+        metrics.observe("stage", milliseconds / 1000)
+    summary = metrics.summary()["stage"]
+    assert summary["count"] == 100
+    assert (summary["p50"], summary["p95"], summary["p99"]) == (0.05, 0.095, 0.099)
+
+
+def test_metrics_dumped_in_background_while_lock_held(anki_voice, tmp_path):
+    metrics = anki_voice.LatencyMetrics()
+    metrics.observe("tts", 0.2)
+    path = tmp_path / "metrics.json"
+    # As when a signal arrives while the main thread is recording a latency
+    with metrics._lock:
+        thread = metrics.dump_in_background(str(path))
+        assert not path.exists()
+    thread.join(timeout=5)
+    with open(path) as metrics_file:
+        assert json.load(metrics_file)["stages"]["tts"]["count"] == 1
+
+
+def test_failed_ankiconnect_requests_are_observed(anki_voice, monkeypatch):
+    from benchmarks import MockAnkiConnectServer
+    metrics = anki_voice.LatencyMetrics()
+    monkeypatch.setattr(anki_voice, "latency_metrics", metrics)
+    server = MockAnkiConnectServer(drop_rate=1.0)
+    server.start()
+    try:
+        client = anki_voice.AnkiConnectClient(url=server.url, connect_timeout=0.5, read_timeout=0.5, retries=0)
+        assert not client.check_connection()
+        server._drop_rate = 0.0
+        assert client.check_connection()
+        assert metrics.summary()["ankiconnect_request"]["count"] == 2
+    finally:
+        server.stop()
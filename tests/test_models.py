@@ -0,0 +1,44 @@
+from pathlib import Path
+
+import pytest
+
+
+@pytest.fixture
+def model_directory(anki_voice, monkeypatch, tmp_path):
+    """A model directory with two small models, a larger model (in the older layout), and a folder that is not a model."""
+    for model, model_file in [("vosk-model-small-en-us-0.15", "am"), ("vosk-model-small-de-0.15", "am"),
+                              ("vosk-model-en-us-0.22", "final.mdl")]:
+        Path(tmp_path, model).mkdir()
+        if model_file == "am":
+            Path(tmp_path, model, model_file).mkdir()
+        else:
+            Path(tmp_path, model, model_file).touch()
+    Path(tmp_path, "recordings").mkdir()
+    monkeypatch.setattr(anki_voice, "model_directories", lambda: [tmp_path])
+    return tmp_path
+
+
+def test_installed_models(anki_voice, model_directory):
+    assert [Path(path).name for path in anki_voice.installed_models()] == [
+        "vosk-model-en-us-0.22", "vosk-model-small-de-0.15", "vosk-model-small-en-us-0.15"]
+
+
+def test_find_model_by_path_and_name(anki_voice, model_directory):
+    model_path = str(model_directory / "vosk-model-small-de-0.15")
+    assert anki_voice.find_model(model_path) == model_path
+    assert anki_voice.find_model("vosk-model-small-de-0.15") == model_path
+    # Part of a name matching only one model
+    assert anki_voice.find_model("SMALL-DE") == model_path
+
+
+def test_find_model_ambiguous_and_missing(anki_voice, model_directory, capsys):
+    assert anki_voice.find_model("small") is None
+    anki_voice.print_model_not_found("small")
+    output = capsys.readouterr().out
+    assert "'small' is ambiguous" in output
+    assert "vosk-model-small-de-0.15, vosk-model-small-en-us-0.15" in output
+    assert anki_voice.find_model("fr") is None
+    anki_voice.print_model_not_found("fr")
+    output = capsys.readouterr().out
+    assert "'fr' could not be found" in output
+    assert "Installed models: vosk-model-en-us-0.22" in output
@@ -0,0 +1,95 @@
+import json
+import time
+
+
+def recognise(control, partial_words, final_words, partial_count=2):
+    """Passes an utterance to the recognition stage, as partial results followed by a final result."""
+    control._audio_received_time = time.perf_counter()
+    for _ in range(partial_count):
+        control._check_partial_result(partial_words)
+    control._process_final_result(json.dumps({"text": final_words}))
+
+
+def queued_items(control):
+    items = []
+    while not control._command_queue.empty():
+        items.append(control._command_queue.get_nowait())
+    return items
+
+
+def queued_words(control):
+    return [item[0] for item in queued_items(control)]
+
+
+def test_final_result_of_partial_command_is_not_executed_again(speech_to_command):
+    control = speech_to_command(partial_results=True)
+    for partial_words, final_words in [("show", "show"), ("sure", "show"), ("cause", "pause")]:
+        recognise(control, partial_words, final_words)
+        assert queued_words(control) == [partial_words]
+
+
+def test_final_result_after_partial_command_executes_following_commands(speech_to_command):
+    control = speech_to_command(partial_results=True)
+    for partial_words in ["show", "sure"]:
+        recognise(control, partial_words, "show good")
+        assert queued_words(control) == [partial_words, "good"]
+    # A different command in the final result is executed
+    recognise(control, "show", "again")
+    assert queued_words(control) == ["show", "again"]
+
+
+def test_dispatch_executes_the_command_identified_when_queued(speech_to_command):
+    control = speech_to_command()
+    recognise(control, "sure", "sure", partial_count=0)
+    detected_words, (command, confidence), _, _ = control._command_queue.get_nowait()
+    assert (detected_words, command, confidence) == ("sure", "show", 1.0)
+    executed = []
+    control._command_actions["show"] = lambda: executed.append("show") or "executed"
+
+    def match(*args, **kwargs):
+        raise AssertionError("the words were matched again")
+
+    control._matcher.match = match
+    control._matcher.tokenize = match
+    control._action_command_sequence = lambda words, commands: executed.append(commands) or "executed"
+    assert control._action_command(detected_words, command, confidence) == "executed"
+    assert control._action_command("sure good", "show good", 1.0) == "executed"
+    assert executed == ["show", ["show", "good"]]
+
+
+def test_invalid_command_config_reload_keeps_the_current_commands(speech_to_command, command_config_json, tmp_path):
+    command_config = tmp_path / "commands.json"
+    command_config.write_text(json.dumps(command_config_json))
+    control = speech_to_command(command_config=str(command_config))
+    matcher = control._matcher
+    for invalid_config in ['{"good": ', '{"good": {"related_words": "fine"}}',
+                           json.dumps(dict(command_config_json, good={"related_words": ["?"]}))]:
+        command_config.write_text(invalid_config)
+        assert not control.reload_command_config()
+        assert control._pending_matcher is None
+        recognise(control, "sure", "sure", partial_count=0)
+        assert control._matcher is matcher
+        assert queued_words(control) == ["sure"]
+
+
+def test_command_config_reload_is_applied_at_the_end_of_the_utterance(speech_to_command, command_config_json,
+                                                                     tmp_path):
+    command_config = tmp_path / "commands.json"
+    command_config.write_text(json.dumps(command_config_json))
+    control = speech_to_command(command_config=str(command_config))
+    recogniser = control._recogniser
+    command_config_json = dict(command_config_json, good={"related_words": ["fine"]})
+    command_config.write_text(json.dumps(command_config_json))
+    assert control.reload_command_config()
+    # The current utterance is still identified with the previous commands
+    control._audio_received_time = time.perf_counter()
+    control._check_partial_result("fine")
+    assert control._matcher.identify("fine") == (None, 0.0)
+    control._process_final_result(json.dumps({"text": "fine"}))
+    assert [item[1][0] for item in queued_items(control)] == [None]
+    # The new commands, and a recogniser for their grammar, are used from the next utterance
+    assert control._pending_matcher is None
+    assert control._recogniser is not recogniser
+    assert "fine" in json.loads(control._recogniser.grammar)
+    recognise(control, "fine", "fine", partial_count=0)
+    assert [item[1][0] for item in queued_items(control)] == ["good"]
@@ -0,0 +1,175 @@
+import json
+from pathlib import Path
+import socket
+import struct
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+
+class FailingRecogniser():
+    """A recogniser that fails on the audio it is told to, and otherwise records what it decodes."""
+
+    def __init__(self, failing_audio):
+        self.failing_audio = failing_audio
+        self.decoded = []
+
+    def AcceptWaveform(self, audio):
+        if audio == self.failing_audio:
+            raise RuntimeError("decoding failed")
+        self.decoded.append(audio)
+        return False
+
+    def FinalResult(self):
+        return json.dumps({"text": ""})
+
+
+class UtteranceRecogniser():
+    """A recogniser that recognises the given words once the audio ends."""
+
+    def __init__(self, words):
+        self.words = words
+
+    def SetWords(self, enabled):
+        pass
+
+    def AcceptWaveform(self, audio):
+        return False
+
+    def FinalResult(self):
+        return json.dumps({"text": self.words})
+
+
+class ManualPool():
+    """A worker pool that only runs submitted work when told to."""
+
+    def __init__(self):
+        self.submitted = []
+
+    def submit(self, work):
+        self.submitted.append(work)
+
+    def run_all(self):
+        while len(self.submitted) > 0:
+            self.submitted.pop(0)()
+
+
+def create_session(anki_voice, recogniser, decoder_pool):
+    return anki_voice.RecognitionSession("test", recogniser, matcher=None, anki_connect_client=None,
+                                         decoder_pool=decoder_pool, connection=None, vad_enabled=False)
+
+
+def test_session_continues_decoding_after_an_error(anki_voice):
+    recogniser = FailingRecogniser(failing_audio=b"bad!")
+    with ThreadPoolExecutor(max_workers=1) as decoder_pool:
+        session = create_session(anki_voice, recogniser, decoder_pool)
+        session.feed(b"bad!")
+        session.feed(b"good")
+        session.close()
+        assert recogniser.decoded == [b"good"]
+        # Audio received after a failed turn is still scheduled for decoding
+        session = create_session(anki_voice, recogniser, decoder_pool)
+        session.feed(b"bad!")
+        decoder_pool.submit(lambda: None).result()
+        session.feed(b"late")
+        session.close()
+        assert recogniser.decoded == [b"good", b"late"]
+
+
+def test_session_feed_blocks_while_decoding_is_behind(anki_voice):
+    recogniser = FailingRecogniser(failing_audio=None)
+    decoder_pool = ManualPool()
+    session = create_session(anki_voice, recogniser, decoder_pool)
+    chunk = bytes(session.MAX_PENDING_BYTES // 2)
+    session.feed(chunk)
+    session.feed(chunk)
+    feeder = threading.Thread(target=session.feed, args=(chunk,))
+    feeder.start()
+    feeder.join(timeout=0.2)
+    assert feeder.is_alive()
+    decoder_pool.run_all()
+    feeder.join(timeout=1.0)
+    assert not feeder.is_alive()
+    decoder_pool.run_all()
+    assert len(recogniser.decoded) == 3
+
+
+def test_session_executes_chained_commands(anki_voice, command_config_json):
+    from benchmarks import MockAnkiConnectServer
+    server = MockAnkiConnectServer()
+    server.start()
+    client = anki_voice.AnkiConnectClient(url=server.url, connect_timeout=0.5, read_timeout=1.0, retries=0)
+    session_connection, client_connection = socket.socketpair()
+    try:
+        with ThreadPoolExecutor(max_workers=1) as decoder_pool:
+            session = anki_voice.RecognitionSession(
+                "test", UtteranceRecogniser("show good"), anki_voice.CommandMatcher(command_config_json),
+                anki_connect_client=client, decoder_pool=decoder_pool, connection=session_connection,
+                vad_enabled=False)
+            assert session._anki_action.get_current_card_information() == "executed"
+            session.close()
+        assert json.loads(client_connection.makefile("r").readline()) == {
+            "detected": "show good", "command": "show good"}
+        assert server.answered_cards == [1000]
+    finally:
+        session_connection.close()
+        client_connection.close()
+        server.stop()
+
+
+def test_session_ankiconnect_url_is_on_the_client_computer(anki_voice):
+    url = anki_voice.AnkiVoiceServer.session_ankiconnect_url
+    assert url("http://localhost:8765", "127.0.0.1") == "http://localhost:8765"
+    # Loopback addresses refer to the client's computer
+    assert url("http://localhost:8765", "192.168.1.20") == "http://192.168.1.20:8765"
+    assert url("http://127.0.0.1:8765", "fd00::20") == "http://[fd00::20]:8765"
+    assert url("http://192.168.1.20:8765", "192.168.1.20") == "http://192.168.1.20:8765"
+    for requested_url in ["http://192.168.1.1:8765", "http://example.com", "file:///etc/passwd", "localhost:8765",
+                          "http://localhost:port", None]:
+        with pytest.raises(anki_voice.AnkiVoiceError):
+            url(requested_url, "192.168.1.20")
+
+
+@pytest.fixture
+def server(anki_voice, monkeypatch, tmp_path):
+    """Starts an AnkiVoiceServer (with the default command configuration) whose sessions recognise nothing."""
+    monkeypatch.setattr(anki_voice, "Model", lambda path: None)
+    monkeypatch.setattr(anki_voice, "KaldiRecognizer", lambda model, rate, grammar=None: UtteranceRecogniser(""))
+    monkeypatch.setattr(anki_voice, "log_missing_vocabulary", lambda model, matcher: None)
+    command_config = str(Path(__file__).resolve().parent.parent / "commands.json")
+    server = anki_voice.AnkiVoiceServer(command_config=command_config, port=0, workers=1, model=str(tmp_path))
+    serving = threading.Thread(target=server.serve_forever, daemon=True)
+    serving.start()
+    yield server
+    server.shutdown()
+    serving.join(timeout=5)
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def test_server_rejects_malformed_headers(server):
+    for header in [b"[]\n", b"not json\n", b'{"ankiconnect_url": "http://example.com"}\n']:
+        with socket.create_connection(server.address, timeout=5) as connection:
+            connection.sendall(header)
+            response = connection.makefile("r").readline()
+            assert "Malformed session header" in json.loads(response)["error"]
+    assert server.sessions == []
+
+
+def test_server_ends_session_when_client_resets_connection(server):
+    connection = socket.create_connection(server.address, timeout=5)
+    connection.sendall(b'{"name": "reset"}\n' + bytes(4096))
+    assert wait_for(lambda: len(server.sessions) == 1)
+    # Closing with a zero linger time resets the connection
+    connection.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack("ii", 1, 0))
+    connection.close()
+    assert wait_for(lambda: server.sessions == [])